@@ -0,0 +1,334 @@
+"""
+    This module reports the progress of the students of a class from the save files collected on their machines.
+
+    The teacher copies the save files of each machine in a folder per student, the folders of a class in a folder
+    per class, e.g. 'collected/6A/alice/capytaine.db'. A folder holding save files is a student,
+    named after the folder, and its parent folder, relative to the scanned folder, is the class.
+    The saves are read from SAVEDBPATH, or from the pickle file of the former versions, SAVEPATH,
+    when the game has not been started since the update: the database already holds the saves of the pickle file.
+
+    Run 'python analytics.py FOLDER [--output FILE] [--workers N]'.
+    The progress of each student is written as CSV in FILE, that of each class in FILE ending with '_classes.csv';
+    if FILE ends with '.json', both are written in FILE as JSON.
+
+    The folders of the students are read in parallel by a pool of processes.
+    A process reads the saves of a folder one after the other and returns only the progress of the most advanced one.
+    The main process writes the progress of each student as soon as it arrives and keeps only running totals per class,
+    so the memory used doesn't grow with the number of students.
+
+    Functions
+    ---------
+    get_quest_states(current_quest):
+        returns the state of each quest of 'data.py' in a saved game
+    summarize_game(game_params):
+        returns the progress of a saved game
+    read_saves(folder):
+        yields the timestamp and the parameters of each save of a folder
+    summarize_student(folder, root):
+        returns the progress of the most advanced save of a student
+    find_students(root):
+        yields the folders holding save files
+    add_to_class(classes, student):
+        adds the progress of a student to the running totals of the class
+    get_class_row(totals):
+        returns the progress of a class from its running totals
+    get_student_row(student):
+        returns the progress of a student with the keys of STUDENTFIELDS
+    report_progress(root, output, workers=None):
+        writes the progress of the students and classes of a folder
+"""
+
+import csv
+import json
+import sqlite3
+import sys
+from datetime import datetime
+from functools import partial
+from multiprocessing import get_context
+from os import environ, path, walk
+
+import data
+from savecodec import safe_loads, decode_game_params, migrate_version_0
+from story import get_goal_percentage
+from settings import SAVEPATH, SAVEDBPATH, GAME_STARTUP_PARAMS
+
+REPORTFILE = "progress.csv"
+CHUNKSIZE = 8  # student folders sent to a process at once
+QUESTS = [q["name"] for q in data.quests]
+TOOLS = list(GAME_STARTUP_PARAMS["unlocked_tools"])
+GOALS = sorted({q["goal_nbr"] for q in data.quests} - {0})  # goal 0 has no percentage in the goals booklet
+STUDENTFIELDS = ["class", "student", "saves", "errors", "timestamp", "map", "quest", "quest_state", "quests_completed",
+                 "goals_completed", "objects_cleared", "tools"] + ["goal" + str(goal) for goal in GOALS]
+CLASSFIELDS = ["class", "students", "saves", "errors", "first_quest", "median_quest", "last_quest", "quests_completed",
+               "goals_completed", "objects_cleared"] + TOOLS + ["goal" + str(goal) for goal in GOALS]
+
+
+def get_quest_states(current_quest):
+    """ Returns the state of each quest of 'data.py' in a saved game.
+
+    Like 'Script.__init__': the quests before the current one are completed, those after it are locked
+    and the current quest is at least unlocked.
+
+    :param current_quest: the "current_quest" dictionary of the game parameters
+    :return: list of int, the state of each quest of 'data.quests'
+    :raise ValueError: if the quest is not in 'data.py', e.g. a save of another version of the game
+    """
+
+    index = QUESTS.index(current_quest["name"])
+    return [3] * index + [max(current_quest["state"], 1)] + [0] * (len(QUESTS) - index - 1)
+
+
+def summarize_game(game_params):
+    """ Returns the progress of a saved game.
+
+    :param game_params: dictionary with the same structure as GAME_STARTUP_PARAMS
+    :return: dictionary {"map", "quest", "quest_index", "quest_state", "quests_completed", "goals", "goals_completed",
+             "objects_cleared", "tools"}, "goals" holds the percentage of each goal of GOALS, -1 if not started
+    :raise ValueError: if the quest is not in 'data.py'
+    """
+
+    current_quest = game_params["current_quest"]
+    states = get_quest_states(current_quest)
+    goals = [get_goal_percentage([state for quest, state in zip(data.quests, states) if quest["goal_nbr"] == goal]) for goal in GOALS]
+    return {
+        "map": game_params["map"]["name"],
+        "quest": current_quest["name"],
+        "quest_index": QUESTS.index(current_quest["name"]),
+        "quest_state": states[QUESTS.index(current_quest["name"])],
+        "quests_completed": states.count(3),
+        "goals": goals,
+        "goals_completed": goals.count(100),
+        "objects_cleared": len(set(game_params["removed_objects"])),
+        "tools": [tool for tool in TOOLS if game_params["unlocked_tools"].get(tool)]
+    }
+
+
+def read_saves(folder):
+    """ Yields the timestamp and the parameters of each save of a folder.
+
+    The rows of the database are read one at a time, the pickle file of the former versions holds only a few saves.
+    A save that can't be decoded is yielded with None parameters, a file that can't be read yields one such save.
+
+    :param folder: the folder holding SAVEDBPATH or SAVEPATH
+    :return: generator of (datetime, dictionary with the same structure as GAME_STARTUP_PARAMS or None)
+    """
+
+    db_path = path.join(folder, path.basename(SAVEDBPATH))
+    if path.exists(db_path):
+        try:
+            connection = sqlite3.connect("file:{}?mode=ro".format(db_path), uri=True)  # never modifies the collected files
+            try:
+                for timestamp, blob in connection.execute("SELECT timestamp, game_params FROM saves JOIN states ON states.save_id = saves.id"):
+                    try:
+                        yield datetime.fromisoformat(timestamp), decode_game_params(blob)
+                    except ValueError:
+                        yield datetime.min, None
+            finally:
+                connection.close()
+        except sqlite3.Error:
+            yield datetime.min, None
+        return
+
+    try:
+        with open(path.join(folder, path.basename(SAVEPATH)), 'rb') as savefile:
+            saved_games = safe_loads(savefile.read())
+    except Exception:  # an unreadable pickle can raise almost anything
+        yield datetime.min, None
+        return
+    for saved_game in saved_games:
+        if "game_params" in saved_game:
+            try:
+                yield saved_game["timestamp"], migrate_version_0(saved_game["game_params"])
+            except (TypeError, AttributeError):
+                yield datetime.min, None
+
+
+def summarize_student(folder, root):
+    """ Returns the progress of the most advanced save of a student.
+
+    Called by the processes of the pool.
+
+    :param folder: the folder of the student
+    :param root: the scanned folder, the class is the path of the parent folder relative to it
+    :return: dictionary with the keys of 'summarize_game' and "class", "student", "saves", "errors", "timestamp",
+             the keys of 'summarize_game' are missing if the student has no valid save
+    """
+
+    relative = path.relpath(folder, root)
+    student = {
+        "class": path.dirname(relative) or path.basename(path.abspath(root)),
+        "student": path.basename(relative) if relative != path.curdir else path.basename(path.abspath(root)),
+        "saves": 0,
+        "errors": 0
+    }
+
+    best_key = None
+    for timestamp, game_params in read_saves(folder):
+        try:
+            progress = None if game_params is None else summarize_game(game_params)
+        except (ValueError, KeyError, TypeError):
+            progress = None
+        if progress is None:
+            student["errors"] += 1
+            continue
+
+        student["saves"] += 1
+        key = (progress["quest_index"], progress["quest_state"], progress["objects_cleared"], timestamp)
+        if best_key is None or key > best_key:
+            best_key = key
+            student.update(progress, timestamp=timestamp)
+    return student
+
+
+def find_students(root):
+    """ Yields the folders holding save files.
+
+    :param root: the folder to scan
+    :return: generator of folder paths, in alphabetical order
+    """
+
+    names = {path.basename(SAVEDBPATH), path.basename(SAVEPATH)}
+    for folder, subfolders, files in walk(root):
+        subfolders.sort()
+        if names.intersection(files):
+            yield folder
+
+
+def add_to_class(classes, student):
+    """ Adds the progress of a student to the running totals of the class.
+
+    :param classes: dictionary {class name: totals}, updated
+    :param student: the dictionary returned by 'summarize_student'
+    :return: None
+    """
+
+    totals = classes.setdefault(student["class"], {
+        "class": student["class"], "students": 0, "saves": 0, "errors": 0, "quests": [0] * len(QUESTS),
+        "quests_completed": 0, "goals_completed": 0, "objects_cleared": 0,
+        "tools": dict.fromkeys(TOOLS, 0), "goals": [0] * len(GOALS)
+    })
+    totals["saves"] += student["saves"]
+    totals["errors"] += student["errors"]
+    if "quest" not in student:
+        return
+
+    totals["students"] += 1
+    totals["quests"][student["quest_index"]] += 1  # quests reached, a histogram keeps the median without the list of students
+    for key in ("quests_completed", "goals_completed", "objects_cleared"):
+        totals[key] += student[key]
+    for tool in student["tools"]:
+        totals["tools"][tool] += 1
+    for idx, percentage in enumerate(student["goals"]):
+        totals["goals"][idx] += max(percentage, 0)
+
+
+def get_class_row(totals):
+    """ Returns the progress of a class from its running totals.
+
+    :param totals: the totals of the class built by 'add_to_class'
+    :return: dictionary with the keys of CLASSFIELDS: the first, median and last quests reached,
+             the averages per student and the number of students who unlocked each tool
+    """
+
+    row = {key: totals[key] for key in ("class", "students", "saves", "errors")}
+    students = totals["students"]
+    if students == 0:
+        return row
+
+    reached = [idx for idx, count in enumerate(totals["quests"]) if count]
+    cumulated = 0
+    for idx, count in enumerate(totals["quests"]):
+        cumulated += count
+        if 2 * cumulated >= students:
+            row["median_quest"] = QUESTS[idx]
+            break
+    row["first_quest"], row["last_quest"] = QUESTS[reached[0]], QUESTS[reached[-1]]
+    for key in ("quests_completed", "goals_completed", "objects_cleared"):
+        row[key] = round(totals[key] / students, 2)
+    row.update(totals["tools"])
+    for goal, total in zip(GOALS, totals["goals"]):
+        row["goal" + str(goal)] = round(total / students, 2)
+    return row
+
+
+def get_student_row(student):
+    """ Returns the progress of a student with the keys of STUDENTFIELDS.
+
+    :param student: the dictionary returned by 'summarize_student'
+    :return: dictionary, the goals not started are None
+    """
+
+    row = {key: student.get(key) for key in STUDENTFIELDS if key in student}
+    if "timestamp" in student:
+        row["timestamp"] = student["timestamp"].isoformat(timespec="seconds")
+        for goal, percentage in zip(GOALS, student["goals"]):
+            row["goal" + str(goal)] = percentage if percentage != -1 else None
+    return row
+
+
+def report_progress(root, output, workers=None):
+    """ Writes the progress of the students and classes of a folder.
+
+    The students are written as CSV in output and the classes in output ending with '_classes.csv',
+    or both as JSON in output if it ends with '.json'.
+
+    :param root: the folder to scan, see 'find_students'
+    :param output: the report file
+    :param workers: the number of processes, the number of processors by default
+    :return: the list of the class rows, see 'get_class_row'
+    """
+
+    classes = {}
+    as_json = output.endswith(".json")
+    # The processes are spawned, not forked: a fork of a process that has initialized pygame,
+    # e.g. the tests, can deadlock in the locks and threads of SDL copied in the child
+    environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")  # the spawned processes import pygame again
+    with open(output, 'w', newline='', encoding="utf-8") as report, get_context("spawn").Pool(workers) as pool:
+        if as_json:
+            report.write('{"students": [')
+        else:
+            writer = csv.DictWriter(report, STUDENTFIELDS)
+            writer.writeheader()
+
+        # imap reads the folders lazily and returns the students in the order of 'find_students'
+        for idx, student in enumerate(pool.imap(partial(summarize_student, root=root), find_students(root), CHUNKSIZE)):
+            add_to_class(classes, student)
+            row = get_student_row(student)
+            if as_json:
+                report.write((",\n " if idx else "\n ") + json.dumps(row, ensure_ascii=False))
+            else:
+                row["tools"] = " ".join(row.get("tools", []))
+                writer.writerow(row)
+
+        class_rows = [get_class_row(totals) for name, totals in sorted(classes.items())]
+        if as_json:
+            report.write('\n], "classes": ' + json.dumps(class_rows, ensure_ascii=False, indent=1) + '}\n')
+
+    if not as_json:
+        with open(path.splitext(output)[0] + "_classes.csv", 'w', newline='', encoding="utf-8") as report:
+            writer = csv.DictWriter(report, CLASSFIELDS)
+            writer.writeheader()
+            writer.writerows(class_rows)
+    return class_rows
+
+
+if __name__ == '__main__':
+    # python analytics.py FOLDER [--output FILE] [--workers N]
+    options = {"--output": REPORTFILE, "--workers": None}
+    args = sys.argv[1:]
+    if not args or not path.isdir(args[0]):
+        print("Usage: python analytics.py FOLDER [--output FILE] [--workers N]   (FILE ending with .json: JSON report)")
+        sys.exit(2)
+    root = args.pop(0)
+    while args:
+        option = args.pop(0)
+        if option not in options or not args:
+            print("Usage: python analytics.py FOLDER [--output FILE] [--workers N]   (FILE ending with .json: JSON report)")
+            sys.exit(2)
+        options[option] = args.pop(0)
+
+    start = datetime.now()
+    class_rows = report_progress(root, options["--output"], None if options["--workers"] is None else int(options["--workers"]))
+    print("{} students in {} classes, {:.1f} s".format(sum(row["students"] for row in class_rows), len(class_rows),
+                                                     (datetime.now() - start).total_seconds()))
+    print("Saved in", options["--output"])
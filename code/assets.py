@@ -0,0 +1,243 @@
+"""
+    This module loads the images of the game and shares them between all the objects that use them.
+
+    The small images can be packed into a few sprite sheets with 'python assets.py',
+    the images are then cut from the sheets instead of being read one by one.
+
+    Class
+    -----
+    AssetManager:
+        a class used to load each image only once in the display pixel format
+
+    Functions
+    ---------
+    pack_atlases(image_dir=IMAGEDIR, atlas_dir=ATLASDIR):
+        packs the small images with per-pixel alpha of each category into one sprite sheet
+"""
+
+import json
+from os import path, makedirs, walk
+
+import pygame as pg
+
+from settings import IMAGEDIR, ATLASDIR, ATLASWIDTH, TILESIZE
+
+ATLASINDEX = "index.json"
+ATLASCATEGORIES = ["ui", "npc", "player", "objects", "tools"]
+ATLASMAXSIZE = 2 * TILESIZE  # bigger images are faster to read from their own file
+
+
+class AssetManager:
+    """
+        A class used to load each image only once in the display pixel format.
+
+        Images with per-pixel alpha are converted with 'convert_alpha', the other ones with 'convert',
+        so blitting them doesn't need a pixel format conversion each frame.
+        The same Surface object is returned each time an image is requested, it must not be drawn on.
+
+        Images are grouped by category to follow the memory they use,
+        the category is the folder of the image in IMAGEDIR, e.g. 'npc', or 'ui' for the images at its root.
+
+        If the sprite sheets built by 'pack_atlases' exist, the images they contain are subsurfaces of the sheets,
+        an image modified after the sheets were built is loaded from its own file.
+
+        An instance is created in 'main.py' once the display is set and shared in 'globvars.assets'.
+
+        Attributes
+        ----------
+        images: dict
+            the converted images keyed by path
+        atlas_dir: str
+            the folder of the sprite sheets
+        sheets: dict
+            the converted sprite sheets keyed by file name, loaded with their first image
+        atlas_rects: dict
+            (sheet file name, Rect) of the packed images keyed by path
+        hits, misses: int
+            number of images found in the cache and loaded from the disk
+
+        Methods
+        -------
+        load_atlases(self):
+            reads the position of the images packed in the sprite sheets
+        get_image(self, name):
+            returns the image, loaded the first time it is requested
+        load(self, name):
+            creates the image from its sprite sheet or loads it from its file
+        reconvert(self):
+            loads again all the images in the format of the new display
+        get_category(name):
+            returns the category of an image
+        get_resident_bytes(self):
+            returns the memory used by the images of each category
+    """
+
+    def __init__(self, atlas_dir=ATLASDIR):
+        self.images = {}
+        self.hits = 0
+        self.misses = 0
+
+        self.atlas_dir = atlas_dir
+        self.sheets = {}
+        self.atlas_rects = {}
+        self.load_atlases()
+
+    def __repr__(self):
+        return "<%s: %d images, %d hits, %d misses, %d bytes>" % (self.__class__.__name__, len(self.images), self.hits, self.misses, sum(self.get_resident_bytes().values()))
+
+    def load_atlases(self):
+        """ Reads the position of the images packed in the sprite sheets.
+
+        Images whose file is missing or more recent than the index are left out.
+        The sheets themselves are loaded when one of their images is first requested.
+
+        :return: None
+        """
+
+        index_path = path.join(self.atlas_dir, ATLASINDEX)
+        if not path.exists(index_path):
+            return
+
+        index_mtime = path.getmtime(index_path)
+        with open(index_path) as index_file:
+            index = json.load(index_file)
+
+        self.sheets = {}
+        self.atlas_rects = {}
+        for sheet_name, rects in index.items():
+            for name, rect in rects.items():
+                image_path = IMAGEDIR + name
+                if path.exists(image_path) and path.getmtime(image_path) <= index_mtime:
+                    self.atlas_rects[name] = (sheet_name, pg.Rect(rect))
+
+    def get_image(self, name):
+        """ Returns the image, loaded the first time it is requested.
+
+        :param name: the image path in IMAGEDIR, e.g. 'npc/npc1_s.png'
+        :return: Surface object
+        """
+
+        image = self.images.get(name)
+        if image is not None:
+            self.hits += 1
+            return image
+
+        self.misses += 1
+        image = self.load(name)
+        self.images[name] = image
+        return image
+
+    def load(self, name):
+        """ Creates the image from its sprite sheet or loads it from its file.
+
+        Images are converted to the display pixel format.
+
+        :param name: the image path in IMAGEDIR
+        :return: Surface object
+        """
+
+        if name in self.atlas_rects:
+            sheet_name, rect = self.atlas_rects[name]
+            if sheet_name not in self.sheets:
+                self.sheets[sheet_name] = pg.image.load(path.join(self.atlas_dir, sheet_name)).convert_alpha()
+            return self.sheets[sheet_name].subsurface(rect)
+
+        image = pg.image.load(IMAGEDIR + name)
+        if image.get_flags() & pg.SRCALPHA:
+            return image.convert_alpha()
+        return image.convert()
+
+    def reconvert(self):
+        """ Loads again all the images in the format of the new display.
+
+        Called when the display mode changes,
+        objects keeping images must request them again to get the new surfaces.
+
+        :return: None
+        """
+
+        self.load_atlases()
+        for name in self.images:
+            self.images[name] = self.load(name)
+
+    @staticmethod
+    def get_category(name):
+        """ Returns the category of an image.
+
+        :param name: the image path in IMAGEDIR
+        :return: the folder of the image, 'ui' if it is at the root of IMAGEDIR
+        """
+
+        return name.split('/')[0] if '/' in name else "ui"
+
+    def get_resident_bytes(self):
+        """ Returns the memory used by the images of each category.
+
+        :return: dict of bytes keyed by category
+        """
+
+        resident_bytes = {}
+        for name, image in self.images.items():  # images cut from a sheet share its memory, the margins are not counted
+            category = self.get_category(name)
+            size = image.get_bytesize() * image.get_width() * image.get_height()
+            resident_bytes[category] = resident_bytes.get(category, 0) + size
+        return resident_bytes
+
+
+def pack_atlases(image_dir=IMAGEDIR, atlas_dir=ATLASDIR):
+    """ Packs the small images with per-pixel alpha of each category into one sprite sheet.
+
+    The images are sorted by height and placed on rows of ATLASWIDTH pixels, with one transparent pixel between them.
+    Each sheet is saved as 'category.png' and the position of each image in 'index.json'.
+    Images without per-pixel alpha (backgrounds, goal cards) and images bigger than ATLASMAXSIZE
+    keep being loaded from their own file.
+
+    :param image_dir: the folder containing the images
+    :param atlas_dir: the folder where the sheets and the index are written
+    :return: dictionary {sheet file name: number of images}
+    """
+
+    images = {category: [] for category in ATLASCATEGORIES}
+    for folder, sub_folders, filenames in walk(image_dir):
+        for filename in sorted(filenames):
+            name = path.relpath(path.join(folder, filename), image_dir).replace(path.sep, '/')
+            category = AssetManager.get_category(name)
+            if category in images and filename.lower().endswith(".png"):
+                image = pg.image.load(path.join(folder, filename))
+                if image.get_flags() & pg.SRCALPHA and max(image.get_size()) <= ATLASMAXSIZE:
+                    images[category].append((name, image))
+
+    makedirs(atlas_dir, exist_ok=True)
+    index = {}
+    for category, category_images in images.items():
+        if not category_images:
+            continue
+
+        rects = {}
+        x = y = row_height = 0
+        for name, image in sorted(category_images, key=lambda item: (-item[1].get_height(), item[0])):
+            if x + image.get_width() > ATLASWIDTH:
+                x, y, row_height = 0, y + row_height + 1, 0
+            rects[name] = [x, y, image.get_width(), image.get_height()]
+            x += image.get_width() + 1
+            row_height = max(row_height, image.get_height())
+
+        sheet = pg.Surface((ATLASWIDTH, y + row_height), pg.SRCALPHA, 32)
+        for name, image in category_images:
+            sheet.blit(image, rects[name][0:2], special_flags=pg.BLEND_RGBA_MAX)  # copies the pixels without blending them
+
+        sheet_name = category + ".png"
+        pg.image.save(sheet, path.join(atlas_dir, sheet_name))
+        index[sheet_name] = rects
+
+    with open(path.join(atlas_dir, ATLASINDEX), 'w') as index_file:  # written last, its date validates the sheets
+        json.dump(index, index_file, indent=1)
+
+    return {sheet_name: len(rects) for sheet_name, rects in index.items()}
+
+
+if __name__ == '__main__':
+    pg.init()
+
+    for sheet_name, count in pack_atlases().items():
+        print("Packed", count, "images in", path.join(ATLASDIR, sheet_name))
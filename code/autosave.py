@@ -0,0 +1,107 @@
+"""
+    This module saves the game automatically when the player makes progress.
+
+    Class
+    -----
+    AutoSaver:
+        a class used to save the game in the autosave slot, at most once per AUTOSAVEINTERVAL
+"""
+
+import pygame as pg
+
+import globvars as glob
+from settings import AUTOSAVEINTERVAL
+
+AUTOSAVEEVENT = pg.event.custom_type()  # posted when the game must be autosaved
+
+
+class AutoSaver:
+    """
+        A class used to save the game in the autosave slot, at most once per AUTOSAVEINTERVAL.
+
+        The game requests an autosave when the player enters a gate, accepts or completes a quest
+        and unlocks a tool. A burst of requests, e.g. completing a quest that unlocks a tool, makes only one save:
+        the save is written when AUTOSAVEEVENT is handled by 'Game.game_events', between two frames,
+        at least AUTOSAVEINTERVAL milliseconds after the previous one.
+        The save is written by the worker of 'Persistence', the frame only copies the game parameters.
+
+        Attributes
+        ----------
+        game: Game
+            the 'Game' object from which this class was instantiated
+        persistence: Persistence
+            where the game is saved, 'globvars.persistence' by default
+        interval: int
+            minimum time between two autosaves in milliseconds
+        pending: bool
+            True if the game changed since the last autosave
+        scheduled: bool
+            True if AUTOSAVEEVENT is posted or its timer is running
+        last_save: int
+            time of the last autosave in milliseconds since pygame started, None before the first one
+        job: SaveJob
+            the last autosave requested to the persistence, None before the first one
+
+        Methods
+        -------
+        request(self):
+            schedules an autosave
+        save(self):
+            saves the game if it changed since the last autosave
+        stop(self):
+            saves the pending changes and stops the timer
+    """
+
+    def __init__(self, game, persistence=None, interval=AUTOSAVEINTERVAL):
+        self.game = game
+        self.persistence = glob.persistence if persistence is None else persistence
+        self.interval = interval
+        self.pending = False
+        self.scheduled = False
+        self.last_save = None
+        self.job = None
+
+    def request(self):
+        """ Schedules an autosave.
+
+        The game is saved by the next frame, or when AUTOSAVEINTERVAL has elapsed since the last autosave.
+
+        :return: None
+        """
+
+        self.pending = True
+        if self.scheduled:
+            return
+
+        self.scheduled = True
+        delay = 0 if self.last_save is None else self.last_save + self.interval - pg.time.get_ticks()
+        if delay > 0:
+            glob.scheduler.start_timer(AUTOSAVEEVENT, delay)
+        else:
+            pg.event.post(pg.event.Event(AUTOSAVEEVENT))
+
+    def save(self):
+        """ Saves the game if it changed since the last autosave.
+
+        Called when AUTOSAVEEVENT is handled.
+
+        :return: None
+        """
+
+        self.scheduled = False
+        if self.pending:
+            self.pending = False
+            self.last_save = pg.time.get_ticks()
+            self.job = self.persistence.save_this_game(self.game, autosave=True)
+
+    def stop(self):
+        """ Saves the pending changes and stops the timer.
+
+        Called when the player leaves the game.
+
+        :return: None
+        """
+
+        glob.scheduler.stop_timer(AUTOSAVEEVENT)
+        pg.event.clear(AUTOSAVEEVENT)
+        self.save()
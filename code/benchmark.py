@@ -0,0 +1,324 @@
+"""
+    This module times the slow parts of the game to follow their performance from one version to the next.
+
+    The benchmarks run without window, see 'headless.py'.
+    Run them with 'python benchmark.py', the times are printed and saved as JSON.
+    Compare them with those of a previous version with 'python benchmark.py --compare baseline.json',
+    the command fails if a benchmark is slower than the baseline by more than REGRESSIONTHRESHOLD.
+
+    Functions
+    ---------
+    time_function(function, repeat, setup=None):
+        times a function several times
+    stop_prefetching(prefetcher):
+        cancels the background loading of maps and waits for the workers
+    get_scenarios(headless, persistence):
+        returns the timed scenarios
+    run_benchmarks(repeat=5, selection=None):
+        times the scenarios
+    save_results(results, filename):
+        saves the times as JSON with the versions of the tools they were measured with
+    compare_results(baseline, results, threshold=REGRESSIONTHRESHOLD):
+        compares the times with those of a baseline
+    get_frame_times(results):
+        returns the time of one frame of the walking scenarios
+"""
+
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+from os import chdir, getcwd, listdir, path
+from statistics import median
+from time import perf_counter
+
+import pygame as pg
+
+import globvars as glob
+from autosave import AutoSaver
+from capylib import draw_multilines_text, get_text_layout
+from headless import HeadlessGame, close_headless, init_headless
+from persistence import Persistence
+from tilemap import TiledMap
+from settings import MAPDIR, WIDTH, TILESIZE, WHITE, FPS, GAME_STARTUP_PARAMS
+
+REGRESSIONTHRESHOLD = 0.2  # a benchmark 20% slower than the baseline is a regression
+REGRESSIONMINMS = 0.05  # differences smaller than this are noise, whatever the ratio
+WALKSTEPS = 20  # updates of the walking scenarios
+FRAMEBUDGETMS = 1000 / FPS  # a frame of the walking scenarios must take less time than this
+MINSAMPLEMS = 20  # fast functions are called several times per sample so that the timer resolution doesn't matter
+RESULTSFILE = "benchmark.json"
+COLDSTARTCODE = "from headless import init_headless; init_headless(db_path={!r}); from menu import Menu; Menu().show_main_menu()"
+
+
+def time_function(function, repeat, setup=None):
+    """ Times a function several times.
+
+    Without setup, the function is called as many times as needed for a sample to last MINSAMPLEMS,
+    like 'timeit' does, the time of one call is the time of the sample divided by the number of calls.
+
+    :param function: the function to time, called without argument
+    :param repeat: the number of samples
+    :param setup: function called before each call and not timed, e.g. to empty a cache
+    :return: dictionary {"best_ms": float, "median_ms": float, "runs": int} with the times of one call
+    """
+
+    number = 1
+    if setup is None:
+        start = perf_counter()
+        function()
+        call_ms = (perf_counter() - start) * 1000
+        number = max(1, int(MINSAMPLEMS / max(call_ms, 1e-6)))
+
+    times = []
+    for idx in range(repeat):
+        if setup is not None:
+            setup()
+        start = perf_counter()
+        for call in range(number):
+            function()
+        times.append((perf_counter() - start) * 1000 / number)
+    return {"best_ms": round(min(times), 4), "median_ms": round(median(times), 4), "runs": repeat * number}
+
+
+def stop_prefetching(prefetcher):
+    """ Cancels the background loading of maps and waits for the workers.
+
+    'Game.load_map' starts loading the neighbour maps in background threads,
+    they would slow down the next functions timed.
+
+    :param prefetcher: the MapPrefetcher of the game
+    :return: None
+    """
+
+    prefetcher.cancel(wait=True)
+    prefetcher.collect()
+
+
+def get_scenarios(headless, persistence):
+    """ Returns the timed scenarios.
+
+    :param headless: the HeadlessGame used by the scenarios
+    :param persistence: a Persistence in a temporary folder, not to overwrite the saved games, closed by the caller
+    :return: list of (name, function, setup or None)
+    """
+
+    game = headless.game
+    scenarios = []
+
+    # Map loading: parsing each map, then what entering a map costs in game with an empty map cache
+    map_names = sorted(path.splitext(filename)[0] for filename in listdir(MAPDIR) if filename.endswith(".tmx"))
+    for map_name in map_names:
+        scenarios.append(("tiledmap/" + map_name, lambda map_name=map_name: TiledMap(map_name), None))
+
+    def empty_map_cache():
+        stop_prefetching(game.prefetcher)
+        game.map_cache.maps.clear()
+
+    # the maps a gate leads to, the script selects their version (mapA has no gate leading to it and can't be loaded)
+    gate_destinations = {obj.name for map_name in map_names for obj in TiledMap(map_name).objects if obj.type == "gate"}
+    for map_name in sorted(gate_destinations):
+        scenarios.append(("load_map/" + map_name, lambda map_name=map_name: game.load_map(map_name), empty_map_cache))
+
+    # Rendering: the game screen at the start of the game, then talking to the first quest giver
+    def start_game():
+        game.load_map(GAME_STARTUP_PARAMS["map"]["name"])
+        game.player.x, game.player.y = GAME_STARTUP_PARAMS["player"]['x'], GAME_STARTUP_PARAMS["player"]['y']
+        game.player.interacting = False
+        game.update()
+        stop_prefetching(game.prefetcher)
+
+    def start_dialogue():
+        npc_name = game.script.current_quest.quest_giver_name
+        game.load_map("map" + npc_name[1])  # npc names start with the letter of their map, e.g. 'm0npc1'
+        npc = game.spatial_index.get_npc(npc_name)
+        game.player.x, game.player.y, game.player.look_at = npc.x, npc.y + 1, (0, -1)
+        game.player.interacting = npc.interacting_with = True
+        game.line_number = 0
+        game.update()
+        stop_prefetching(game.prefetcher)
+
+    scenarios.append(("draw_game/no_dialogue", game.game_display.draw_game, start_game))
+    scenarios.append(("draw_game/dialogue", game.game_display.draw_game, start_dialogue))
+
+    # Text:
+    def generate_sheets():
+        for goal in game.script.all_goals:
+            goal.generate_sheet()
+
+    text = max(game.script.current_quest.quest_dialogue, key=len)
+    text_surface = pg.Surface((WIDTH - TILESIZE, 10 * TILESIZE))
+    scenarios.append(("goal/generate_sheet", generate_sheets, None))
+    scenarios.append(("draw_multilines_text/cached", lambda: draw_multilines_text(text_surface, text_surface.get_rect(), text, 25, (5, 5), WHITE), None))
+    scenarios.append(("draw_multilines_text/uncached", lambda: draw_multilines_text(text_surface, text_surface.get_rect(), text, 25, (5, 5), WHITE), get_text_layout.cache_clear))
+
+    # Saving:
+    save_job = persistence.save_this_game(game)
+    save_job.done.wait()
+
+    def save_game():
+        persistence.save_this_game(game, save_job.save_id).done.wait()
+
+    # the time the game waits when the player saves, the worker writes the save afterwards
+    scenarios.append(("persistence/save_request", lambda: persistence.save_this_game(game, save_job.save_id), persistence.flush))
+
+    scenarios.append(("persistence/save_this_game", save_game, None))
+
+    # Walking: WALKSTEPS updates and frames, then the same with an autosave requested at each step.
+    # The game autosaves at most once per AUTOSAVEINTERVAL, each frame autosaving is the worst case:
+    # the frame only takes a snapshot of the game, see 'persistence/save_request', the worker encodes and writes it
+    # but competes with the frames for the interpreter, each frame must still fit in FRAMEBUDGETMS, see 'get_frame_times'
+    autosaver = AutoSaver(game, persistence, interval=0)
+
+    def start_walk(with_autosave):
+        start_game()
+        persistence.flush()
+        game.autosaver = autosaver if with_autosave else None
+        game.player.walk(1, 0)
+
+    def walk(with_autosave):
+        for idx in range(WALKSTEPS):
+            if with_autosave:
+                game.request_autosave()
+            headless.step()
+
+    scenarios.append(("walk/no_autosave", lambda: walk(False), lambda: start_walk(False)))
+    scenarios.append(("walk/autosave", lambda: walk(True), lambda: start_walk(True)))
+
+    # Quicksave and quickload on the same map, the map isn't loaded again
+    def quick_save():
+        start_game()
+        game.quick_save()
+
+    scenarios.append(("snapshot/quick_save", game.quick_save, start_game))
+    scenarios.append(("snapshot/quick_load", game.quick_load, quick_save))
+
+    # Cold start: a new Python process importing the game and drawing the main menu
+    game_dir = path.dirname(path.abspath(__file__))
+    cold_start_code = COLDSTARTCODE.format(persistence.db_path)  # the saves of the benchmark, already created
+    scenarios.append(("cold_start", lambda: subprocess.run([sys.executable, "-c", cold_start_code], cwd=game_dir, check=True, capture_output=True), None))
+
+    return scenarios
+
+
+def run_benchmarks(repeat=5, selection=None):
+    """ Times the scenarios.
+
+    :param repeat: the number of calls of each scenario
+    :param selection: a part of the names of the scenarios to run, None to run all of them
+    :return: dictionary {scenario name: times}
+    """
+
+    save_dir = tempfile.TemporaryDirectory()
+    headless = None
+    try:
+        db_path = path.join(save_dir.name, "benchmark.db")
+        cwd = getcwd()
+        chdir(save_dir.name)  # the pickle file of the former saves is searched in the current folder
+        try:
+            Persistence(db_path).close()  # creates the database without the former saves
+        finally:
+            chdir(cwd)
+        init_headless(db_path=db_path)  # the saves of the player are not changed
+        persistence = glob.persistence
+        headless = HeadlessGame()
+
+        results = {}
+        for name, function, setup in get_scenarios(headless, persistence):
+            if selection is None or selection in name:
+                stop_prefetching(headless.game.prefetcher)
+                if setup is not None:
+                    setup()
+                function()  # warm up: images and fonts are loaded once for the whole game
+                results[name] = time_function(function, repeat, setup)
+        return results
+    finally:
+        if headless is not None:
+            headless.close()  # its autosaver may still write in the persistence
+        close_headless()  # stops the worker and closes the database before it is deleted
+        save_dir.cleanup()
+
+
+def save_results(results, filename):
+    """ Saves the times as JSON with the versions of the tools they were measured with.
+
+    :param results: the dictionary returned by 'run_benchmarks'
+    :param filename: the JSON file
+    :return: None
+    """
+
+    with open(filename, 'w') as results_file:
+        json.dump({
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "pygame": pg.version.ver,
+            "machine": platform.machine(),
+            "results": results
+        }, results_file, indent=1)
+
+
+def compare_results(baseline, results, threshold=REGRESSIONTHRESHOLD):
+    """ Compares the times with those of a baseline.
+
+    The best times are compared, they are the least disturbed by the other processes of the machine.
+
+    :param baseline: dictionary {scenario name: times} of the reference version
+    :param results: dictionary {scenario name: times} of the version to check
+    :param threshold: the slowdown ratio above which a benchmark is a regression
+    :return: list of (name, baseline ms, current ms, ratio, is_regression) for the scenarios in both
+    """
+
+    comparison = []
+    for name, times in results.items():
+        if name in baseline:
+            baseline_ms, current_ms = baseline[name]["best_ms"], times["best_ms"]
+            ratio = current_ms / baseline_ms if baseline_ms > 0 else 1
+            is_regression = ratio > 1 + threshold and current_ms - baseline_ms > REGRESSIONMINMS
+            comparison.append((name, baseline_ms, current_ms, ratio, is_regression))
+    return comparison
+
+
+def get_frame_times(results):
+    """ Returns the time of one frame of the walking scenarios.
+
+    :param results: dictionary {scenario name: times}
+    :return: dictionary {scenario name: best ms per frame}
+    """
+
+    return {name: times["best_ms"] / WALKSTEPS for name, times in results.items() if name.startswith("walk/")}
+
+
+if __name__ == '__main__':
+    # python benchmark.py [--repeat N] [--select TEXT] [--output FILE] [--compare BASELINE [--threshold RATIO]]
+    options = {"--repeat": "5", "--select": None, "--output": RESULTSFILE, "--compare": None, "--threshold": str(REGRESSIONTHRESHOLD)}
+    args = sys.argv[1:]
+    while args:
+        option = args.pop(0)
+        if option not in options or not args:
+            print("Usage: python benchmark.py [--repeat N] [--select TEXT] [--output FILE] [--compare BASELINE [--threshold RATIO]]")
+            sys.exit(2)
+        options[option] = args.pop(0)
+
+    results = run_benchmarks(int(options["--repeat"]), options["--select"])
+    save_results(results, options["--output"])
+
+    if options["--compare"] is None:
+        print("{:<32}{:>12}{:>12}".format("benchmark", "best (ms)", "median (ms)"))
+        for name, times in results.items():
+            print("{:<32}{:>12.3f}{:>12.3f}".format(name, times["best_ms"], times["median_ms"]))
+        for name, frame_ms in get_frame_times(results).items():
+            print("{}: {:.3f} ms per frame, {} the budget of {:.1f} ms".format(name, frame_ms, "within" if frame_ms < FRAMEBUDGETMS else "OVER", FRAMEBUDGETMS))
+        print("Saved in", options["--output"])
+    else:
+        with open(options["--compare"]) as baseline_file:
+            baseline = json.load(baseline_file)["results"]
+
+        regressions = 0
+        print("{:<32}{:>14}{:>12}{:>9}".format("benchmark", "baseline (ms)", "now (ms)", "change"))
+        for name, baseline_ms, current_ms, ratio, is_regression in compare_results(baseline, results, float(options["--threshold"])):
+            regressions += is_regression
+            print("{:<32}{:>14.3f}{:>12.3f}{:>+8.0f}%{}".format(name, baseline_ms, current_ms, (ratio - 1) * 100, "  REGRESSION" if is_regression else ""))
+        print(regressions, "regression(s), results saved in", options["--output"])
+        sys.exit(1 if regressions else 0)
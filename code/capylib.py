@@ -1,8 +1,21 @@
 """
     This module brings together functions used in several modules of the program.
 
+    Class
+    -----
+    FontCache:
+        a class used to create each font only once
+    TextLayout:
+        a class used to keep where each word of a multi lines text is written
+
     Functions
     ---------
+    get_font(size, face=DEFAULTFONT, bold=False, italic=False):
+        returns the Font object of the given face, size and style from the font cache
+    get_text_layout(text, max_width, size=25, coordinate=(5, 5), line_height=None):
+        returns the layout of a multi lines text, computed once for each set of parameters
+    clear_font_caches():
+        forgets the fonts and the text layouts measured with them
     draw_text(obj, text, size, coordinate, align="topleft", color=WHITE, mouse_event_key=None):
         display a given one line text on the screen
     get_nbr_lines(max_width, text, size=25, coordinate=(5, 5), surface=None):
@@ -11,17 +24,200 @@
         display a given multi lines text on the screen
     get_hovered_rectangle(clickable_item, mouse_pos):
         returns the item which is currently hovered by the mouse pointer
+    draw_save_pages(obj, free_row=False):
+        display the page of saved games and the arrows to turn it
+    draw_save_thumbnail(saved_game, y):
+        display the thumbnail of a saved game at the left of its line
     exit_gracefully(instance):
         quit the game
 """
 
 import sys
+from os import path
+from functools import lru_cache
 import pygame as pg
 
 import globvars as glob
 from settings import *
 
 
+class FontCache:
+    """
+        A class used to create each font only once.
+
+        The font file of a face is resolved once: a file 'face.ttf' in FONTDIR is used if it exists,
+        so the game can ship its own fonts and doesn't depend on the system fonts,
+        otherwise the system font is searched with 'pg.font.match_font',
+        and the pygame default font is used if the face isn't installed.
+
+        Attributes
+        ----------
+        fonts: dict
+            Font objects keyed by (face, size, bold, italic)
+        font_files: dict
+            font file paths keyed by (face, bold, italic), None for the pygame default font
+        hits, misses: int
+            number of fonts found in the cache and created
+
+        Methods
+        -------
+        get(self, size, face=DEFAULTFONT, bold=False, italic=False):
+            returns the Font object of the given face, size and style
+        get_font_file(self, face, bold=False, italic=False):
+            returns the path of the font file of a face
+        clear(self):
+            forgets all the fonts
+    """
+
+    def __init__(self):
+        self.fonts = {}
+        self.font_files = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self):
+        return "<%s: %d fonts, %d hits, %d misses>" % (self.__class__.__name__, len(self.fonts), self.hits, self.misses)
+
+    def get(self, size, face=DEFAULTFONT, bold=False, italic=False):
+        """ Returns the Font object of the given face, size and style.
+
+        :param size: text size in pixel
+        :param face: font name, e.g. 'arial'
+        :param bold: True for a bold font
+        :param italic: True for an italic font
+        :return: Font object
+        """
+
+        key = (face, size, bold, italic)
+        font = self.fonts.get(key)
+        if font is not None:
+            self.hits += 1
+            return font
+
+        self.misses += 1
+        font = pg.font.Font(self.get_font_file(face, bold, italic), size)
+        self.fonts[key] = font
+        return font
+
+    def get_font_file(self, face, bold=False, italic=False):
+        """ Returns the path of the font file of a face.
+
+        :param face: font name, e.g. 'arial'
+        :param bold: True for a bold font
+        :param italic: True for an italic font
+        :return: the font file path, None for the pygame default font
+        """
+
+        key = (face, bold, italic)
+        if key not in self.font_files:
+            suffix = ("bold" if bold else "") + ("italic" if italic else "")
+            bundled_files = [FONTDIR + face + suffix + ".ttf", FONTDIR + face + ".ttf"]
+            bundled_files = [file for file in bundled_files if path.exists(file)]
+            if bundled_files:
+                self.font_files[key] = bundled_files[0]
+            else:
+                self.font_files[key] = pg.font.match_font(face, bold, italic)
+        return self.font_files[key]
+
+    def clear(self):
+        """ Forgets all the fonts.
+
+        Must be called if the pygame font module is restarted, see 'clear_font_caches'.
+
+        :return: None
+        """
+
+        self.fonts = {}
+        self.font_files = {}
+
+
+font_cache = FontCache()
+
+
+def get_font(size, face=DEFAULTFONT, bold=False, italic=False):
+    """ Returns the Font object of the given face, size and style from the font cache.
+
+    :param size: text size in pixel
+    :param face: font name, e.g. 'arial'
+    :param bold: True for a bold font
+    :param italic: True for an italic font
+    :return: Font object
+    """
+
+    return font_cache.get(size, face, bold, italic)
+
+
+class TextLayout:
+    """
+        A class used to keep where each word of a multi lines text is written.
+
+        Attributes
+        ----------
+        nbr_lines: int
+            the number of lines the text takes
+        words: tuple of (str, (int, int))
+            each word and the position of its top-left corner in the text surface
+    """
+
+    def __init__(self, nbr_lines, words):
+        self.nbr_lines = nbr_lines
+        self.words = words
+
+
+@lru_cache(maxsize=TEXTLAYOUTCACHE)
+def get_text_layout(text, max_width, size=25, coordinate=(5, 5), line_height=None):
+    """ Returns the layout of a multi lines text, computed once for each set of parameters.
+
+    A word goes to the next line when it would reach 'max_width'.
+    The words are measured with 'font.size' which gives the size of the rendered word without rendering it.
+    The cache statistics are given by 'get_text_layout.cache_info()'.
+
+    :param text: multi lines text
+    :param max_width: the width of the surface
+    :param size: text size in pixel
+    :param coordinate: a tuple containing the x and y position where you want to start writing the text
+    :param line_height: the height of a line, the height of the words if None
+    :return: TextLayout object
+    """
+
+    font = get_font(size)
+    lines = [line.split(' ') for line in text.splitlines()]  # 2D array where each row is a list of words.
+    space = font.size(' ')[0]  # The width of a space.
+    word_width, word_height = (0, 0 if line_height is None else line_height)
+    x, y = coordinate
+    nbr_lines = 0
+    words = []
+    for line in lines:
+        nbr_lines += 1
+        for word in line:
+            word_width, word_height = font.size(word)
+            if line_height is not None:
+                word_height = line_height
+            if x + word_width >= max_width:
+                nbr_lines += 1
+                x = coordinate[0]  # Reset the x.
+                y += word_height  # Start on new row.
+            words.append((word, (x, y)))
+            x += word_width + space
+        x = coordinate[0]  # Reset the x.
+        y += word_height  # Start on new row.
+
+    return TextLayout(nbr_lines, tuple(words))
+
+
+def clear_font_caches():
+    """ Forgets the fonts and the text layouts measured with them.
+
+    The Font objects belong to the pygame font module that created them:
+    must be called when pygame is initialized again after 'pg.quit', e.g. by 'headless.init_headless'.
+
+    :return: None
+    """
+
+    font_cache.clear()
+    get_text_layout.cache_clear()
+
+
 def draw_text(obj, text, size, coordinate, align="topleft", color=WHITE, mouse_event_key=None):
     """ Display a given one line text on the screen.
 
@@ -38,7 +234,7 @@ def draw_text(obj, text, size, coordinate, align="topleft", color=WHITE, mouse_e
     :exception: align parameter is not valid
     """
 
-    font = pg.font.Font(pg.font.match_font(DEFAULTFONT), size)
+    font = get_font(size)
     text_surface = font.render(' ' + text + ' ', True, color)
     text_rect = text_surface.get_rect()
 
@@ -79,26 +275,7 @@ def get_nbr_lines(max_width, text, size=25, coordinate=(5, 5), surface=None):
     :return: number of lines that a given text takes in a surface of given width
     """
 
-    font = pg.font.Font(pg.font.match_font(DEFAULTFONT), size)
-    lines = [line.split(' ') for line in text.splitlines()]  # 2D array where each row is a list of words.
-    space = font.size(' ')[0]  # The width of a space.
-    word_width, word_height = (0, 0 if surface is None else TILESIZE)
-    x, y = coordinate
-    nbr_lines = 0
-    for line in lines:
-        nbr_lines += 1
-        for word in line:
-            word_surface = font.render(word, True, WHITE)
-            word_width, word_height = (word_surface.get_width(), word_surface.get_height() if surface is None else TILESIZE)
-            if x + word_width >= max_width:
-                nbr_lines += 1
-                x = coordinate[0]  # Reset the x.
-                y += word_height  # Start on new row.
-            x += word_width + space
-        x = coordinate[0]  # Reset the x.
-        y += word_height  # Start on new row.
-
-    return nbr_lines
+    return get_text_layout(text, max_width, size, coordinate, None if surface is None else TILESIZE).nbr_lines
 
 
 def draw_multilines_text(text_surface, text_rect, text, size=25, coordinate=(5, 5), color=WHITE, surface=None):
@@ -117,23 +294,10 @@ def draw_multilines_text(text_surface, text_rect, text, size=25, coordinate=(5,
     :return: None
     """
 
-    font = pg.font.Font(pg.font.match_font(DEFAULTFONT), size)
-    lines = [line.split(' ') for line in text.splitlines()]  # 2D array where each row is a list of words.
-    space = font.size(' ')[0]  # The width of a space.
-    max_width = text_surface.get_width()
-    word_width, word_height = (0, 0 if surface is None else TILESIZE)
-    x, y = coordinate
-    for line in lines:
-        for word in line:
-            word_surface = font.render(word, True, color)
-            word_width, word_height = (word_surface.get_width(), word_surface.get_height() if surface is None else TILESIZE)
-            if x + word_width >= max_width:
-                x = coordinate[0]  # Reset the x.
-                y += word_height  # Start on new row.
-            text_surface.blit(word_surface, (x, y))
-            x += word_width + space
-        x = coordinate[0]  # Reset the x.
-        y += word_height  # Start on new row.
+    font = get_font(size)
+    layout = get_text_layout(text, text_surface.get_width(), size, coordinate, None if surface is None else TILESIZE)
+    for word, position in layout.words:
+        text_surface.blit(font.render(word, True, color), position)
 
     if surface is not None:
         surface.blit(text_surface, text_rect)
@@ -155,6 +319,40 @@ def get_hovered_rectangle(clickable_item, mouse_pos):
     return None
 
 
+def draw_save_pages(obj, free_row=False):
+    """ Display the page of saved games and the arrows to turn it, under the line 'RETOUR' of the load and save screens.
+
+    Nothing is displayed when all the saves fit on one page.
+
+    :param obj: instance owning the rectangles of the arrows, 'PREVPAGE' and 'NEXTPAGE'
+    :param free_row: True on the save screen, which has a page with an empty row after the last save
+    :return: None
+    """
+
+    page = glob.persistence.page
+    page_count = glob.persistence.get_page_count(free_row)
+    if page_count > 1:
+        y = HEIGHT / 2 - 200 + ((SAVESLOTS + 1) * 50)
+        draw_text(obj, "<", 20, (WIDTH / 2 - 50, y), "midtop", BROWN if page > 0 else DARKGREY, 'PREVPAGE')
+        draw_text(obj, str(page + 1) + "/" + str(page_count), 20, (WIDTH / 2, y), "midtop", DARKGREY)
+        draw_text(obj, ">", 20, (WIDTH / 2 + 50, y), "midtop", BROWN if page < page_count - 1 else DARKGREY, 'NEXTPAGE')
+
+
+def draw_save_thumbnail(saved_game, y):
+    """ Display the thumbnail of a saved game at the left of its line in the load and save screens.
+
+    Only the thumbnails of the saves displayed are read and decoded, see 'Persistence.get_thumbnail'.
+
+    :param saved_game: the metadata of the save
+    :param y: the top of the line
+    :return: None
+    """
+
+    thumbnail = glob.persistence.get_thumbnail(saved_game['id'])
+    if thumbnail is not None:
+        glob.screen.blit(thumbnail, thumbnail.get_rect(midright=(WIDTH / 2 - 150, y + 12)))
+
+
 def exit_gracefully(instance):
     """ Quit the game.
 
@@ -169,6 +367,9 @@ def exit_gracefully(instance):
 
     # Need to save the config only when the user quits the game
     glob.persistence.save_user_config()
+    if getattr(instance, "autosaver", None) is not None:  # the game quit before its pending autosave
+        instance.autosaver.stop()
+    glob.persistence.close()  # waits for the saves being written
 
     pg.quit()
     sys.exit()
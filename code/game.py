@@ -16,8 +16,15 @@ from capylib import draw_text, get_hovered_rectangle, exit_gracefully
 from game_display import GameDisplay
 from sprites import Player, Obstacle, NPC, Object, Gate
 from story import Script, QuestType2
-from tilemap import TiledMap, Camera
+from tilemap import MapCache, Camera
+from mapbundle import KIND_GATE, KIND_NPC, KIND_OBJECT, KIND_OBSTACLE
+from spatial import WalkabilityGrid, SpatialIndex
+from prefetch import MapPrefetcher
 from inventory import Inventory
+from replay import InputRecorder
+from persistence import SAVEDONE
+from autosave import AutoSaver, AUTOSAVEEVENT
+from snapshot import GameSnapshot
 from settings import *
 
 
@@ -45,40 +52,71 @@ class Game:
 
         game_display, player, map, camera, script, inventory: objects
             instantiation of classes of the same name
+        map_cache: MapCache
+            keeps the last visited maps in memory
+        prefetcher: MapPrefetcher
+            loads in the background the maps reachable from the current map
 
         all_sprites, obstacles, characters, objects, gates: sprites group
             groups for sprites created in 'sprites.py'
+        walkability: WalkabilityGrid
+            the tiles of the current map blocked by the obstacles, characters and objects
+        spatial_index: SpatialIndex
+            the characters, objects and gates of the current map by tile, and the characters by name
 
         removed_objects: list of strings
             keeps the name of removed objects not to reload them
+        time: int
+            milliseconds of game time simulated by 'update' since the game started
+        recorder: InputRecorder
+            writes the user actions in RECORDDIR when RECORDINPUT is True, None otherwise
+        autosaver: AutoSaver
+            saves the game when the player makes progress, None if autosave is off
+        quicksave: GameSnapshot
+            the state of the game kept in memory by the quicksave key (F5) and restored by the quickload key (F9)
 
         Methods
         -------
         load_map(self, to_map_name, from_map_name=None):
             creates the TiledMap object and all sprites objects on it
-        display(self):
+        run(self):
+            runs the game loop until the user leaves the game
+        is_animating(self):
+            returns True if something moves on the screen without user action
+        display(self, alpha=1):
             call display functions based on boolean variables
-        game_events(self):
+        game_events(self, wait=True):
             manages user actions in the game
+        get_direction(event):
+            returns the direction of a movement key
         pause_menu_validation_handler(self):
             processes the exit from the pause menu
         save_validation_handler(self):
             processes the exit from the save menu
+        request_autosave(self):
+            saves the game in the autosave slot soon, called when the player makes progress
+        quick_save(self):
+            keeps the state of the game in memory
+        quick_load(self):
+            restores the state kept by the last quicksave
         interact(self):
             manages the interactions between the player and the characters and objects
-        update(self):
+        update(self, dt=UPDATESTEP):
             Updates the position and presence of game elements and camera
     """
 
     _instance = None
 
-    def __new__(cls, dummy):
+    def __new__(cls, *args, **kwargs):
         if cls._instance is None:
             cls._instance = super(Game, cls).__new__(cls)
         return cls._instance
 
-    def __init__(self, game_params):
+    def __init__(self, game_params, autosave=AUTOSAVE):
         self.whoami = __name__
+        if getattr(self, "autosaver", None) is not None:  # Game is a singleton, stop the autosave of the previous game
+            self.autosaver.stop()
+        self.autosaver = AutoSaver(self) if autosave else None
 
         # Pygame setup:
         pg.key.set_repeat(KEYREPEATDELAY, KEYREPEATINTERVAL)
@@ -107,8 +145,16 @@ class Game:
         self.characters = pg.sprite.Group()
         self.objects = pg.sprite.Group()
         self.gates = pg.sprite.Group()
+        self.walkability = None  # instantiated in 'load_map' function
+        self.spatial_index = None  # instantiated in 'load_map' function
 
         self.removed_objects = self.game_params["removed_objects"]  # keeps the name of removed objects in order to discard them at reload time
+        self.time = 0
+        self.quicksave = None
+
+        if getattr(self, "recorder", None) is not None:  # Game is a singleton, close the recording of the previous game
+            self.recorder.close()
+        self.recorder = InputRecorder(game_params) if RECORDINPUT else None
 
         # Music:
         if path.exists(SONGPATH):
@@ -122,6 +168,10 @@ class Game:
         self.game_display = GameDisplay(self)
         self.player = Player(self, self.game_params["player"]['x'], self.game_params["player"]['y'])
         self.map = None  # instantiated in 'load_map' function
+        self.map_cache = MapCache(MAPCACHEBUDGET)
+        if getattr(self, "prefetcher", None) is not None:  # Game is a singleton, stop the workers of the previous game
+            self.prefetcher.shutdown()
+        self.prefetcher = MapPrefetcher(self)
         self.camera = None  # instantiated in 'load_map' function
         self.script = Script(self)
         self.inventory = Inventory(self)
@@ -149,7 +199,11 @@ class Game:
         :return: None
         """
 
-        self.map = TiledMap(self, to_map_name)
+        map_version = self.script.maps_version[to_map_name] if to_map_name in self.script.maps_version else ''
+        self.prefetcher.wait_for(to_map_name, map_version)  # the map may already be loaded in the background
+        self.map = self.map_cache.get(to_map_name, map_version)
+        if DEBUG:
+            print("Map", to_map_name + map_version, "loaded,", self.map_cache, glob.assets)
 
         # Reset groups:
         self.all_sprites.empty()
@@ -157,37 +211,93 @@ class Game:
         self.characters.empty()
         self.objects.empty()
         self.gates.empty()
+        self.walkability = WalkabilityGrid(self.map.width // TILESIZE, self.map.height // TILESIZE, self.obstacles)
+        self.spatial_index = SpatialIndex(self.objects)
 
         # Each object in Tiled Map editor has the following properties:
         # name, type, x, y, width, height used to create game objects
+        # and the kind computed from the type by 'mapbundle.get_object_kind'
         # !!! x & y are in pixels
-        for obj in self.map.tmxdata.objects:
-            if obj.type == "gate":
+        for obj in self.map.objects:
+            if obj.kind == KIND_GATE:
                 Gate(self, obj.x, obj.y, obj.width, obj.height, obj.name, obj.dx, obj.dy)
                 if obj.name == from_map_name:  # places the player at the entrance
                     self.player.x = obj.x/TILESIZE
                     self.player.y = obj.y/TILESIZE
-            elif obj.type[0:3] == "npc":
+            elif obj.kind == KIND_NPC:
                 NPC(self, obj.x, obj.y, obj.width, obj.height, obj.name, obj.type, obj.look_to)
-            elif obj.type[0:-1] in ["tree", "dirt", "rock", "trash"]:
+            elif obj.kind == KIND_OBJECT:
                 if obj.name not in self.removed_objects:
                     Object(self, obj.x, obj.y, obj.width, obj.height, obj.name, obj.type)
-            elif obj.type == "obstacle":
+            elif obj.kind == KIND_OBSTACLE:
                 Obstacle(self, obj.x, obj.y, obj.width, obj.height)
 
         self.all_sprites.add(self.player)  # keep the same object Player
 
         self.camera = Camera(self.map.width, self.map.height)
 
-        pg.event.clear()
+        self.prefetcher.prefetch()  # load the neighbour maps while the player walks
+
+        pg.event.clear(pg.KEYDOWN)  # the key repeats sent while loading, releasing a key must still stop the player
 
     # EXECUTION SECTION:
-    def display(self):
+    def run(self):
+        """ Runs the game loop until the user leaves the game.
+
+        The game logic is updated with a fixed timestep of UPDATESTEP milliseconds,
+        as many times as needed to catch up with the time elapsed since the previous frame,
+        then the screen is drawn between the two last updates. The frame rate is limited to FPS.
+        A frame longer than MAXFRAMETIME (slow machine, window moved...) only simulates MAXFRAMETIME.
+
+        While nothing moves, 'game_events' waits for the user and the time spent waiting isn't simulated.
+
+        :return: None
+        """
+
+        clock = pg.time.Clock()
+        lag = 0  # ms of game time not simulated yet
+        idle = True
+        while glob.active_screen == "capytaine":
+            frame_time = clock.tick(FPS)
+            if idle:  # the game was waiting for the user, one update is enough to handle his action
+                lag = UPDATESTEP
+            else:
+                lag += min(frame_time, MAXFRAMETIME)
+
+            while lag >= UPDATESTEP:
+                self.update(UPDATESTEP)
+                lag -= UPDATESTEP
+
+            self.display(lag / UPDATESTEP)
+
+            idle = not self.is_animating()
+            self.game_events()
+
+        if self.recorder is not None:
+            self.recorder.close()
+            self.recorder = None
+        if self.autosaver is not None:
+            self.autosaver.stop()
+
+    def is_animating(self):
+        """ Returns True if something moves on the screen without user action.
+
+        :return: True if the player is walking
+        """
+
+        return self.player.is_moving() or self.player.walking is not None
+
+    def display(self, alpha=1):
         """ Call display functions based on boolean variables.
 
+        :param alpha: fraction of UPDATESTEP elapsed since the last update, used to place the moving sprites
         :return: None
         """
 
+        # Place the player and the camera between the two last updates:
+        self.player.interpolate(alpha)
+        self.camera.update(self.player)
+
         # Pause and medal screen are transparent => draw first the game screen behind
         self.game_display.draw_game()
 
@@ -222,28 +332,55 @@ class Game:
             draw_text(self, self.cheat_text, 25, self.input_box_rect.topleft)
 
         # Once everything is drawn the screen displayed:
-        pg.display.flip()
+        overlay = self.paused or self.show_keys or self.show_save or self.show_quest or self.show_goals or self.show_medal[0] or self.show_cheat_box
+        self.game_display.update_display(overlay)
 
         if DEBUG:
             print("Game screen refreshed at", datetime.now().strftime("%m/%d/%Y, %H:%M:%S"))
 
-    def game_events(self):
+    def game_events(self, wait=True):
         """ Manages user actions in the game.
 
         Actions catched as pygame events
         Type:   - MOUSEMOTION
                 - MOUSEBUTTONUP
                 - KEYDOWN
+                - KEYUP
 
+        Waits for the user while nothing moves,
+        otherwise handles the pending events and returns to draw the next frame.
+
+        :param wait: False to handle the pending events and return without waiting, e.g. in 'headless.py'
         :return: None
         """
 
         user_is_inactive = True
         while user_is_inactive:
-            for event in pg.event.get():
+            polling = not wait or self.is_animating()
+            events = glob.scheduler.wait(0 if polling else None)
+            if self.recorder is not None:
+                self.recorder.record(self.time, events)
+
+            for event in events:
                 if event.type == pg.QUIT:
                     exit_gracefully(self)
 
+                elif event.type == AUTOSAVEEVENT:
+                    if self.autosaver is not None:
+                        self.autosaver.save()
+
+                elif event.type == SAVEDONE:
+                    for job in glob.persistence.collect():
+                        if job.error is not None:
+                            print("Game save failed:", job.error)
+                        elif DEBUG:
+                            print("Game saved with id", job.save_id)
+
+                elif event.type == pg.KEYUP:
+                    direction = self.get_direction(event)
+                    if direction is not None:
+                        self.player.stop_walking(*direction)
+
                 elif event.type == pg.MOUSEMOTION:
                     self.hovered_item = get_hovered_rectangle(self.clickable_item, event.pos)
                     if self.hovered_item is not None:
@@ -267,7 +404,10 @@ class Game:
                                 user_is_inactive = False
 
                 elif event.type == pg.MOUSEBUTTONUP:
-                    if get_hovered_rectangle(self.clickable_item, event.pos) is not None:
+                    clicked_item = get_hovered_rectangle(self.clickable_item, event.pos)
+                    if self.show_save and clicked_item in ('PREVPAGE', 'NEXTPAGE'):
+                        user_is_inactive = not glob.persistence.turn_page(-1 if clicked_item == 'PREVPAGE' else 1, free_row=True)
+                    elif clicked_item is not None:
                         user_is_inactive = False
                         if self.paused:
                             self.pause_menu_validation_handler()
@@ -315,6 +455,10 @@ class Game:
                             glob.user_selection -= 1
                             if glob.user_selection < 0:
                                 glob.user_selection = SAVESLOTS
+                        elif event.key == pg.K_LEFT or event.key == pg.K_PAGEUP:
+                            glob.persistence.turn_page(-1, free_row=True)
+                        elif event.key == pg.K_RIGHT or event.key == pg.K_PAGEDOWN:
+                            glob.persistence.turn_page(1, free_row=True)
                         elif event.key == pg.K_SPACE or event.key == pg.K_RETURN:
                             self.save_validation_handler()
 
@@ -367,14 +511,9 @@ class Game:
                     else:
                         if not self.player.interacting:
                             # Player's movements:
-                            if event.key == pg.K_LEFT or event.scancode == 30:
-                                self.player.move(dx=-1)
-                            elif event.key == pg.K_RIGHT or event.scancode == 32:
-                                self.player.move(dx=1)
-                            elif event.key == pg.K_UP or event.scancode == 17:
-                                self.player.move(dy=-1)
-                            elif event.key == pg.K_DOWN or event.scancode == 31:
-                                self.player.move(dy=1)
+                            direction = self.get_direction(event)
+                            if direction is not None:
+                                self.player.walk(*direction)
 
                             # Player's actions:
                             elif event.key == pg.K_g:
@@ -386,6 +525,10 @@ class Game:
                                     self.show_quest = True
                             elif event.key in [pg.K_c, pg.K_v, pg.K_b, pg.K_n]:
                                 self.inventory.grab(event.key)
+                            elif event.key == pg.K_F5:
+                                self.quick_save()
+                            elif event.key == pg.K_F9:
+                                self.quick_load()
 
                             # Cheat code:
                             elif event.key == pg.K_p:
@@ -406,12 +549,26 @@ class Game:
                             pg.mouse.set_visible(True)
                             pg.key.set_repeat()
 
-                if user_is_inactive:
-                    if self.player.steps % 2 != 0:
-                        self.player.steps += 1
-                        user_is_inactive = False
+            if polling:
+                user_is_inactive = False
+
+    @staticmethod
+    def get_direction(event):
+        """ Returns the direction of a movement key.
+
+        :param event: KEYDOWN or KEYUP Event object
+        :return: (dx, dy) or None if the key isn't a movement key
+        """
 
-                    pg.time.wait(SLEEPTIME)
+        if event.key == pg.K_LEFT or event.scancode == 30:
+            return -1, 0
+        elif event.key == pg.K_RIGHT or event.scancode == 32:
+            return 1, 0
+        elif event.key == pg.K_UP or event.scancode == 17:
+            return 0, -1
+        elif event.key == pg.K_DOWN or event.scancode == 31:
+            return 0, 1
+        return None
 
     def pause_menu_validation_handler(self):
         """ Processes the exit from the pause menu.
@@ -451,15 +608,44 @@ class Game:
         """
 
         if glob.user_selection < SAVESLOTS:
-            glob.saved_games = glob.persistence.save_this_game(self, glob.user_selection)
+            glob.persistence.save_this_game(self, glob.saved_games[glob.user_selection].get('id'))
             if DEBUG:
-                print("Game saved on slot", glob.user_selection)
-                print(glob.saved_games)
+                print("Game save requested on slot", glob.user_selection)
 
         self.show_save = False
         pg.key.set_repeat(KEYREPEATDELAY, KEYREPEATINTERVAL)
         glob.user_selection = 0
 
+    def request_autosave(self):
+        """ Saves the game in the autosave slot soon, called when the player makes progress.
+
+        :return: None
+        """
+
+        if self.autosaver is not None:
+            self.autosaver.request()
+
+    def quick_save(self):
+        """ Keeps the state of the game in memory.
+
+        :return: None
+        """
+
+        self.quicksave = GameSnapshot(self)
+        if DEBUG:
+            print("Quicksave", self.quicksave)
+
+    def quick_load(self):
+        """ Restores the state kept by the last quicksave.
+
+        :return: None
+        """
+
+        if self.quicksave is not None:
+            self.quicksave.restore(self)
+            if DEBUG:
+                print("Quickload", self.quicksave)
+
     def interact(self, key):
         """ Manages the interactions between the player and the characters and objects.
 
@@ -546,17 +732,17 @@ class Game:
                     q.state = 3  # Previous quests are already completed
 
                     if q.name == "chap2q2":
-                        self.script.maps_version["map2"] = "_2"
+                        self.script.set_map_version("map2", "_2")
                     elif q.name == "chap3q2":
-                        self.script.maps_version["mapC"] = "_2"
+                        self.script.set_map_version("mapC", "_2")
                     elif q.name == "chap4q0":
-                        self.script.maps_version["mapD"] = "_2"
-                        self.script.maps_version["map1"] = "_2"
-                        self.script.maps_version["map2"] = "_3"
+                        self.script.set_map_version("mapD", "_2")
+                        self.script.set_map_version("map1", "_2")
+                        self.script.set_map_version("map2", "_3")
                     elif q.name == "chap4q5":
-                        self.script.maps_version["mapC"] = "_3"
-                        self.script.maps_version["mapD"] = "_3"
-                        self.script.maps_version["map4"] = "_2"
+                        self.script.set_map_version("mapC", "_3")
+                        self.script.set_map_version("mapD", "_3")
+                        self.script.set_map_version("map4", "_2")
 
             for t in self.inventory.tools:
                 t.acquired = True
@@ -564,12 +750,17 @@ class Game:
             self.inventory.quest_journal_acquired = True
             self.inventory.goals_booklet_acquired = True
 
-    def update(self):
+    def update(self, dt=UPDATESTEP):
         """ Updates the position and presence of game elements and camera.
 
+        Called by 'run' every UPDATESTEP milliseconds of game time.
+
+        :param dt: milliseconds of game time since the last update
         :return: None
         """
 
+        self.time += dt
+        self.prefetcher.collect()
         self.script.update()
-        self.all_sprites.update()
+        self.all_sprites.update(dt)
         self.camera.update(self.player)
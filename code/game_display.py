@@ -11,7 +11,7 @@ import pygame as pg
 from datetime import datetime
 
 import globvars as glob
-from capylib import draw_text, get_nbr_lines, draw_multilines_text
+from capylib import draw_text, get_nbr_lines, draw_multilines_text, get_font, draw_save_pages, draw_save_thumbnail
 from sprites import Player, NPC
 from story import QuestType1, QuestType2
 from settings import *
@@ -26,11 +26,28 @@ class GameDisplay:
         ----------
         game: Game
             the 'Game' object from which this class was instantiated
+        full_update: bool
+            True when the whole screen has to be sent to the display
+        dirty_rects: list of Rect objects
+            the parts of the screen that changed during the last 'draw_game', when 'full_update' is False
+        drawn_items: dict
+            the rectangle and image of each element drawn over the map during the last frame
+        dialogue_page: Surface
+            the whole dialogue of the current interaction, None when the player isn't interacting
+        dialogue_key: (str, str, int)
+            the dialogue text, quest name and quest state 'dialogue_page' was drawn for
+
+        When DIRTYRECTS is True, only the parts of the screen that changed since the previous frame are updated:
+        the old and new places of the sprites and quest marks that moved or changed image,
+        the text box when its dialogue page or line changes, the interaction prompt and the tool icon.
+        The whole screen is updated when the camera moves, when the map changes or after an overlay screen.
 
         Methods
         -------
         draw_game(self):
             function that builds the screen to display when in game
+        update_display(self, overlay=False):
+            sends the screen built by 'draw_game' to the display
         show_pause_screen(self):
             displays the pause menu
         show_keys_screen(self):
@@ -50,11 +67,22 @@ class GameDisplay:
 
         self.game = game
 
+        # Dirty rectangles:
+        self.full_update = True
+        self.dirty_rects = []
+        self.drawn_items = {}
+        self.drawn_map = None
+        self.drawn_camera = None
+
+        # Dialogue:
+        self.dialogue_page = None
+        self.dialogue_key = None
+
         # Surface creation section:
         self.pause_screen = pg.Surface(SIZE, pg.SRCALPHA)
         self.pause_screen.fill((0, 0, 0, 120))
 
-        self.quest_journal_screen = pg.image.load(IMAGEDIR + 'parchment.png')  # Surface((17 * TILESIZE, 12 * TILESIZE), pg.SRCALPHA)
+        self.quest_journal_screen = glob.assets.get_image('parchment.png')  # Surface((17 * TILESIZE, 12 * TILESIZE), pg.SRCALPHA)
         self.quest_journal_screen_rect = self.quest_journal_screen.get_rect()
         self.quest_journal_screen_rect.center = glob.screen.get_rect().center
 
@@ -75,19 +103,19 @@ class GameDisplay:
         self.text_box_rect.bottomleft = (0, HEIGHT)
 
         # Images:
-        self.quest_mark_black = pg.image.load(IMAGEDIR + 'questMark_black.png').convert_alpha()
-        self.quest_mark_grey = pg.image.load(IMAGEDIR + 'questMark_grey.png').convert_alpha()
-        self.quest_mark_green = pg.image.load(IMAGEDIR + 'questMark_green.png').convert_alpha()
-        self.medal_img = pg.transform.scale2x(pg.image.load(IMAGEDIR + 'medal.png').convert_alpha())
-        self.down_arrow = pg.image.load(IMAGEDIR + 'down_arrow.png').convert_alpha()
-        self.up_arrow = pg.image.load(IMAGEDIR + 'up_arrow.png').convert_alpha()
-        self.locked_img = pg.image.load(IMAGEDIR + 'locked.png').convert_alpha()
-        self.goal_medal_img = pg.image.load(IMAGEDIR + 'goal_medal.png').convert_alpha()
-        self.keyboard_img = pg.image.load(IMAGEDIR + 'keyboard.png').convert_alpha()
-        self.over_text_box_img = pg.image.load(IMAGEDIR + 'over_text_box.png').convert_alpha()
-        self.savemenu_bkg = pg.image.load(IMAGEDIR + 'bkg-swirls.jpg')
-        self.select_right = pg.image.load(IMAGEDIR + 'select_right.png')
-        self.select_left = pg.image.load(IMAGEDIR + 'select_left.png')
+        self.quest_mark_black = glob.assets.get_image('questMark_black.png')
+        self.quest_mark_grey = glob.assets.get_image('questMark_grey.png')
+        self.quest_mark_green = glob.assets.get_image('questMark_green.png')
+        self.medal_img = pg.transform.scale2x(glob.assets.get_image('medal.png'))
+        self.down_arrow = glob.assets.get_image('down_arrow.png')
+        self.up_arrow = glob.assets.get_image('up_arrow.png')
+        self.locked_img = glob.assets.get_image('locked.png')
+        self.goal_medal_img = glob.assets.get_image('goal_medal.png')
+        self.keyboard_img = glob.assets.get_image('keyboard.png')
+        self.over_text_box_img = glob.assets.get_image('over_text_box.png')
+        self.savemenu_bkg = glob.assets.get_image('bkg-swirls.jpg')
+        self.select_right = glob.assets.get_image('select_right.png')
+        self.select_left = glob.assets.get_image('select_left.png')
 
     def draw_game(self):
         """ Function that builds the screen to display when in game.
@@ -100,10 +128,11 @@ class GameDisplay:
         """
 
         glob.screen.fill(BLACK)  # Start from a blank page ;)
+        items = {}  # key -> (rect, image) of everything drawn over the map
 
         # Draw the map:
         self.map_screen.fill(BLACK)
-        self.map_screen.blit(self.game.map.image, self.game.camera.apply(self.game.map.rect))
+        self.game.map.draw(self.map_screen, self.game.camera)
 
         # Draw all sprites:
         for sprite in self.game.all_sprites:
@@ -120,27 +149,27 @@ class GameDisplay:
                 x = self.game.camera.apply(sprite).x
                 y = self.game.camera.apply(sprite).y
 
-                self.map_screen.blit(sprite_image, (x + x_offset, y + y_offset))
+                items[sprite] = (self.map_screen.blit(sprite_image, (x + x_offset, y + y_offset)), sprite_image)
 
         # Draw quest mark on npc:
         if self.game.script.current_quest.state == 1:  # quest is unlocked but not accepted yet
             quest_mark_image = self.quest_mark_black
-            for c in self.game.characters:
-                if c.name == self.game.script.current_quest.quest_giver_name:
-                    quest_mark_image_rect = quest_mark_image.get_rect()
-                    quest_mark_image_rect.topleft = (c.x * TILESIZE, (c.y - 1) * TILESIZE)
-                    self.map_screen.blit(quest_mark_image, self.game.camera.apply(quest_mark_image_rect))
+            c = self.game.spatial_index.get_npc(self.game.script.current_quest.quest_giver_name)
+            if c is not None:
+                quest_mark_image_rect = quest_mark_image.get_rect()
+                quest_mark_image_rect.topleft = (c.x * TILESIZE, (c.y - 1) * TILESIZE)
+                items["quest_mark", c] = (self.map_screen.blit(quest_mark_image, self.game.camera.apply(quest_mark_image_rect)), quest_mark_image)
         elif self.game.script.current_quest.state == 2:  # quest is in progress but not completed yet
             if isinstance(self.game.script.current_quest, QuestType2) and not self.game.script.current_quest.validated:
                 quest_mark_image = self.quest_mark_grey
             else:
                 quest_mark_image = self.quest_mark_green
 
-            for c in self.game.characters:
-                if c.name == self.game.script.current_quest.quest_validator_name:
-                    quest_mark_image_rect = quest_mark_image.get_rect()
-                    quest_mark_image_rect.topleft = (c.x * TILESIZE, (c.y - 1) * TILESIZE)
-                    self.map_screen.blit(quest_mark_image, self.game.camera.apply(quest_mark_image_rect))
+            c = self.game.spatial_index.get_npc(self.game.script.current_quest.quest_validator_name)
+            if c is not None:
+                quest_mark_image_rect = quest_mark_image.get_rect()
+                quest_mark_image_rect.topleft = (c.x * TILESIZE, (c.y - 1) * TILESIZE)
+                items["quest_mark", c] = (self.map_screen.blit(quest_mark_image, self.game.camera.apply(quest_mark_image_rect)), quest_mark_image)
 
         # End of map section => blit map:
         glob.screen.blit(self.map_screen, self.map_screen_rect)
@@ -159,14 +188,20 @@ class GameDisplay:
             else:
                 dialogue = None
 
-            self.game.nbr_lines = get_nbr_lines(WIDTH - TILESIZE, dialogue, 25, (5,0), self.text_box)
-            text_surface = pg.Surface((WIDTH - TILESIZE, self.game.nbr_lines * TILESIZE))  # WIDTH - TILESIZE to let space for arrow images
-            text_rect = text_surface.get_rect()
-            text_rect.topleft = (0, - self.game.line_number*TILESIZE)
-            draw_multilines_text(text_surface, text_rect, dialogue, coordinate=(5,0), surface=self.text_box)
+            # The whole dialogue is drawn once, scrolling only changes the part of it shown in the text box:
+            dialogue_key = (dialogue, self.game.script.current_quest.name, self.game.script.current_quest.state)
+            if self.dialogue_page is None or dialogue_key != self.dialogue_key:
+                self.game.nbr_lines = get_nbr_lines(WIDTH - TILESIZE, dialogue, 25, (5,0), self.text_box)
+                text_surface = pg.Surface((WIDTH - TILESIZE, self.game.nbr_lines * TILESIZE))  # WIDTH - TILESIZE to let space for arrow images
+                draw_multilines_text(text_surface, text_surface.get_rect(), dialogue, coordinate=(5,0), surface=self.text_box)
+                self.dialogue_page = text_surface
+                self.dialogue_key = dialogue_key
+
+            page_area = pg.Rect(0, self.game.line_number * TILESIZE, self.dialogue_page.get_width(), self.text_box_rect.height)
+            self.text_box.blit(self.dialogue_page, (0, 0), page_area)
 
             glob.screen.blit(self.text_box, self.text_box_rect)
-            glob.screen.blit(self.over_text_box_img, (0, self.text_box_rect.y - 2 * TILESIZE))
+            over_text_box_rect = glob.screen.blit(self.over_text_box_img, (0, self.text_box_rect.y - 2 * TILESIZE))
 
             if self.game.line_number > 0:
                 glob.screen.blit(self.up_arrow, (WIDTH - TILESIZE, HEIGHT - 2*TILESIZE))
@@ -174,8 +209,15 @@ class GameDisplay:
             if self.game.line_number < self.game.nbr_lines - 1:
                 glob.screen.blit(self.down_arrow, (WIDTH - TILESIZE, HEIGHT - TILESIZE))
 
-        elif self.game.player.ready_to_interact():
-            draw_text(self.game, "Appuie sur la barre espace pour intéragir", 25, self.text_box_rect.midtop, "midtop")
+            # the box only changes with the dialogue page and when the player scrolls
+            items["text_box"] = (self.text_box_rect.union(over_text_box_rect), (self.dialogue_page, self.game.line_number))
+
+        else:
+            self.dialogue_page = None  # the interaction is over, free the dialogue
+
+            if self.game.player.ready_to_interact():
+                draw_text(self.game, "Appuie sur la barre espace pour intéragir", 25, self.text_box_rect.midtop, "midtop")
+                items["text_box"] = (self.text_box_rect, None)
 
         # Draw tools:
         tool_image = self.game.inventory.get_tool_image()
@@ -184,6 +226,35 @@ class GameDisplay:
             tool_image_rect.topleft = (WIDTH - TILESIZE, HEIGHT - TILESIZE)
 
             glob.screen.blit(tool_image, tool_image_rect)
+            items["tool"] = (tool_image_rect, None)
+
+        # Find what changed since the previous frame:
+        if self.game.map is not self.drawn_map or self.game.camera.camera != self.drawn_camera:
+            self.full_update = True
+        if not self.full_update:
+            self.dirty_rects = [rect for key, (rect, image) in items.items() if image is None or self.drawn_items.get(key) != (rect, image)]
+            self.dirty_rects += [rect for key, (rect, image) in self.drawn_items.items() if items.get(key) != (rect, image)]
+
+        self.drawn_items = items
+        self.drawn_map = self.game.map
+        self.drawn_camera = self.game.camera.camera.copy()
+
+    def update_display(self, overlay=False):
+        """ Sends the screen built by 'draw_game' to the display.
+
+        Only the dirty rectangles are updated, unless the whole screen changed or DIRTYRECTS is False.
+
+        :param overlay: True when a screen is drawn over the game screen, the next frame must then erase it
+        :return: None
+        """
+
+        if self.full_update or overlay or not DIRTYRECTS:
+            pg.display.flip()
+        elif self.dirty_rects:
+            pg.display.update(self.dirty_rects)
+
+        self.full_update = overlay
+        self.dirty_rects = []
 
     # SCREENS SECTION:
     def show_pause_screen(self):
@@ -206,7 +277,7 @@ class GameDisplay:
                 fontsize = 25
             else:
                 fontsize = 30
-                font = pg.font.Font(pg.font.match_font(DEFAULTFONT), fontsize)
+                font = get_font(fontsize)
                 text_surface = font.render(' ' + text + ' ', True, BLACK)
                 text_width = text_surface.get_width()
                 position_left = (WIDTH / 2 - text_width / 2 - TILESIZE, HEIGHT / 2 - 147 + idx * 50)
@@ -243,6 +314,7 @@ class GameDisplay:
         """
 
         self.game.clickable_item = {}
+        glob.persistence.collect()  # a save may have been written since the page was loaded
         glob.screen.fill(BLACK)
         glob.screen.blit(self.savemenu_bkg, (0, 0))
 
@@ -256,14 +328,16 @@ class GameDisplay:
                 else:
                     fontsize = 25
                     color = RED
-                draw_text(self.game, glob.saved_games[idx]['timestamp'].strftime("%m/%d/%Y, %H:%M:%S"), fontsize,
+                draw_text(self.game, ("Auto " if glob.saved_games[idx]['autosave'] else "") + glob.saved_games[idx]['timestamp'].strftime("%m/%d/%Y, %H:%M:%S"), fontsize,
                           (WIDTH / 2, HEIGHT / 2 - 200 + (idx * 50)), "midtop", color, 'SLOT' + str(idx))
+                draw_save_thumbnail(glob.saved_games[idx], HEIGHT / 2 - 200 + (idx * 50))
             else:
                 draw_text(self.game, "VIDE", 20, (WIDTH / 2, HEIGHT / 2 - 200 + (idx * 50)), "midtop",
                           BROWN if glob.user_selection != idx else GREEN, 'SLOT' + str(idx))
 
         draw_text(self.game, "RETOUR", 20, (WIDTH / 2, HEIGHT / 2 - 200 + (SAVESLOTS * 50)), "midtop",
                   DARKGREY if glob.user_selection < SAVESLOTS else GREEN, 'BACK')
+        draw_save_pages(self.game, free_row=True)
 
         pg.display.flip()
         if DEBUG:
@@ -2,6 +2,8 @@
 
 screen = None
 persistence = None
+assets = None
+scheduler = None
 active_screen = "mainmenu"  # Holds name of screen currently displayed
 user_selection = 0  # Holds menu line number currently selected by user
 saved_games = []
@@ -0,0 +1,248 @@
+"""
+    This module runs the game without a window nor an audio device,
+    e.g. for benchmarks and automated playthroughs on servers without display.
+
+    The game is played programmatically: the input is posted as pygame events
+    and the game time advances by fixed steps, independently of the real time,
+    so a playthrough gives the same result each time it is run.
+
+    Functions
+    ---------
+    init_headless(size=SIZE, db_path=None):
+        initializes pygame with SDL's dummy video and audio drivers
+    get_temporary_db_path():
+        returns the path of a database of saves deleted when Python exits
+    close_headless():
+        closes the database of saves opened by 'init_headless'
+
+    Class
+    -----
+    HeadlessGame:
+        a class used to build a game and to play it programmatically
+"""
+
+import copy
+import os
+import tempfile
+
+import pygame as pg
+
+import globvars as glob
+from assets import AssetManager
+from capylib import clear_font_caches
+from game import Game
+from persistence import Persistence
+from scheduler import EventScheduler
+from settings import SIZE, SAVEDBPATH, UPDATESTEP, GAME_STARTUP_PARAMS
+
+
+temporary_dir = None  # folder of the default database of the headless games, see 'get_temporary_db_path'
+
+
+def init_headless(size=SIZE, db_path=None):
+    """ Initializes pygame with SDL's dummy video and audio drivers.
+
+    Sets the globals 'main.py' sets with a real window: the persistence, the screen, the asset manager and the event scheduler.
+    Images are converted to the format of the dummy display, like they are to the format of a window.
+    The saves are written in a temporary database by default, not to change those of the player.
+
+    :param size: the dimensions of the screen
+    :param db_path: the database of the saves, None for a temporary one
+    :return: the screen Surface object
+    """
+
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
+    os.environ["SDL_AUDIODRIVER"] = "dummy"
+    if pg.display.get_init() and pg.display.get_driver() != "dummy":
+        pg.display.quit()  # the driver is chosen when the display module is initialized
+
+    if glob.persistence is not None and db_path is not None and glob.persistence.db_path != db_path:
+        close_headless()  # e.g. a test using its own database
+    if glob.persistence is None:
+        glob.persistence = Persistence(get_temporary_db_path() if db_path is None else db_path)
+        glob.persistence.get_saved_games()
+
+    if not pg.font.get_init():  # pygame was quit, the fonts created before can't be used anymore
+        clear_font_caches()
+    pg.init()
+    glob.screen = pg.display.set_mode(size)
+
+    if glob.assets is None:
+        glob.assets = AssetManager()
+    else:
+        glob.assets.reconvert()
+    if glob.scheduler is None:
+        glob.scheduler = EventScheduler()
+    return glob.screen
+
+
+def get_temporary_db_path():
+    """ Returns the path of a database of saves deleted when Python exits.
+
+    The database is created by the persistence, the same path is returned by each call.
+
+    :return: the path of the database in a temporary folder
+    """
+
+    global temporary_dir
+    if temporary_dir is None:
+        temporary_dir = tempfile.TemporaryDirectory(prefix="capytaine")
+    return os.path.join(temporary_dir.name, os.path.basename(SAVEDBPATH))
+
+
+def close_headless():
+    """ Closes the database of saves opened by 'init_headless'.
+
+    The pending saves are written first. pygame stays initialized, the next 'init_headless' opens a database again.
+
+    :return: None
+    """
+
+    if glob.persistence is not None:
+        glob.persistence.close()
+        glob.persistence = None
+
+
+class HeadlessGame:
+    """
+        A class used to build a game and to play it programmatically.
+
+        'init_headless' is called if the display isn't initialized yet.
+        The game isn't autosaved unless it is built with 'autosave=True', not to fill the saves of the player.
+
+        Attributes
+        ----------
+        game: Game
+            the game being played
+        frames: int
+            number of screens drawn since the game was built
+
+        Methods
+        -------
+        from_save(cls, slot):
+            builds the game saved in a slot
+        press(self, key, unicode=''):
+            posts the event of a key pressed by the user
+        release(self, key):
+            posts the event of a key released by the user
+        tap(self, key, unicode=''):
+            presses and releases a key
+        step(self, dt=UPDATESTEP, draw=True):
+            handles the pending input and advances the game by one update
+        run(self, duration, dt=UPDATESTEP, draw=True):
+            advances the game by 'duration' milliseconds of game time
+        screenshot(self):
+            returns a copy of the last screen drawn
+        close(self):
+            stops the background workers of the game
+    """
+
+    def __init__(self, game_params=None, autosave=False):
+        if glob.screen is None or not pg.display.get_init():
+            init_headless()
+
+        self.game = Game(copy.deepcopy(GAME_STARTUP_PARAMS if game_params is None else game_params), autosave)
+        glob.active_screen = "capytaine"
+        self.frames = 0
+
+    @classmethod
+    def from_save(cls, slot):
+        """ Builds the game saved in a slot.
+
+        :param slot: the save slot, 0 for the most recent save
+        :return: HeadlessGame object
+        :raise ValueError: if nothing is saved in this slot
+        """
+
+        if glob.persistence is None:
+            init_headless()
+
+        saved_games = glob.persistence.list_saved_games(slot, 1)
+        if not saved_games:
+            raise ValueError("No game saved in slot " + str(slot))
+        return cls(glob.persistence.load_game(saved_games[0]["id"]))
+
+    @staticmethod
+    def press(key, unicode=''):
+        """ Posts the event of a key pressed by the user.
+
+        The event is handled at the next 'step'.
+
+        :param key: pygame key constant, e.g. pg.K_RIGHT
+        :param unicode: the character typed, used by the cheat box
+        :return: None
+        """
+
+        pg.event.post(pg.event.Event(pg.KEYDOWN, key=key, scancode=0, mod=0, unicode=unicode))
+
+    @staticmethod
+    def release(key):
+        """ Posts the event of a key released by the user.
+
+        :param key: pygame key constant
+        :return: None
+        """
+
+        pg.event.post(pg.event.Event(pg.KEYUP, key=key, scancode=0, mod=0))
+
+    def tap(self, key, unicode=''):
+        """ Presses and releases a key.
+
+        Both events are handled at the next 'step', a movement key makes the player walk one tile.
+
+        :param key: pygame key constant
+        :param unicode: the character typed, used by the cheat box
+        :return: None
+        """
+
+        self.press(key, unicode)
+        self.release(key)
+
+    def step(self, dt=UPDATESTEP, draw=True):
+        """ Handles the pending input and advances the game by one update.
+
+        :param dt: milliseconds of game time to simulate
+        :param draw: False not to draw the screen, e.g. to simulate faster
+        :return: None
+        """
+
+        self.game.game_events(wait=False)
+        self.game.update(dt)
+        if draw:
+            self.game.display()
+            self.frames += 1
+
+    def run(self, duration, dt=UPDATESTEP, draw=True):
+        """ Advances the game by 'duration' milliseconds of game time.
+
+        :param duration: milliseconds of game time to simulate
+        :param dt: milliseconds of game time simulated by each update
+        :param draw: False not to draw the screens
+        :return: the number of updates
+        """
+
+        steps = 0
+        end = self.game.time + duration
+        while self.game.time < end and glob.active_screen == "capytaine":
+            self.step(dt, draw)
+            steps += 1
+        return steps
+
+    @staticmethod
+    def screenshot():
+        """ Returns a copy of the last screen drawn.
+
+        :return: Surface object
+        """
+
+        return glob.screen.copy()
+
+    def close(self):
+        """ Stops the background workers of the game.
+
+        :return: None
+        """
+
+        self.game.prefetcher.shutdown()
+        if self.game.autosaver is not None:
+            self.game.autosaver.stop()
@@ -12,6 +12,7 @@
 
 import pygame as pg
 
+import globvars as glob
 from settings import *
 
 
@@ -161,7 +162,7 @@ class Tool:
 
     def __init__(self, inventory, name, use_text, key):
         self.name = name
-        self.image = pg.image.load(IMAGEDIR + 'tools/' + self.name + '.png').convert_alpha()
+        self.image = glob.assets.get_image('tools/' + self.name + '.png')
         self.use_text = use_text
         self.key = key
 
@@ -5,6 +5,8 @@ from menu import Menu
 from game import Game
 from settings import WIDTH, HEIGHT
 from persistence import Persistence
+from assets import AssetManager
+from scheduler import EventScheduler
 
 # Get initial parameters
 glob.persistence = Persistence()
@@ -14,6 +16,8 @@ glob.persistence.get_saved_games()
 pg.init()
 pg.display.set_caption("Capytaine Durable")
 glob.screen = pg.display.set_mode((WIDTH, HEIGHT), pg.FULLSCREEN if glob.user_config['fullscreen_mode'] else 0)
+glob.assets = AssetManager()  # images are converted to the display format, so it needs the display
+glob.scheduler = EventScheduler()
 
 menu = Menu()
 
@@ -24,7 +28,4 @@ while glob.active_screen == "mainmenu":
     # Game management
     if glob.active_screen == "capytaine":
         game = Game(menu.game_params)
-        while glob.active_screen == "capytaine":
-            game.update()
-            game.display()
-            game.game_events()
+        game.run()
@@ -0,0 +1,524 @@
+"""
+    This module compiles the maps created with Tiled editor into binary bundles
+    and loads them back without parsing any XML.
+
+    A bundle is written next to its '.tmx' file with the BUNDLEEXT extension.
+    Run 'python mapbundle.py' to compile all maps after editing them in Tiled,
+    and 'python mapbundle.py --benchmark' to compare both loaders on all maps.
+    A map whose bundle is missing or older than its '.tmx' file, its tilesets or their images is still loaded with pytmx.
+
+    Bundle layout (little-endian):
+        header:     magic, version, map width & height (tiles), tile width & height (pixels),
+                    number of strings, images, tiles, objects, layers and dependencies
+        strings:    length-prefixed utf-8 strings, referenced by index everywhere else
+        images:     tileset image path (relative to the bundle) and colorkey
+        dependencies: paths (relative to the bundle) of the '.tsx' tilesets and images the bundle was compiled from
+        tiles:      for each gid: image index, source rect and flip flags
+        objects:    kind, name, type, look_to, x, y, width, height (pixels), dx, dy
+        layers:     name, visibility then width * height gids as unsigned 32 bits integers
+
+    Class
+    -----
+    MapBundle:
+        a class used to read a compiled map bundle
+    BundleLayer:
+        a class used to represent a tile layer of a bundle
+    BundleObject:
+        a class used to represent an object of a bundle
+
+    Functions
+    ---------
+    compile_map(tmx_path, bundle_path=None):
+        compiles a '.tmx' file into a bundle
+    compile_all_maps(map_dir=MAPDIR):
+        compiles all '.tmx' files of a folder
+    load_map_data(map_path):
+        returns the bundle of a map if it is up to date, the pytmx data otherwise
+    benchmark_loaders(map_dir=MAPDIR, repeat=5):
+        times pytmx and bundle loading on all maps of a folder
+"""
+
+import sys
+import mmap
+import struct
+import threading
+from array import array
+from os import path, listdir
+from xml.etree import ElementTree
+
+import pygame as pg
+import pytmx
+from pytmx.util_pygame import handle_transformation, smart_convert
+
+from settings import MAPDIR, BUNDLEEXT
+
+BUNDLEMAGIC = b"CAPM"
+BUNDLEVERSION = 2
+
+HEADER = struct.Struct("<4sHHHHHIIIIII")
+STRING_LEN = struct.Struct("<H")
+DEPENDENCY = struct.Struct("<I")  # path string
+IMAGE = struct.Struct("<II")  # path string, colorkey (0 = no colorkey, 0x1RRGGBB otherwise)
+TILE = struct.Struct("<HhhhhB")  # image, rect x, y, w, h, flags
+OBJECT = struct.Struct("<BBIIIddddbb")  # kind, present properties, name, type, look_to, x, y, w, h, dx, dy
+LAYER = struct.Struct("<IB3x")  # name, visible, padding to keep gids aligned
+
+NO_STRING = 0xFFFFFFFF
+NO_IMAGE = 0xFFFF
+
+# Object kinds, 'Game.load_map' creates the sprites from them:
+KIND_GATE, KIND_NPC, KIND_OBJECT, KIND_OBSTACLE, KIND_OTHER = range(5)
+OBJECT_TYPES = ["tree", "dirt", "rock", "trash"]
+
+# Optional object properties stored in a bundle:
+HAS_DX, HAS_DY, HAS_LOOK_TO = 1, 2, 4
+
+FLIP_H, FLIP_V, FLIP_D = 1, 2, 4
+
+# Tileset images are shared by most maps, load each of them only once:
+_tileset_images = {}
+_tileset_lock = threading.Lock()
+
+
+class BundleLayer:
+    """
+        A class used to represent a tile layer of a bundle.
+
+        Attributes
+        ----------
+        name: str
+            the layer name
+        visible: bool
+            True if the layer is drawn
+        width, height: int (tiles)
+            the layer dimensions
+        gids: memoryview
+            all gids of the layer, line after line
+        data: list of memoryview
+            one row of gids per line of the layer, data[y][x] is the gid of the tile (x, y)
+    """
+
+    def __init__(self, name, visible, width, height, gids):
+        self.name = name
+        self.visible = visible
+        self.width = width
+        self.height = height
+        self.gids = gids
+        self.data = [gids[y * width:(y + 1) * width] for y in range(height)]
+
+    def __iter__(self):
+        for y, row in enumerate(self.data):
+            for x, gid in enumerate(row):
+                yield x, y, gid
+
+
+class BundleObject:
+    """
+        A class used to represent an object of a bundle,
+        it has the same attributes as the pytmx objects used in 'Game.load_map'.
+
+        Attributes
+        ----------
+        kind: int
+            the pre-computed kind of the object (KIND_GATE, KIND_NPC, ...)
+        name, type: str
+            the name and type given in Tiled editor
+        x, y, width, height: float (pixels)
+            the object position and dimensions
+        dx, dy, look_to:
+            the custom properties, only set if the object has them
+    """
+
+    def __init__(self, kind, name, type, x, y, width, height):
+        self.kind = kind
+        self.name = name
+        self.type = type
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+
+    def __repr__(self):
+        return "<%s: \"%s\" (%s)>" % (self.__class__.__name__, self.name, self.type)
+
+
+class MapBundle:
+    """
+        A class used to read a compiled map bundle.
+
+        The file is memory-mapped and the layers are read directly from it,
+        only the tile images that are actually drawn are created.
+
+        Attributes
+        ----------
+        width, height: int (tiles)
+            the map dimensions
+        tilewidth, tileheight: int (pixels)
+            the tiles dimensions
+        layers: list of BundleLayer
+            all tile layers of the map
+        objects: list of BundleObject
+            all objects of the map
+        dependencies: list of str
+            the paths of the tilesets and tileset images the bundle was compiled from
+
+        Methods
+        -------
+        visible_layers(self):
+            yields the visible layers
+        is_up_to_date(self):
+            returns False if a tileset or a tileset image changed since the bundle was compiled
+        get_tile_image_by_gid(self, gid):
+            returns the image of a tile
+        loaded_tile_images(self):
+            returns the tile images created so far
+        close(self):
+            releases the memory-mapped file
+    """
+
+    def __init__(self, bundle_path):
+        self.path = bundle_path
+        with open(bundle_path, 'rb') as bundlefile:
+            self._mmap = mmap.mmap(bundlefile.fileno(), 0, access=mmap.ACCESS_READ)
+        self._buffer = buffer = memoryview(self._mmap)
+
+        magic, version, self.width, self.height, self.tilewidth, self.tileheight, \
+            nbr_strings, nbr_images, nbr_tiles, nbr_objects, nbr_layers, nbr_dependencies = HEADER.unpack_from(buffer, 0)
+        if magic != BUNDLEMAGIC or version != BUNDLEVERSION:
+            buffer.release()
+            self._mmap.close()
+            raise ValueError("'{}' is not a version {} map bundle.".format(bundle_path, BUNDLEVERSION))
+        offset = HEADER.size
+
+        strings = []
+        for idx in range(nbr_strings):
+            length, = STRING_LEN.unpack_from(buffer, offset)
+            offset += STRING_LEN.size
+            strings.append(bytes(buffer[offset:offset + length]).decode("utf-8"))
+            offset += length
+        get_string = lambda sid: None if sid == NO_STRING else strings[sid]
+
+        bundle_dir = path.dirname(bundle_path)
+        self._images = []
+        for path_sid, colorkey in IMAGE.iter_unpack(buffer[offset:offset + nbr_images * IMAGE.size]):
+            colorkey = "{:06x}".format(colorkey & 0xFFFFFF) if colorkey else None
+            self._images.append((path.join(bundle_dir, strings[path_sid]), colorkey))
+        offset += nbr_images * IMAGE.size
+
+        self.dependencies = [path.join(bundle_dir, strings[path_sid])
+                             for path_sid, in DEPENDENCY.iter_unpack(buffer[offset:offset + nbr_dependencies * DEPENDENCY.size])]
+        offset += nbr_dependencies * DEPENDENCY.size
+
+        self._tiles = list(TILE.iter_unpack(buffer[offset:offset + nbr_tiles * TILE.size]))
+        self._tile_images = [None] * nbr_tiles
+        offset += nbr_tiles * TILE.size
+
+        self.objects = []
+        for kind, present, name, type, look_to, x, y, w, h, dx, dy in \
+                OBJECT.iter_unpack(buffer[offset:offset + nbr_objects * OBJECT.size]):
+            obj = BundleObject(kind, get_string(name), get_string(type), x, y, w, h)
+            if present & HAS_DX:
+                obj.dx = dx
+            if present & HAS_DY:
+                obj.dy = dy
+            if present & HAS_LOOK_TO:
+                obj.look_to = get_string(look_to)
+            self.objects.append(obj)
+        offset += nbr_objects * OBJECT.size
+        offset += -offset % 4  # gids are aligned
+
+        self.layers = []
+        layer_size = self.width * self.height * 4
+        for idx in range(nbr_layers):
+            name, visible = LAYER.unpack_from(buffer, offset)
+            offset += LAYER.size
+            if sys.byteorder == "little":
+                gids = buffer[offset:offset + layer_size].cast('I')
+            else:
+                gids = memoryview(array('I', struct.unpack_from("<%dI" % (self.width * self.height), buffer, offset)))
+            self.layers.append(BundleLayer(get_string(name), bool(visible), self.width, self.height, gids))
+            offset += layer_size
+
+    @property
+    def visible_layers(self):
+        """ Yields the visible layers, like pytmx 'visible_layers'.
+
+        :return: generator of BundleLayer objects
+        """
+
+        for layer in self.layers:
+            if layer.visible:
+                yield layer
+
+    def is_up_to_date(self):
+        """ Returns False if a tileset or a tileset image changed since the bundle was compiled.
+
+        A missing file doesn't make the bundle stale, e.g. the tilesets are not needed once the maps are compiled.
+
+        :return: bool
+        """
+
+        bundle_time = path.getmtime(self.path)
+        return all(not path.exists(dependency) or path.getmtime(dependency) <= bundle_time for dependency in self.dependencies)
+
+    def get_tile_image_by_gid(self, gid):
+        """ Returns the image of a tile.
+
+        Images are created the first time they are asked for,
+        with the same transformations and conversion as pytmx.
+
+        :param gid: the gid of the tile
+        :return: the tile image, which is a Surface object, or None for an empty tile
+        """
+
+        if gid == 0 or gid >= len(self._tiles):
+            return None
+        tile = self._tile_images[gid]
+        if tile is None:
+            image_idx, x, y, w, h, flags = self._tiles[gid]
+            if image_idx == NO_IMAGE:
+                return None
+            image_path, colorkey = self._images[image_idx]
+            with _tileset_lock:  # the prefetch workers load maps at the same time
+                if image_path not in _tileset_images:
+                    _tileset_images[image_path] = pg.image.load(image_path)
+            tile = _tileset_images[image_path].subsurface((x, y, w, h))
+            if flags:
+                tile = handle_transformation(tile, pytmx.TileFlags(bool(flags & FLIP_H), bool(flags & FLIP_V), bool(flags & FLIP_D)))
+            tile = smart_convert(tile, pg.Color("#" + colorkey) if colorkey else None, True)
+            self._tile_images[gid] = tile
+        return tile
+
+    def loaded_tile_images(self):
+        """ Returns the tile images created so far.
+
+        :return: list of Surface objects
+        """
+
+        return [tile for tile in self._tile_images if tile is not None]
+
+    def close(self):
+        """ Releases the memory-mapped file.
+
+        :return: None
+        """
+
+        for layer in self.layers:
+            for row in layer.data:
+                row.release()
+            layer.gids.release()
+        self.layers = []
+        self._buffer.release()
+        self._mmap.close()
+
+
+def get_object_kind(obj_type):
+    """ Returns the kind of an object from its type, as tested in 'Game.load_map'.
+
+    :param obj_type: the object type given in Tiled editor
+    :return: KIND_GATE, KIND_NPC, KIND_OBJECT, KIND_OBSTACLE or KIND_OTHER
+    """
+
+    if obj_type == "gate":
+        return KIND_GATE
+    elif obj_type[0:3] == "npc":
+        return KIND_NPC
+    elif obj_type[0:-1] in OBJECT_TYPES:
+        return KIND_OBJECT
+    elif obj_type == "obstacle":
+        return KIND_OBSTACLE
+    return KIND_OTHER
+
+
+def compile_map(tmx_path, bundle_path=None):
+    """ Compiles a '.tmx' file into a bundle.
+
+    :param tmx_path: path of the '.tmx' file
+    :param bundle_path: path of the bundle to write, next to the '.tmx' file by default
+    :return: the bundle path
+    """
+
+    if bundle_path is None:
+        bundle_path = path.splitext(tmx_path)[0] + BUNDLEEXT
+    tmxdata = pytmx.TiledMap(tmx_path)  # default loader: images are (filename, rect, flags) and are not loaded
+    bundle_dir = path.dirname(path.abspath(bundle_path))
+
+    strings = []
+    string_ids = {}
+
+    def add_string(text):
+        if text is None:
+            return NO_STRING
+        text = str(text)
+        if text not in string_ids:
+            string_ids[text] = len(strings)
+            strings.append(text)
+        return string_ids[text]
+
+    # Same colorkey lookup as pytmx 'reload_images':
+    colorkeys = {}
+    dependencies = []
+    for ts in tmxdata.tilesets:
+        if ts.source:
+            colorkeys[path.join(path.dirname(tmx_path), ts.source)] = getattr(ts, "trans", None)
+
+    # pytmx replaces the source of the tilesets by their image, the '.tsx' files are read from the '.tmx' file:
+    for tileset in ElementTree.parse(tmx_path).getroot().iter("tileset"):
+        if tileset.get("source"):
+            dependencies.append(path.join(path.dirname(tmx_path), tileset.get("source")))
+
+    images = []
+    image_ids = {}
+    tiles = []
+    for image in tmxdata.images:
+        if not image:
+            tiles.append(TILE.pack(NO_IMAGE, 0, 0, 0, 0, 0))
+            continue
+        filename, rect, tile_flags = image
+        if filename not in image_ids:
+            image_ids[filename] = len(images)
+            colorkey = colorkeys.get(filename)
+            colorkey = 0x1000000 | int(colorkey.lstrip("#")[-6:], 16) if colorkey else 0
+            images.append(IMAGE.pack(add_string(path.relpath(path.abspath(filename), bundle_dir).replace("\\", "/")), colorkey))
+            dependencies.append(filename)
+        flags = 0
+        if tile_flags:
+            flags = (FLIP_H if tile_flags.flipped_horizontally else 0) | \
+                    (FLIP_V if tile_flags.flipped_vertically else 0) | \
+                    (FLIP_D if tile_flags.flipped_diagonally else 0)
+        tiles.append(TILE.pack(image_ids[filename], *rect, flags))
+
+    objects = []
+    for obj in tmxdata.objects:
+        obj_type = obj.type or ""
+        present = 0
+        dx = dy = 0
+        look_to = NO_STRING
+        if "dx" in obj.properties:
+            present |= HAS_DX
+            dx = int(obj.properties["dx"])
+        if "dy" in obj.properties:
+            present |= HAS_DY
+            dy = int(obj.properties["dy"])
+        if "look_to" in obj.properties:
+            present |= HAS_LOOK_TO
+            look_to = add_string(obj.properties["look_to"])
+        objects.append(OBJECT.pack(get_object_kind(obj_type), present, add_string(obj.name), add_string(obj.type),
+                                   look_to, obj.x, obj.y, obj.width, obj.height, dx, dy))
+
+    layers = []
+    for layer in tmxdata.layers:
+        if isinstance(layer, pytmx.TiledTileLayer):
+            gids = struct.pack("<%dI" % (tmxdata.width * tmxdata.height), *(gid for row in layer.data for gid in row))
+            layers.append(LAYER.pack(add_string(layer.name), 1 if layer.visible else 0) + gids)
+
+    dependencies = [DEPENDENCY.pack(add_string(path.relpath(path.abspath(dependency), bundle_dir).replace("\\", "/")))
+                    for dependency in dependencies]
+    header = HEADER.pack(BUNDLEMAGIC, BUNDLEVERSION, tmxdata.width, tmxdata.height, tmxdata.tilewidth, tmxdata.tileheight,
+                         len(strings), len(images), len(tiles), len(objects), len(layers), len(dependencies))
+    encoded_strings = b"".join(STRING_LEN.pack(len(s.encode("utf-8"))) + s.encode("utf-8") for s in strings)
+    body = header + encoded_strings + b"".join(images) + b"".join(dependencies) + b"".join(tiles) + b"".join(objects)
+    body += b"\0" * (-len(body) % 4)  # keep gids aligned
+
+    with open(bundle_path, 'wb') as bundlefile:
+        bundlefile.write(body + b"".join(layers))
+
+    return bundle_path
+
+
+def compile_all_maps(map_dir=MAPDIR):
+    """ Compiles all '.tmx' files of a folder.
+
+    :param map_dir: the folder containing the maps
+    :return: list of the written bundles
+    """
+
+    return [compile_map(path.join(map_dir, filename)) for filename in sorted(listdir(map_dir)) if filename.endswith(".tmx")]
+
+
+def load_map_data(map_path):
+    """ Returns the bundle of a map if it is up to date, the pytmx data otherwise.
+
+    The bundle must be newer than the '.tmx' file, its tilesets and their images.
+
+    :param map_path: path of the map without extension, e.g. 'maps/map2_2'
+    :return: a MapBundle object or a pytmx TiledMap object
+    """
+
+    tmx_path = map_path + ".tmx"
+    bundle_path = map_path + BUNDLEEXT
+    if path.exists(bundle_path) and (not path.exists(tmx_path) or path.getmtime(bundle_path) >= path.getmtime(tmx_path)):
+        try:
+            bundle = MapBundle(bundle_path)
+        except (ValueError, struct.error):
+            bundle = None  # bundle from another version of the compiler
+        if bundle is not None:
+            if bundle.is_up_to_date():
+                return bundle
+            bundle.close()
+    return pytmx.load_pygame(tmx_path, pixelalpha=True)
+
+
+def benchmark_loaders(map_dir=MAPDIR, repeat=5):
+    """ Times pytmx and bundle loading on all maps of a folder.
+
+    Each loader is timed on loading the map then baking a full screen of tiles,
+    which is what a map transition costs before the first frame.
+    Tileset images stay shared between bundles as they are in game.
+    The bundles are compiled first if needed.
+
+    :param map_dir: the folder containing the maps
+    :param repeat: number of loads per map, the best time is kept
+    :return: dictionary {map name: (pytmx time, bundle time)} in seconds
+    """
+
+    from time import perf_counter
+    from settings import WIDTH, HEIGHT
+
+    def bake_screen(data):
+        surface = pg.Surface((WIDTH, HEIGHT))
+        for layer in data.visible_layers:
+            if isinstance(layer, (pytmx.TiledTileLayer, BundleLayer)):
+                for y in range(min(data.height, HEIGHT // data.tileheight)):
+                    for x in range(min(data.width, WIDTH // data.tilewidth)):
+                        tile = data.get_tile_image_by_gid(layer.data[y][x])
+                        if tile:
+                            surface.blit(tile, (x * data.tilewidth, y * data.tileheight))
+
+    results = {}
+    for filename in sorted(listdir(map_dir)):
+        if not filename.endswith(".tmx"):
+            continue
+        map_path = path.join(map_dir, path.splitext(filename)[0])
+        if not path.exists(map_path + BUNDLEEXT) or path.getmtime(map_path + BUNDLEEXT) < path.getmtime(map_path + ".tmx"):
+            compile_map(map_path + ".tmx")
+
+        times = []
+        for loader in (lambda: pytmx.load_pygame(map_path + ".tmx", pixelalpha=True), lambda: MapBundle(map_path + BUNDLEEXT)):
+            best = None
+            for idx in range(repeat):
+                start = perf_counter()
+                bake_screen(loader())
+                elapsed = perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            times.append(best)
+        results[path.splitext(filename)[0]] = tuple(times)
+
+    return results
+
+
+if __name__ == '__main__':
+    pg.init()
+    pg.display.set_mode((1, 1), pg.NOFRAME)  # tiles are converted to the display format
+
+    if "--benchmark" in sys.argv:
+        total_tmx = total_bundle = 0
+        print("{:<10}{:>12}{:>12}{:>10}".format("map", "pytmx (ms)", "bundle (ms)", "speedup"))
+        for name, (tmx_time, bundle_time) in benchmark_loaders().items():
+            total_tmx += tmx_time
+            total_bundle += bundle_time
+            print("{:<10}{:>12.2f}{:>12.2f}{:>9.1f}x".format(name, tmx_time * 1000, bundle_time * 1000, tmx_time / bundle_time))
+        print("{:<10}{:>12.2f}{:>12.2f}{:>9.1f}x".format("total", total_tmx * 1000, total_bundle * 1000, total_tmx / total_bundle))
+    else:
+        for bundle in compile_all_maps():
+            print("Compiled", bundle)
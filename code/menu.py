@@ -12,7 +12,8 @@ import pygame as pg
 from datetime import datetime
 
 import globvars as glob
-from capylib import draw_text, get_hovered_rectangle, exit_gracefully
+from capylib import draw_text, get_hovered_rectangle, exit_gracefully, get_font, draw_save_pages, draw_save_thumbnail
+from persistence import SAVEDONE
 from settings import *
 
 
@@ -36,6 +37,8 @@ class Menu:
 
         Methods
         -------
+        load_images(self):
+            gets the images of the menus from the asset manager
         show_main_menu(self):
             screen displayed at game lauch
         main_menu_events(self):
@@ -68,16 +71,26 @@ class Menu:
         self.hovered_item_previous = None
         self.clickable_item = {}
 
-        self.mainmenu_bkg = pg.image.load(IMAGEDIR + 'bkg-old-paper.jpg')
-        self.loadmenu_bkg = pg.image.load(IMAGEDIR + 'bkg-swirls.jpg')
-        self.select_right = pg.image.load(IMAGEDIR + 'select_right.png')
-        self.select_left = pg.image.load(IMAGEDIR + 'select_left.png')
         self.selection_rect = pg.Surface((58, 64))
         self.selection_rect.fill(GREEN)
+        self.load_images()
+
+    def load_images(self):
+        """ Gets the images of the menus from the asset manager.
+
+        Called again when the display mode changes, the images are then converted to the new display.
+
+        :return: None
+        """
+
+        self.mainmenu_bkg = glob.assets.get_image('bkg-old-paper.jpg')
+        self.loadmenu_bkg = glob.assets.get_image('bkg-swirls.jpg')
+        self.select_right = glob.assets.get_image('select_right.png')
+        self.select_left = glob.assets.get_image('select_left.png')
         self.players_image = []
         for i in range(0, 8):
             self.players_image.append(
-                pg.transform.scale2x(pg.image.load(IMAGEDIR + 'player/player' + str(i) + '_s.png').convert_alpha()))
+                pg.transform.scale2x(glob.assets.get_image('player/player' + str(i) + '_s.png')))
 
     def show_main_menu(self):
         """ Screen displayed at game lauch.
@@ -110,7 +123,7 @@ class Menu:
                 fontsize = 30
 
                 # Draw selection arrows:
-                font = pg.font.Font(pg.font.match_font(DEFAULTFONT), fontsize)
+                font = get_font(fontsize)
                 text_surface = font.render(' ' + text + ' ', True, BLACK)
                 text_width = text_surface.get_width()
                 position_left = (WIDTH/2 - text_width/2 - TILESIZE, HEIGHT/2 - 47 + idx*50)
@@ -142,7 +155,7 @@ class Menu:
 
         user_is_inactive = True
         while user_is_inactive:
-            for event in pg.event.get():
+            for event in glob.scheduler.wait():
                 if event.type == pg.QUIT:
                     exit_gracefully(self)
 
@@ -174,9 +187,6 @@ class Menu:
                     elif event.key == pg.K_SPACE or event.key == pg.K_RETURN:
                         self.main_menu_validation_handler()
 
-            if user_is_inactive:
-                pg.time.wait(SLEEPTIME)
-
     def main_menu_validation_handler(self):
         """ Processes the exit from the main menu.
 
@@ -199,6 +209,8 @@ class Menu:
         elif MAINMENU_ITEMS[glob.user_selection][0] == "displaymode":
             glob.user_config['fullscreen_mode'] = not glob.user_config['fullscreen_mode']
             glob.screen = pg.display.set_mode((WIDTH, HEIGHT), pg.FULLSCREEN if glob.user_config['fullscreen_mode'] else 0)
+            glob.assets.reconvert()
+            self.load_images()
         elif MAINMENU_ITEMS[glob.user_selection][0] == "quitmenu":
             exit_gracefully(self)
 
@@ -252,7 +264,7 @@ class Menu:
 
         user_is_inactive = True
         while user_is_inactive:
-            for event in pg.event.get():
+            for event in glob.scheduler.wait():
 
                 if event.type == pg.QUIT:
                     exit_gracefully(self)
@@ -291,9 +303,6 @@ class Menu:
                         self.game_params['player']['name'] = 'player' + str(glob.user_selection)
                         glob.active_screen = "capytaine"
 
-            if user_is_inactive:
-                pg.time.wait(SLEEPTIME)
-
     def show_load_screen(self):
         """ Screen displayed to select a previously saved game.
 
@@ -301,6 +310,7 @@ class Menu:
         """
 
         self.clickable_item = {}
+        glob.persistence.collect()  # a save may have been written since the page was loaded
         glob.screen.fill(BLACK)
         glob.screen.blit(self.loadmenu_bkg, (0, 0))
 
@@ -314,14 +324,16 @@ class Menu:
                 else:
                     fontsize = 25
                     color = GREEN
-                draw_text(self, glob.saved_games[idx]['timestamp'].strftime("%m/%d/%Y, %H:%M:%S"), fontsize,
+                draw_text(self, ("Auto " if glob.saved_games[idx]['autosave'] else "") + glob.saved_games[idx]['timestamp'].strftime("%m/%d/%Y, %H:%M:%S"), fontsize,
                           (WIDTH / 2, HEIGHT / 2 - 200 + (idx * 50)), "midtop", color, 'SLOT' + str(idx))
+                draw_save_thumbnail(glob.saved_games[idx], HEIGHT / 2 - 200 + (idx * 50))
             else:
                 draw_text(self, "VIDE", 20, (WIDTH / 2, HEIGHT / 2 - 200 + (idx * 50)), "midtop",
                           BROWN if glob.user_selection != idx else DARKGREY, 'SLOT' + str(idx))
 
         draw_text(self, "RETOUR", 20, (WIDTH / 2, HEIGHT / 2 - 200 + (SAVESLOTS * 50)), "midtop",
                   DARKGREY if glob.user_selection < SAVESLOTS else GREEN, 'BACK')
+        draw_save_pages(self)
 
         pg.display.flip()
         if DEBUG:
@@ -340,7 +352,7 @@ class Menu:
 
         user_is_inactive = True
         while user_is_inactive:
-            for event in pg.event.get():
+            for event in glob.scheduler.wait():
 
                 if event.type == pg.QUIT:
                     exit_gracefully(self)
@@ -360,10 +372,16 @@ class Menu:
                             user_is_inactive = False
 
                 elif event.type == pg.MOUSEBUTTONUP:
-                    if get_hovered_rectangle(self.clickable_item, event.pos) is not None:
+                    clicked_item = get_hovered_rectangle(self.clickable_item, event.pos)
+                    if clicked_item in ('PREVPAGE', 'NEXTPAGE'):
+                        user_is_inactive = not glob.persistence.turn_page(-1 if clicked_item == 'PREVPAGE' else 1)
+                    elif clicked_item is not None:
                         user_is_inactive = False
                         self.load_validation_handler()
 
+                elif event.type == SAVEDONE:
+                    user_is_inactive = False  # the saves are reloaded when the screen is displayed again
+
                 elif event.type == pg.KEYDOWN:
                     user_is_inactive = False
                     if event.key == pg.K_ESCAPE:
@@ -377,12 +395,13 @@ class Menu:
                         glob.user_selection -= 1
                         if glob.user_selection < 0:
                             glob.user_selection = SAVESLOTS
+                    elif event.key == pg.K_LEFT or event.key == pg.K_PAGEUP:
+                        glob.persistence.turn_page(-1)
+                    elif event.key == pg.K_RIGHT or event.key == pg.K_PAGEDOWN:
+                        glob.persistence.turn_page(1)
                     elif event.key == pg.K_SPACE or event.key == pg.K_RETURN:
                         self.load_validation_handler()
 
-            if user_is_inactive:
-                pg.time.wait(SLEEPTIME)
-
     def load_validation_handler(self):
         """ Processes the exit from the load menu.
 
@@ -395,6 +414,10 @@ class Menu:
         elif glob.saved_games[glob.user_selection]['timestamp'] > datetime.min:
             if DEBUG:
                 print("Loading SLOT" + str(glob.user_selection), glob.saved_games[glob.user_selection])
-            self.game_params = glob.saved_games[glob.user_selection]['game_params']
+            try:
+                self.game_params = glob.persistence.load_game(glob.saved_games[glob.user_selection]['id'])
+            except ValueError as error:  # the save stays on the screen, another one can be chosen
+                print("Game load failed:", error)
+                return
             glob.active_screen = "capytaine"
             glob.user_selection = 0
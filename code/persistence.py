@@ -3,122 +3,515 @@
 
     Class
     -----
-    Persistence
+    SaveJob:
+        a class used to follow the writing of one save by the save worker
+    Persistence:
+        a class used to manage saves and recovery of game status
 """
 
-from os import path
+from os import path, fsync, replace
+from io import BytesIO
 from datetime import datetime
 import pickle
+import queue
+import sqlite3
+import threading
+
+import pygame as pg
 
 import globvars as glob
+from savecodec import safe_loads, get_format_version, encode_game_params, decode_game_params, migrate_version_0, SAVEFORMATVERSION
 from settings import *
 
+SAVEDBVERSION = 3  # stored in the 'user_version' of the database, 0 for a database just created
+SAVEDONE = pg.event.custom_type()  # posted by the save worker when a save is written
+
+
+class SaveJob:
+    """
+        A class used to follow the writing of one save by the save worker.
+
+        Attributes
+        ----------
+        save_id: int
+            the id of the save overwritten, None for a new save until the worker has written it
+        timestamp: datetime
+            the time of the save
+        game_params: dictionary
+            a copy of the game parameters taken when the save was requested
+        autosave: bool
+            True to write the save in the autosave slot, see 'autosave.py'
+        screenshot: Surface
+            a reduced copy of the map screen, turned into the thumbnail of the save by the worker, None for no thumbnail
+        done: threading.Event
+            set when the save is written or failed
+        error: Exception
+            the error that prevented the save from being written, None if it succeeded
+    """
+
+    def __init__(self, save_id, timestamp, game_params, autosave=False, screenshot=None):
+        self.save_id = save_id
+        self.timestamp = timestamp
+        self.game_params = game_params
+        self.autosave = autosave
+        self.screenshot = screenshot
+        self.done = threading.Event()
+        self.error = None
+
 
 class Persistence:
     """
         A class used to manage saves and recovery of game status.
-        Requires installation of pickle module : https://docs.python.org/3.8/library/pickle.html
-        Requires definition of constant SAVEPATH in 'settings.py' file.
+        Requires definition of constants SAVEDBPATH and CONFIGPATH in 'settings.py' file.
+
+        Saved games are stored in an SQLite database with a write-ahead log:
+        - table 'saves' holds the metadata displayed by the load and save screens (timestamp, map, quest, avatar),
+          and whether the save is the autosave slot, the only save written without the player choosing a slot,
+        - table 'states' holds the game parameters encoded by 'savecodec.py', read only when a game is loaded,
+        - table 'thumbnails' holds a PNG screenshot of each save, read only for the saves displayed.
+        A save writes one row of each table in a single transaction, the other saves are not rewritten.
+        The transaction is written by a background thread with its own connection, so the game never waits for the disk:
+        the main thread only copies the game parameters and a reduced map screen,
+        the worker makes the thumbnail and posts a SAVEDONE event once the save is on disk.
+        The SQLite journal makes each save atomic, a crash or a power loss never leaves a half-written save.
+        There is no limit to the number of saves, the screens display them by pages of SAVESLOTS saves.
+
+        The saves of the former SAVEPATH pickle file are imported when the database is created.
+
+        Attributes
+        ----------
+        db_path: str
+            the database file
+        connection: sqlite3.Connection
+            the open database, used by the main thread
+        jobs: Queue
+            saves waiting for the worker
+        finished: Queue
+            saves written by the worker, waiting to be collected by the main thread
+        page: int
+            the page of saves displayed by the screens, see 'get_saved_games'
+        thumbnails: dict
+            the decoded thumbnails keyed by save id, None for a save without thumbnail
 
         Methods
         -------
+        connect(self):
+            opens the database
+        upgrade_database(self, version):
+            creates the tables or upgrades those written by a former version of the game
+        import_pickle_saves(self, save_path=SAVEPATH):
+            imports the saves of the former pickle file
         save_user_config(self):
             save game config in CONFIGPATH file
-        get_saved_games(self):
-            read SAVEPATH file to load the list of previously saved games.
-        save_this_game(self, game, slot):
-            save current game parameters in SAVEPATH file
-
+        count_saved_games(self):
+            returns the number of saved games
+        get_page_count(self, free_row=False):
+            returns the number of pages of saves
+        list_saved_games(self, offset=0, limit=SAVESLOTS):
+            returns the metadata of saved games, most recent first
+        get_saved_games(self, page=None):
+            loads a page of saved games metadata in 'globvars.saved_games'
+        turn_page(self, delta, free_row=False):
+            loads the next or previous page of saved games metadata
+        load_game(self, save_id):
+            returns the parameters of a saved game
+        get_thumbnail(self, save_id):
+            returns the thumbnail of a saved game, decoded the first time it is requested
+        encode_thumbnail(screenshot):
+            returns the thumbnail made from a screenshot, encoded as PNG
+        get_game_params(game):
+            returns the parameters of the current game
+        write_save(connection, save_id, timestamp, game_params, autosave=False, thumbnail=None):
+            writes the metadata and the parameters of a save, within the transaction of the caller
+        save_this_game(self, game, save_id=None, autosave=False):
+            requests the save of the current game parameters in the database
+        collect(self):
+            reloads the page of saved games if saves were written since the last call
+        flush(self):
+            waits until all the requested saves are written
+        close(self):
+            writes the pending saves and closes the database
+        work(self):
+            worker thread loop: writes the saves one after the other
     """
 
-    def __init__(self):
-        # Initialize save slots
+    def __init__(self, db_path=SAVEDBPATH):
+        self.db_path = db_path
+        self.page = 0
+        self.thumbnails = {}
         glob.saved_games = [{"timestamp": datetime.min} for idx in range(SAVESLOTS)]
 
-        # Create initial SAVEPATH file if not exists:
-        if not path.exists(SAVEPATH):
-            with open(SAVEPATH, 'wb') as savefile:
-                pickle.dump(glob.saved_games, savefile, pickle.HIGHEST_PROTOCOL)
-                savefile.close()
+        self.connection = self.connect()
+        version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+        if version < SAVEDBVERSION:
+            self.upgrade_database(version)
+
+        self.jobs = queue.Queue()
+        self.finished = queue.Queue()
+        self.worker = threading.Thread(target=self.work, daemon=True)
+        self.worker.start()
 
         # Load user config parameters from CONFIGPATH file:
         if path.exists(CONFIGPATH):
             with open(CONFIGPATH, 'rb') as configfile:
-                glob.user_config = pickle.load(configfile)
-                configfile.close()
+                glob.user_config = safe_loads(configfile.read())
+
+    def __repr__(self):
+        return "<%s: %s, %d saves>" % (self.__class__.__name__, self.db_path, self.count_saved_games())
+
+    def connect(self):
+        """ Opens the database.
+
+        A connection can only be used by the thread that opened it.
+
+        :return: sqlite3.Connection object
+        """
+
+        connection = sqlite3.connect(self.db_path)
+        connection.execute("PRAGMA journal_mode=WAL")  # the main thread can read the saves while the worker writes one
+        connection.execute("PRAGMA synchronous=FULL")  # a save is on disk when its transaction ends
+        return connection
+
+    def upgrade_database(self, version):
+        """ Creates the tables or upgrades those written by a former version of the game.
+
+        The saves of the former pickle file are imported when the tables are created.
+
+        :param version: the 'user_version' of the database, 0 for a database just created
+        :return: None
+        """
+
+        if version < 1:
+            self.connection.executescript("""
+                CREATE TABLE IF NOT EXISTS saves (
+                    id INTEGER PRIMARY KEY,
+                    timestamp TEXT NOT NULL,
+                    map TEXT NOT NULL,
+                    quest TEXT NOT NULL,
+                    avatar TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS saves_timestamp ON saves (timestamp DESC);
+                CREATE TABLE IF NOT EXISTS states (
+                    save_id INTEGER PRIMARY KEY REFERENCES saves (id) ON DELETE CASCADE,
+                    game_params BLOB NOT NULL
+                );
+            """)
+        if version < 2:
+            with self.connection:
+                self.connection.execute("ALTER TABLE saves ADD COLUMN autosave INTEGER NOT NULL DEFAULT 0")
+        if version < 3:
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS thumbnails (
+                    save_id INTEGER PRIMARY KEY REFERENCES saves (id) ON DELETE CASCADE,
+                    png BLOB NOT NULL
+                )
+            """)
+        if version < 1:
+            self.import_pickle_saves()
+        self.connection.execute("PRAGMA user_version = %d" % SAVEDBVERSION)
+
+    def import_pickle_saves(self, save_path=SAVEPATH):
+        """ Imports the saves of the former pickle file.
+
+        The file is left unchanged.
+
+        :param save_path: the pickle file, a list of dictionaries {"timestamp": datetime, "game_params": dict}
+        :return: the number of saves imported
+        """
+
+        if not path.exists(save_path):
+            return 0
+
+        with open(save_path, 'rb') as savefile:
+            saved_games = safe_loads(savefile.read())
+
+        imported = 0
+        with self.connection:
+            for saved_game in saved_games:
+                if "game_params" in saved_game:
+                    self.write_save(self.connection, None, saved_game["timestamp"], migrate_version_0(saved_game["game_params"]))
+                    imported += 1
+        return imported
 
     def save_user_config(self):
         """ Save game config in CONFIGPATH file.
 
+        The config is written in a temporary file which then replaces CONFIGPATH,
+        so the file is never left half-written.
+
         :return: None
         """
 
-        with open(CONFIGPATH, 'wb') as configfile:
+        with open(CONFIGPATH + ".tmp", 'wb') as configfile:
             pickle.dump(glob.user_config, configfile, pickle.HIGHEST_PROTOCOL)
-            configfile.close()
+            configfile.flush()
+            fsync(configfile.fileno())
+        replace(CONFIGPATH + ".tmp", CONFIGPATH)
 
-    def get_saved_games(self):
-        """ Read SAVEPATH file to load the list of previously saved games.
+    def count_saved_games(self):
+        """ Returns the number of saved games.
 
-        :return: None
+        :return: int
+        """
+
+        return self.connection.execute("SELECT COUNT(*) FROM saves").fetchone()[0]
+
+    def get_page_count(self, free_row=False):
+        """ Returns the number of pages of saves.
+
+        :param free_row: True to count a page with an empty row after the last save, where the save screen creates a new save
+        :return: int, at least 1
         """
 
-        with open(SAVEPATH, 'rb') as savefile:
-            glob.saved_games = pickle.load(savefile)
-            savefile.close()
+        count = self.count_saved_games()
+        if free_row:
+            return count // SAVESLOTS + 1
+        return max(1, -(-count // SAVESLOTS))
+
+    def list_saved_games(self, offset=0, limit=SAVESLOTS):
+        """ Returns the metadata of saved games, most recent first.
 
-        # Ensure file structure matches SAVESLOTS setting
-        if len(glob.saved_games) > SAVESLOTS:
-            glob.saved_games = glob.saved_games[0:SAVESLOTS]
-        elif len(glob.saved_games) < SAVESLOTS:
-            glob.saved_games += [{"timestamp": datetime.min} for idx in range(len(glob.saved_games), SAVESLOTS)]
+        The game parameters are not read.
 
-    def save_this_game(self, game, slot):
-        """ Save current game parameters in SAVEPATH file.
+        :param offset: the number of most recent saves to skip
+        :param limit: the maximum number of saves returned
+        :return: list of dictionaries {"id": int, "timestamp": datetime, "map": str, "quest": str, "avatar": str, "autosave": bool}
+        """
+
+        rows = self.connection.execute("SELECT id, timestamp, map, quest, avatar, autosave FROM saves "
+                                       "ORDER BY timestamp DESC, id DESC LIMIT ? OFFSET ?", (limit, offset))
+        return [{"id": save_id, "timestamp": datetime.fromisoformat(timestamp), "map": map_name, "quest": quest, "avatar": avatar,
+                 "autosave": bool(autosave)} for save_id, timestamp, map_name, quest, avatar, autosave in rows]
+
+    def get_saved_games(self, page=None):
+        """ Loads a page of saved games metadata in 'globvars.saved_games'.
+
+        The list always has SAVESLOTS items, the rows after the last save are {"timestamp": datetime.min}.
+
+        :param page: the page to load, None to reload the current page
+        :return: the list of saved games of the page
+        """
+
+        if page is not None:
+            self.page = min(max(page, 0), self.get_page_count(free_row=True) - 1)
+
+        glob.saved_games = self.list_saved_games(self.page * SAVESLOTS, SAVESLOTS)
+        glob.saved_games += [{"timestamp": datetime.min} for idx in range(len(glob.saved_games), SAVESLOTS)]
+        return glob.saved_games
+
+    def turn_page(self, delta, free_row=False):
+        """ Loads the next or previous page of saved games metadata.
+
+        :param delta: 1 for the next page, -1 for the previous one
+        :param free_row: True to allow a page with an empty row after the last save, see 'get_page_count'
+        :return: True if the page changed
+        """
+
+        page = min(max(self.page + delta, 0), self.get_page_count(free_row) - 1)
+        if page == self.page:
+            return False
+        self.get_saved_games(page)
+        return True
+
+    def load_game(self, save_id):
+        """ Returns the parameters of a saved game.
+
+        :param save_id: the id of the save in the metadata
+        :return: dictionary with the same structure as GAME_STARTUP_PARAMS
+        :raise KeyError: if there is no save with this id
+        :raise ValueError: if the save is corrupted
+        """
+
+        row = self.connection.execute("SELECT game_params FROM states WHERE save_id = ?", (save_id,)).fetchone()
+        if row is None:
+            raise KeyError(save_id)
+
+        game_params = decode_game_params(row[0])
+        if get_format_version(row[0]) < SAVEFORMATVERSION:  # upgraded once, unless the worker has overwritten it meanwhile
+            with self.connection:
+                self.connection.execute("UPDATE states SET game_params = ? WHERE save_id = ? AND game_params = ?",
+                                        (encode_game_params(game_params), save_id, row[0]))
+        return game_params
+
+    def get_thumbnail(self, save_id):
+        """ Returns the thumbnail of a saved game, decoded the first time it is requested.
+
+        :param save_id: the id of the save in the metadata
+        :return: Surface object, None if the save has no thumbnail
+        """
+
+        if save_id not in self.thumbnails:
+            row = self.connection.execute("SELECT png FROM thumbnails WHERE save_id = ?", (save_id,)).fetchone()
+            thumbnail = None
+            if row is not None:
+                thumbnail = pg.image.load(BytesIO(row[0]), "thumbnail.png")
+                if pg.display.get_surface() is not None:
+                    thumbnail = thumbnail.convert()
+            self.thumbnails[save_id] = thumbnail
+        return self.thumbnails[save_id]
+
+    @staticmethod
+    def encode_thumbnail(screenshot):
+        """ Returns the thumbnail made from a screenshot, encoded as PNG.
+
+        Called by the worker.
+
+        :param screenshot: Surface object
+        :return: bytes
+        """
+
+        png = BytesIO()
+        pg.image.save(pg.transform.smoothscale(screenshot, THUMBNAILSIZE), png, "thumbnail.png")
+        return png.getvalue()
+
+    @staticmethod
+    def get_game_params(game):
+        """ Returns the parameters of the current game.
+
+        The containers the game changes in place are copied, the parameters don't change when the game goes on.
 
         :param game: Game object
-        :param slot: save slot selected by the user
-        :return: list of all saved games
-        """
-
-        glob.saved_games[slot] = {
-            "timestamp": datetime.now(),
-            # !!! The game_params variable must have the same structure as GAME_STARTUP_PARAMS !!!
-            "game_params": {
-                "player": {
-                    "name": game.player.name,
-                    "x": game.player.x,
-                    "y": game.player.y,
-                    "look_at": game.player.look_at
-                },
-                "map": {
-                    "name": game.map.name
-                },
-                "maps_version": game.script.maps_version,
-                "unlocked_tools": {
-                    "axe": game.inventory.axe.acquired,
-                    "shovel": game.inventory.shovel.acquired,
-                    "pickaxe": game.inventory.pickaxe.acquired,
-                    "net": game.inventory.net.acquired
-                },
-                "current_quest": {
-                    "name": game.script.current_quest.name,
-                    "state": game.script.current_quest.state,
-                    "current_obj_nbr": game.script.current_quest.current_obj_nbr
-                },
-                "quest_journal_acquired": game.inventory.quest_journal_acquired,
-                "goals_booklet_acquired": game.inventory.goals_booklet_acquired,
-                "removed_objects": game.removed_objects
-            }
+        :return: dictionary with the same structure as GAME_STARTUP_PARAMS
+        """
+
+        return {
+            "player": {
+                "name": game.player.name,
+                "x": game.player.x,
+                "y": game.player.y,
+                "look_at": game.player.look_at
+            },
+            "map": {
+                "name": game.map.name
+            },
+            "maps_version": dict(game.script.maps_version),
+            "unlocked_tools": {
+                "axe": game.inventory.axe.acquired,
+                "shovel": game.inventory.shovel.acquired,
+                "pickaxe": game.inventory.pickaxe.acquired,
+                "net": game.inventory.net.acquired
+            },
+            "current_quest": {
+                "name": game.script.current_quest.name,
+                "state": game.script.current_quest.state,
+                "current_obj_nbr": game.script.current_quest.current_obj_nbr
+            },
+            "quest_journal_acquired": game.inventory.quest_journal_acquired,
+            "goals_booklet_acquired": game.inventory.goals_booklet_acquired,
+            "removed_objects": list(game.removed_objects)
         }
 
-        # Sort array by timestamp
-        glob.saved_games.sort(key=lambda item: item['timestamp'], reverse=True)
+    @staticmethod
+    def write_save(connection, save_id, timestamp, game_params, autosave=False, thumbnail=None):
+        """ Writes the metadata and the parameters of a save, within the transaction of the caller.
 
-        # Commit to disk
-        with open(SAVEPATH, 'wb') as savefile:
-            pickle.dump(glob.saved_games, savefile, pickle.HIGHEST_PROTOCOL)
-            savefile.close()
+        :param connection: the connection of the calling thread
+        :param save_id: the id of the save to overwrite, None to create a new save
+        :param timestamp: datetime of the save
+        :param game_params: dictionary with the same structure as GAME_STARTUP_PARAMS
+        :param autosave: True to overwrite the autosave slot, 'save_id' is then ignored
+        :param thumbnail: the PNG returned by 'encode_thumbnail', None to remove the thumbnail
+        :return: the id of the save
+        """
 
-        # Return updated list
-        return glob.saved_games
+        if autosave:
+            row = connection.execute("SELECT id FROM saves WHERE autosave = 1").fetchone()
+            save_id = None if row is None else row[0]
+
+        metadata = (timestamp.isoformat(), game_params["map"]["name"], game_params["current_quest"]["name"], game_params["player"]["name"], autosave)
+        if save_id is None or connection.execute("UPDATE saves SET timestamp = ?, map = ?, quest = ?, avatar = ?, autosave = ? WHERE id = ?",
+                                                 metadata + (save_id,)).rowcount == 0:
+            save_id = connection.execute("INSERT INTO saves (timestamp, map, quest, avatar, autosave) VALUES (?, ?, ?, ?, ?)", metadata).lastrowid
+        connection.execute("INSERT OR REPLACE INTO states (save_id, game_params) VALUES (?, ?)", (save_id, encode_game_params(game_params)))
+        if thumbnail is None:
+            connection.execute("DELETE FROM thumbnails WHERE save_id = ?", (save_id,))
+        else:
+            connection.execute("INSERT OR REPLACE INTO thumbnails (save_id, png) VALUES (?, ?)", (save_id, thumbnail))
+        return save_id
+
+    def save_this_game(self, game, save_id=None, autosave=False):
+        """ Requests the save of the current game parameters in the database.
+
+        The parameters and the map screen are copied, the game can go on while the worker writes them.
+        Once written, 'collect' reloads 'globvars.saved_games': the save is then the most recent one.
+
+        :param game: Game object
+        :param save_id: the id of the save overwritten, None to create a new save
+        :param autosave: True to overwrite the autosave slot, 'save_id' is then ignored
+        :return: SaveJob object
+        """
+
+        # An autosave is requested during a frame: only a snapshot is taken here, the worker encodes it.
+        # Scaling the map screen down is faster than copying it, the worker smooths the thumbnail.
+        width, height = THUMBNAILSIZE
+        screenshot = pg.transform.scale(game.game_display.map_screen, (4 * width, 4 * height))
+        job = SaveJob(save_id, datetime.now(), self.get_game_params(game), autosave, screenshot)
+        self.jobs.put(job)
+        return job
+
+    def collect(self):
+        """ Reloads the page of saved games if saves were written since the last call.
+
+        Called by the main thread when it receives a SAVEDONE event and before displaying the saves.
+
+        :return: list of the SaveJob objects finished since the last call
+        """
+
+        jobs = []
+        while True:
+            try:
+                jobs.append(self.finished.get_nowait())
+            except queue.Empty:
+                break
+
+        if jobs:
+            for job in jobs:
+                self.thumbnails.pop(job.save_id, None)
+            self.get_saved_games()
+        return jobs
+
+    def flush(self):
+        """ Waits until all the requested saves are written.
+
+        :return: None
+        """
+
+        self.jobs.join()
+        self.collect()
+
+    def close(self):
+        """ Writes the pending saves and closes the database.
+
+        :return: None
+        """
+
+        self.jobs.put(None)
+        self.worker.join()
+        self.collect()
+        self.connection.close()
+
+    def work(self):
+        """ Worker thread loop: writes the saves one after the other.
+
+        :return: None
+        """
+
+        connection = self.connect()
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                self.jobs.task_done()
+                break
+
+            try:
+                thumbnail = None if job.screenshot is None else self.encode_thumbnail(job.screenshot)
+                with connection:
+                    job.save_id = self.write_save(connection, job.save_id, job.timestamp, job.game_params, job.autosave, thumbnail)
+            except Exception as error:  # the transaction is rolled back, the previous save is kept
+                job.error = error
+            self.finished.put(job)
+            job.done.set()
+            self.jobs.task_done()
+            if pg.display.get_init():
+                pg.event.post(pg.event.Event(SAVEDONE, save_id=job.save_id, error=job.error))
+        connection.close()
@@ -0,0 +1,232 @@
+"""
+    This module loads in the background the maps the player can reach from the current map,
+    so that entering a gate doesn't have to wait for the map to be parsed and baked.
+
+    Class
+    -----
+    PrefetchJob:
+        a class used to follow the loading of one map by a worker
+    MapPrefetcher:
+        a class used to load the neighbour maps in background threads
+"""
+
+import queue
+import threading
+
+import pygame as pg
+
+from tilemap import TiledMap
+from settings import DEBUG, WIDTH, HEIGHT, TILESIZE, PREFETCHWORKERS
+
+
+class PrefetchJob:
+    """
+        A class used to follow the loading of one map by a worker.
+
+        Attributes
+        ----------
+        key: (str, str)
+            the map name and version to load
+        from_map_name: str
+            the current map, used to find where the player will enter the loaded map
+        started, cancelled, done: threading.Event
+            set when a worker starts the job, when the job is no longer needed and when it is finished
+    """
+
+    def __init__(self, key, from_map_name):
+        self.key = key
+        self.from_map_name = from_map_name
+        self.started = threading.Event()
+        self.cancelled = threading.Event()
+        self.done = threading.Event()
+
+
+class MapPrefetcher:
+    """
+        A class used to load the neighbour maps in background threads.
+
+        Each time a map is loaded, the gates of this map give the maps the player can reach next.
+        These maps are parsed by PREFETCHWORKERS background threads at their current version,
+        and the chunks the player will see when entering them are baked.
+        Finished maps are handed to the main thread through a queue and added
+        to the map cache in 'collect', the only method that touches the cache.
+
+        Attributes
+        ----------
+        game: Game
+            the 'Game' object from which this class was instantiated
+        jobs: Queue
+            jobs waiting for a worker
+        ready: Queue
+            finished jobs and their TiledMap, waiting to be collected by the main thread
+        pending: dict
+            jobs that are not collected yet, keyed by (map name, map version)
+        lock: threading.Lock
+            makes the check of 'cancelled' and the setting of 'started' of a job atomic,
+            so a cancelled job is either never started or known to be started
+
+        Methods
+        -------
+        prefetch(self):
+            starts loading the maps reachable through the gates of the current map
+        cancel(self, keep=(), wait=False):
+            cancels the pending jobs
+        collect(self):
+            adds the finished maps to the map cache
+        wait_for(self, map_name, map_version):
+            waits for a map that is being loaded
+        shutdown(self):
+            stops the workers
+    """
+
+    def __init__(self, game, workers=PREFETCHWORKERS):
+        self.game = game
+        self.jobs = queue.Queue()
+        self.ready = queue.Queue()
+        self.pending = {}
+        self.lock = threading.Lock()
+
+        self.workers = [threading.Thread(target=self.work, daemon=True) for idx in range(workers)]
+        for worker in self.workers:
+            worker.start()
+
+    def prefetch(self):
+        """ Starts loading the maps reachable through the gates of the current map.
+
+        Jobs for maps that are not reachable anymore are cancelled.
+
+        :return: None
+        """
+
+        keys = []
+        for gate in self.game.gates:
+            map_version = self.game.script.maps_version[gate.name] if gate.name in self.game.script.maps_version else ''
+            if (gate.name, map_version) not in keys:
+                keys.append((gate.name, map_version))
+
+        self.cancel(keep=keys)
+
+        for key in keys:
+            if key not in self.game.map_cache.maps and key not in self.pending:
+                job = PrefetchJob(key, self.game.map.name)
+                self.pending[key] = job
+                self.jobs.put(job)
+
+    def cancel(self, keep=(), wait=False):
+        """ Cancels the pending jobs.
+
+        A job that has already started stops as soon as possible, its map is never added to the cache.
+
+        :param keep: keys of the jobs that must not be cancelled
+        :param wait: True to wait until the started jobs stop, e.g. before timing something else
+        :return: None
+        """
+
+        for key in list(self.pending):
+            if key not in keep:
+                job = self.pending.pop(key)
+                with self.lock:
+                    job.cancelled.set()
+                    started = job.started.is_set()
+                if wait and started:
+                    job.done.wait()
+
+    def collect(self):
+        """ Adds the finished maps to the map cache.
+
+        Called by the main thread, maps that were cancelled or whose version changed in the meantime are dropped.
+
+        :return: None
+        """
+
+        while True:
+            try:
+                job, tiled_map = self.ready.get_nowait()
+            except queue.Empty:
+                break
+
+            if self.pending.get(job.key) is job:
+                del self.pending[job.key]
+                map_name, map_version = job.key
+                current_version = self.game.script.maps_version[map_name] if map_name in self.game.script.maps_version else ''
+                if tiled_map is not None and not job.cancelled.is_set() and map_version == current_version:
+                    self.game.map_cache.add(tiled_map, keep=(self.game.map.name, self.game.map.version))
+
+    def wait_for(self, map_name, map_version):
+        """ Waits for a map that is being loaded.
+
+        If a worker has already started loading the map, it is faster to wait for it than to load it again.
+        If the job has not started yet, it is cancelled and the map will be loaded by the caller.
+
+        :param map_name: the map name
+        :param map_version: the map version
+        :return: None
+        """
+
+        job = self.pending.get((map_name, map_version))
+        if job is not None:
+            with self.lock:
+                started = job.started.is_set()
+                if not started:
+                    job.cancelled.set()
+            if started:
+                job.done.wait()
+            else:
+                del self.pending[job.key]
+        self.collect()
+
+    def shutdown(self):
+        """ Stops the workers.
+
+        :return: None
+        """
+
+        self.cancel()
+        for worker in self.workers:
+            self.jobs.put(None)
+
+    def work(self):
+        """ Worker thread loop: loads the maps of the jobs one after the other.
+
+        :return: None
+        """
+
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            with self.lock:
+                if job.cancelled.is_set():
+                    continue
+                job.started.set()
+
+            tiled_map = None
+            try:
+                tiled_map = TiledMap(*job.key)
+                tiled_map.prebake(self.get_entry_view(tiled_map, job.from_map_name), job.cancelled.is_set)
+            except Exception as error:  # the main thread will load the map itself and report the error
+                if DEBUG:
+                    print("Prefetch of", job.key, "failed:", error)
+            self.ready.put((job, tiled_map))
+            job.done.set()
+
+    @staticmethod
+    def get_entry_view(tiled_map, from_map_name):
+        """ Returns the part of the map the player will see when entering it.
+
+        The player enters the map on the gate leading back to the previous map,
+        the view is computed like in 'Camera.update'.
+
+        :param tiled_map: the TiledMap object being loaded
+        :param from_map_name: the map the player comes from
+        :return: Rect object in map pixels
+        """
+
+        view = pg.Rect(0, 0, WIDTH, HEIGHT)
+        for obj in tiled_map.objects:
+            if obj.type == "gate" and obj.name == from_map_name:
+                view.center = (int(obj.x) + TILESIZE // 2, int(obj.y) + TILESIZE // 2)
+                break
+        view.x = max(0, min(view.x, tiled_map.width - WIDTH))
+        view.y = max(0, min(view.y, tiled_map.height - HEIGHT))
+        return view
@@ -0,0 +1,206 @@
+"""
+    This module records the input of the games and replays it, e.g. to compare the performance of two versions
+    of the game on the same session.
+
+    A recording is a gzip text file, one Python literal per line:
+    the first line holds the game parameters the game started with,
+    each other line a batch of events handled together by 'Game.game_events':
+    (game time, wall time, [(event name, attributes), ...]).
+
+    The game time is the time simulated by 'Game.update' when the events were handled.
+    Replaying the events at the same game time gives the same game whatever the speed of the machine.
+    The wall time, in milliseconds since the game started, is only used to replay the session at its original speed.
+
+    Games are recorded in RECORDDIR when RECORDINPUT is True in 'settings.py'.
+
+    Class
+    -----
+    InputRecorder:
+        a class used to write the input of a game in a recording
+
+    Functions
+    ---------
+    load_recording(filename):
+        reads a recording
+    replay(filename, speed=None):
+        plays a recording without window and measures the time taken by each frame
+"""
+
+import ast
+import gzip
+import sys
+import time
+from datetime import datetime
+from os import path, makedirs
+
+import pygame as pg
+
+from settings import RECORDDIR, FPS
+
+RECORDVERSION = 1
+RECORDEDEVENTS = {  # attributes kept for each type of event 'Game.game_events' handles
+    pg.KEYDOWN: ("key", "scancode", "unicode", "mod"),
+    pg.KEYUP: ("key", "scancode", "mod"),
+    pg.MOUSEMOTION: ("pos",),
+    pg.MOUSEBUTTONUP: ("pos", "button")
+}
+EVENTTYPES = {pg.event.event_name(event_type): event_type for event_type in RECORDEDEVENTS}
+
+
+class InputRecorder:
+    """
+        A class used to write the input of a game in a recording.
+
+        The file is flushed after each batch of events,
+        a game that ends without closing the recorder can be replayed up to its last action.
+
+        Attributes
+        ----------
+        filename: str
+            the path of the recording
+        file: file object
+            the gzip stream
+        start: int
+            the value of pg.time.get_ticks() when the game started
+
+        Methods
+        -------
+        record(self, game_time, events):
+            writes the events handled at this game time
+        close(self):
+            closes the file
+    """
+
+    def __init__(self, game_params, filename=None):
+        if filename is None:
+            makedirs(RECORDDIR, exist_ok=True)
+            filename = path.join(RECORDDIR, datetime.now().strftime("%Y%m%d-%H%M%S") + ".rec")
+
+        self.filename = filename
+        self.file = gzip.open(filename, 'wt')
+        self.file.write(repr({"version": RECORDVERSION, "game_params": game_params}) + "\n")
+        self.file.flush()
+        self.start = pg.time.get_ticks()
+
+    def record(self, game_time, events):
+        """ Writes the events handled at this game time.
+
+        Events of other types than RECORDEDEVENTS, e.g. the window events, are left out.
+
+        :param game_time: 'Game.time' when the events are handled
+        :param events: list of Event objects
+        :return: None
+        """
+
+        batch = [(pg.event.event_name(event.type), {name: getattr(event, name) for name in RECORDEDEVENTS[event.type]})
+                 for event in events if event.type in RECORDEDEVENTS]
+        if batch:
+            self.file.write(repr((game_time, pg.time.get_ticks() - self.start, batch)) + "\n")
+            self.file.flush()
+
+    def close(self):
+        """ Closes the file.
+
+        :return: None
+        """
+
+        self.file.close()
+
+
+def load_recording(filename):
+    """ Reads a recording.
+
+    The lines are parsed with 'ast.literal_eval', a recording can't run any code.
+
+    :param filename: the path of the recording
+    :return: (game_params, list of (game time, wall time, list of Event objects))
+    :raise ValueError: if the file isn't a recording of this version
+    """
+
+    batches = []
+    with gzip.open(filename, 'rt') as file:
+        header = ast.literal_eval(file.readline())
+        if not isinstance(header, dict) or header.get("version") != RECORDVERSION:
+            raise ValueError(filename + " isn't a recording of version " + str(RECORDVERSION))
+
+        try:
+            for line in file:
+                game_time, wall_time, batch = ast.literal_eval(line)
+                batches.append((game_time, wall_time, [pg.event.Event(EVENTTYPES[name], attributes) for name, attributes in batch]))
+        except (EOFError, SyntaxError):  # the game was killed while writing, keep what was flushed
+            pass
+
+    return header["game_params"], batches
+
+
+def replay(filename, speed=None):
+    """ Plays a recording without window and measures the time taken by each frame.
+
+    Each batch of events is posted when the game time reaches its game time,
+    the screen is drawn after each update as the text box layout is computed when drawing.
+    The replay stops when the user went back to the main menu or when the player stops after the last action.
+
+    :param filename: the path of the recording
+    :param speed: None to replay as fast as possible, 1 to replay at the original speed, 2 twice faster...
+    :return: dictionary of statistics: frames, game and wall time, frame times, map loads
+    """
+
+    from headless import HeadlessGame  # selects the dummy drivers
+    import globvars as glob
+
+    game_params, batches = load_recording(filename)
+    headless = HeadlessGame(game_params)
+    game = headless.game
+
+    frame_times = []
+    map_load_times = []
+    last_wall_time = last_game_time = 0
+    start = time.perf_counter()
+    next_batch = 0
+    while glob.active_screen == "capytaine" and (next_batch < len(batches) or game.is_animating()):
+        while next_batch < len(batches) and batches[next_batch][0] <= game.time:
+            game_time, wall_time, events = batches[next_batch]
+            if speed is not None:
+                time.sleep(max(0, start + wall_time / 1000 / speed - time.perf_counter()))
+                last_wall_time, last_game_time = wall_time, game_time
+            for event in events:
+                pg.event.post(event)
+            next_batch += 1
+
+        if speed is not None:  # the game time follows the wall time between two batches
+            wall_time = last_wall_time + game.time - last_game_time
+            if next_batch < len(batches):
+                wall_time = min(wall_time, batches[next_batch][1])
+            time.sleep(max(0, start + wall_time / 1000 / speed - time.perf_counter()))
+
+        game_map = game.map
+        frame_start = time.perf_counter()
+        headless.step()
+        frame_times.append((time.perf_counter() - frame_start) * 1000)
+        if game.map is not game_map:
+            map_load_times.append(frame_times[-1])
+
+    wall_time = time.perf_counter() - start
+    headless.close()
+
+    frame_times.sort()
+    return {
+        "frames": len(frame_times),
+        "game_time_ms": game.time,
+        "wall_time_s": round(wall_time, 3),
+        "mean_frame_ms": round(sum(frame_times) / max(1, len(frame_times)), 3),
+        "p95_frame_ms": round(frame_times[int(len(frame_times) * 0.95)], 3) if frame_times else 0,
+        "max_frame_ms": round(frame_times[-1], 3) if frame_times else 0,
+        "slow_frames": sum(1 for frame_time in frame_times if frame_time > 1000 / FPS),
+        "map_loads": len(map_load_times),
+        "max_map_load_ms": round(max(map_load_times), 3) if map_load_times else 0
+    }
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("Usage: python replay.py RECORDING [SPEED]   (no SPEED: as fast as possible, 1: original speed)")
+        sys.exit(1)
+
+    for name, value in replay(sys.argv[1], float(sys.argv[2]) if len(sys.argv) > 2 else None).items():
+        print(name, value)
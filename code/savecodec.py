@@ -0,0 +1,270 @@
+"""
+    This module encodes the parameters of a saved game in a compact binary format and decodes them.
+
+    The parameters have the structure of GAME_STARTUP_PARAMS. They are encoded, little-endian, as:
+    - a header: SAVEMAGIC and the format version (1 byte),
+    - a string table: the number of strings (2 bytes), then each string as its length (2 bytes) and its UTF-8 bytes,
+      every other string of the save is an index in this table (2 bytes),
+    - the player: name, x and y (8 bytes floats), look_at (2 signed bytes),
+    - the map name, then the number of map versions and the (map name, version) pairs,
+    - the flags (1 byte): one bit per tool of SAVEDTOOLS, then quest journal and goals booklet acquired,
+    - the current quest: name, state (1 signed byte) and current objective number (2 bytes),
+    - the removed objects: their names end with a number, e.g. 'm1dirt3',
+      so they are grouped by prefix, i.e. by map and object type, and each group is a bitset of the numbers removed.
+      Names without number are stored as strings.
+
+    Saves written by the former versions are pickled dictionaries, their format version is 0.
+    They are decoded without running any pickled code, see 'RestrictedUnpickler',
+    then upgraded by the functions of MIGRATIONS, one version after the other.
+
+    Class
+    -----
+    RestrictedUnpickler:
+        a class used to read the pickle files of the former versions without running the code they may contain
+
+    Functions
+    ---------
+    safe_loads(data):
+        reads a pickled object made only of basic types and dates
+    get_format_version(data):
+        returns the format version of an encoded save
+    encode_game_params(game_params):
+        encodes the parameters of a game in the current format
+    decode_version_1(data):
+        decodes the parameters of a game saved in format version 1
+    migrate_version_0(game_params):
+        upgrades the parameters of a pickled save to format version 1
+    decode_game_params(data):
+        decodes the parameters of a game saved in any format version
+"""
+
+import io
+import pickle
+import struct
+from datetime import datetime
+
+from settings import GAME_STARTUP_PARAMS
+
+SAVEMAGIC = b"CDSV"
+SAVEFORMATVERSION = 1
+SAVEDTOOLS = ("axe", "shovel", "pickaxe", "net")  # bit order of the tools in the flags, never reorder
+DIGITS = "0123456789"
+HEADER = struct.Struct("<BH")  # version, number of strings
+INDEX = struct.Struct("<H")  # string index or count
+PAIR = struct.Struct("<HH")  # two string indexes, or a string index and a length
+PLAYER = struct.Struct("<Hddbb")  # name, x, y, look_at
+QUEST = struct.Struct("<BHbH")  # flags, quest name, state, current objective number
+
+
+class RestrictedUnpickler(pickle.Unpickler):
+    """
+        A class used to read the pickle files of the former versions without running the code they may contain.
+
+        A pickle file can import and call any function, only the classes of ALLOWEDCLASSES can be loaded.
+        Dictionaries, lists, tuples, strings, numbers and booleans don't need any class.
+
+        Methods
+        -------
+        find_class(self, module, name):
+            returns an allowed class, refuses the other ones
+    """
+
+    ALLOWEDCLASSES = {("datetime", "datetime"): datetime}
+
+    def find_class(self, module, name):
+        """ Returns an allowed class, refuses the other ones.
+
+        :param module: the module of the class
+        :param name: the name of the class
+        :return: the class
+        :raise pickle.UnpicklingError: if the class is not allowed
+        """
+
+        if (module, name) in self.ALLOWEDCLASSES:
+            return self.ALLOWEDCLASSES[(module, name)]
+        raise pickle.UnpicklingError("{}.{} is not allowed in a save".format(module, name))
+
+
+def safe_loads(data):
+    """ Reads a pickled object made only of basic types and dates.
+
+    :param data: the pickled bytes
+    :return: the object
+    :raise pickle.UnpicklingError: if the data contains another class
+    """
+
+    return RestrictedUnpickler(io.BytesIO(data)).load()
+
+
+def get_format_version(data):
+    """ Returns the format version of an encoded save.
+
+    :param data: the encoded parameters
+    :return: int, 0 for the pickled saves of the former versions
+    """
+
+    if data[:len(SAVEMAGIC)] == SAVEMAGIC:
+        return data[len(SAVEMAGIC)]
+    return 0
+
+
+def encode_game_params(game_params):
+    """ Encodes the parameters of a game in the current format.
+
+    :param game_params: dictionary with the same structure as GAME_STARTUP_PARAMS
+    :return: bytes
+    """
+
+    strings = {}
+
+    def intern(string):
+        return strings.setdefault(string, len(strings))
+
+    player = game_params["player"]
+    maps_version = game_params["maps_version"]
+    body = [PLAYER.pack(intern(player["name"]), player["x"], player["y"], *player["look_at"]),
+            PAIR.pack(intern(game_params["map"]["name"]), len(maps_version))]
+    body += [PAIR.pack(intern(map_name), intern(version)) for map_name, version in maps_version.items()]
+
+    flags = 0
+    for bit, tool in enumerate(SAVEDTOOLS):
+        flags |= game_params["unlocked_tools"][tool] << bit
+    flags |= game_params["quest_journal_acquired"] << len(SAVEDTOOLS)
+    flags |= game_params["goals_booklet_acquired"] << (len(SAVEDTOOLS) + 1)
+
+    quest = game_params["current_quest"]
+    body.append(QUEST.pack(flags, intern(quest["name"]), quest["state"], quest["current_obj_nbr"]))
+
+    bitsets = {}
+    other_objects = []
+    for name in game_params["removed_objects"]:
+        prefix = name.rstrip(DIGITS)  # 'm1dirt3' -> 'm1dirt'
+        number = name[len(prefix):]
+        if prefix and number and number[0] != '0':
+            bitsets[prefix] = bitsets.get(prefix, 0) | 1 << int(number)
+        elif name not in other_objects:
+            other_objects.append(name)
+
+    body.append(INDEX.pack(len(bitsets)))
+    for prefix, bitset in bitsets.items():
+        bitset_bytes = bitset.to_bytes((bitset.bit_length() + 7) // 8, "little")
+        body += [PAIR.pack(intern(prefix), len(bitset_bytes)), bitset_bytes]
+    body.append(INDEX.pack(len(other_objects)))
+    body += [INDEX.pack(intern(name)) for name in other_objects]
+
+    header = [SAVEMAGIC, HEADER.pack(SAVEFORMATVERSION, len(strings))]
+    for string in strings:
+        encoded = string.encode("utf-8")
+        header += [INDEX.pack(len(encoded)), encoded]
+    return b"".join(header + body)
+
+
+def decode_version_1(data):
+    """ Decodes the parameters of a game saved in format version 1.
+
+    :param data: the encoded parameters
+    :return: dictionary with the same structure as GAME_STARTUP_PARAMS
+    """
+
+    offset = len(SAVEMAGIC) + 1
+
+    def read(unpacker):
+        nonlocal offset
+        values = unpacker.unpack_from(data, offset)
+        offset += unpacker.size
+        return values
+
+    strings = []
+    for idx in range(read(INDEX)[0]):
+        length = read(INDEX)[0]
+        if offset + length > len(data):
+            raise struct.error("string out of the data")
+        strings.append(data[offset:offset + length].decode("utf-8"))
+        offset += length
+
+    player_name, x, y, look_x, look_y = read(PLAYER)
+    map_name, nbr_versions = read(PAIR)
+    maps_version = {}
+    for idx in range(nbr_versions):
+        version_map, version = read(PAIR)
+        maps_version[strings[version_map]] = strings[version]
+
+    flags, quest_name, quest_state, current_obj_nbr = read(QUEST)
+
+    removed_objects = []
+    for idx in range(read(INDEX)[0]):
+        prefix, length = read(PAIR)
+        if offset + length > len(data):
+            raise struct.error("bitset out of the data")
+        bits = bin(int.from_bytes(data[offset:offset + length], "little"))[:1:-1]  # bit 0 first
+        offset += length
+        removed_objects += [strings[prefix] + str(number) for number, bit in enumerate(bits) if bit == '1']
+    removed_objects += [strings[read(INDEX)[0]] for idx in range(read(INDEX)[0])]
+
+    return {
+        "player": {
+            "name": strings[player_name],
+            "x": x,
+            "y": y,
+            "look_at": (look_x, look_y)
+        },
+        "map": {
+            "name": strings[map_name]
+        },
+        "maps_version": maps_version,
+        "unlocked_tools": {tool: bool(flags >> bit & 1) for bit, tool in enumerate(SAVEDTOOLS)},
+        "current_quest": {
+            "name": strings[quest_name],
+            "state": quest_state,
+            "current_obj_nbr": current_obj_nbr
+        },
+        "quest_journal_acquired": bool(flags >> len(SAVEDTOOLS) & 1),
+        "goals_booklet_acquired": bool(flags >> (len(SAVEDTOOLS) + 1) & 1),
+        "removed_objects": removed_objects
+    }
+
+
+def migrate_version_0(game_params):
+    """ Upgrades the parameters of a pickled save to format version 1.
+
+    The first versions of the game had fewer parameters, the missing ones take their value at the start of a game.
+
+    :param game_params: dictionary of format version 0
+    :return: dictionary of format version 1
+    """
+
+    upgraded = {}
+    for key, default in GAME_STARTUP_PARAMS.items():
+        if isinstance(default, dict) and key != "maps_version":
+            upgraded[key] = dict(default, **game_params.get(key, {}))
+        else:
+            upgraded[key] = game_params.get(key, default)
+    upgraded["player"]["look_at"] = tuple(upgraded["player"]["look_at"])
+    upgraded["removed_objects"] = list(upgraded["removed_objects"])
+    return upgraded
+
+
+DECODERS = {0: safe_loads, 1: decode_version_1}  # format version -> function decoding this version
+MIGRATIONS = {0: migrate_version_0}  # format version -> function upgrading the parameters to the next version
+
+
+def decode_game_params(data):
+    """ Decodes the parameters of a game saved in any format version.
+
+    :param data: the encoded parameters
+    :return: dictionary with the same structure as GAME_STARTUP_PARAMS
+    :raise ValueError: if the data is not a valid save
+    """
+
+    version = get_format_version(data)
+    if version not in DECODERS:
+        raise ValueError("Unknown save format version " + str(version))
+
+    try:
+        game_params = DECODERS[version](data)
+    except (struct.error, IndexError, UnicodeDecodeError, pickle.UnpicklingError, EOFError) as error:
+        raise ValueError("Corrupted save: " + str(error))
+
+    for from_version in range(version, SAVEFORMATVERSION):
+        game_params = MIGRATIONS[from_version](game_params)
+    return game_params
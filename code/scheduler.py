@@ -0,0 +1,107 @@
+"""
+    This module waits for the user actions without polling the event queue.
+
+    Class
+    -----
+    EventScheduler:
+        a class used to wait for events and to post timer events
+"""
+
+import pygame as pg
+
+
+class EventScheduler:
+    """
+        A class used to wait for events and to post timer events.
+
+        The event loops of the menus and of the game block in 'wait' until an event arrives,
+        the process doesn't use the CPU while the user does nothing.
+        Something that must happen later, without user action, is a timer posting a custom event
+        which wakes up the event loop like any other event.
+
+        An instance is created in 'main.py' and shared in 'globvars.scheduler'.
+
+        Attributes
+        ----------
+        timers: dict
+            (delay in ms, repeat) of the running timers keyed by event type
+
+        Methods
+        -------
+        new_event_type():
+            returns a new custom event type
+        start_timer(self, event_type, delay, repeat=False):
+            posts an event of this type after 'delay' milliseconds
+        stop_timer(self, event_type):
+            stops a timer
+        stop_all(self):
+            stops all the timers
+        wait(self, timeout=None):
+            waits for at least one event and returns all the events in the queue
+    """
+
+    def __init__(self):
+        self.timers = {}
+
+    @staticmethod
+    def new_event_type():
+        """ Returns a new custom event type.
+
+        :return: int
+        """
+
+        return pg.event.custom_type()
+
+    def start_timer(self, event_type, delay, repeat=False):
+        """ Posts an event of this type after 'delay' milliseconds.
+
+        Starting a timer that is already running restarts it.
+
+        :param event_type: event type returned by 'new_event_type'
+        :param delay: delay in milliseconds
+        :param repeat: True to post the event every 'delay' milliseconds until the timer is stopped
+        :return: None
+        """
+
+        pg.time.set_timer(event_type, delay, 0 if repeat else 1)
+        self.timers[event_type] = (delay, repeat)
+
+    def stop_timer(self, event_type):
+        """ Stops a timer.
+
+        :param event_type: event type of the timer
+        :return: None
+        """
+
+        pg.time.set_timer(event_type, 0)
+        self.timers.pop(event_type, None)
+
+    def stop_all(self):
+        """ Stops all the timers.
+
+        :return: None
+        """
+
+        for event_type in list(self.timers):
+            self.stop_timer(event_type)
+
+    def wait(self, timeout=None):
+        """ Waits for at least one event and returns all the events in the queue.
+
+        One-shot timers are forgotten once their event is returned.
+
+        :param timeout: maximum time to wait in milliseconds, None to wait until an event arrives, 0 not to wait
+        :return: list of Event objects, empty if the timeout expired
+        """
+
+        if timeout == 0:
+            events = pg.event.get()
+        else:
+            event = pg.event.wait() if timeout is None else pg.event.wait(timeout)
+            events = [] if event.type == pg.NOEVENT else [event]
+            events += pg.event.get()
+
+        for event in events:
+            if event.type in self.timers and not self.timers[event.type][1]:
+                del self.timers[event.type]
+        return events
@@ -19,18 +19,37 @@ SIZE = (WIDTH, HEIGHT)
 TILESIZE = 32
 GRIDWIDTH = WIDTH / TILESIZE
 GRIDHEIGHT = HEIGHT / TILESIZE
+CHUNKSIZE = 8  # Maps are baked by chunks of CHUNKSIZE x CHUNKSIZE tiles
+MAPCACHEBUDGET = 32 * 1024 * 1024  # Max bytes of map images kept in memory for already visited maps
+PREFETCHWORKERS = 2  # Number of threads loading the neighbour maps in the background
+DIRTYRECTS = True  # Only update the parts of the game screen that changed, False to flip the whole screen each frame
 
 TITLE = "Capytaine Durable"
 KEYREPEATDELAY = 120
 KEYREPEATINTERVAL = 120
+FPS = 60  # Max frames per second while something moves on the screen
+UPDATESTEP = 10  # ms of game time simulated by each 'Game.update', must be shorter than a frame at FPS
+MAXFRAMETIME = 250  # ms, longer frames are simulated as if they lasted MAXFRAMETIME so a slow machine slows the game down instead of freezing it
+STEPTIME = 120  # ms for the player to walk from one tile to the next one
+RECORDINPUT = False  # Record the input of each game in RECORDDIR, to replay it with 'python replay.py'
+AUTOSAVE = True  # Save the game in the autosave slot when the player makes progress, see 'autosave.py'
+AUTOSAVEINTERVAL = 30000  # Minimum time between two autosaves in milliseconds
 
 CONFIGPATH = "capytaine.cfg"
-SAVEPATH = "capytaine.save"
+SAVEPATH = "capytaine.save"  # Saves of the former versions, imported when SAVEDBPATH is created
+SAVEDBPATH = "capytaine.db"
+THUMBNAILSIZE = (60, 48)  # Size of the screenshots displayed next to the saves
 SONGPATH = "media/TownTheme.mp3"
 IMAGEDIR = "img/"
-SLEEPTIME = 30  # ms
-SAVESLOTS = 6  # Count of save slots must be between 1 and 8
+ATLASDIR = "atlas/"  # Sprite sheets packed from IMAGEDIR, see 'assets.py'
+RECORDDIR = "records/"  # Recorded games, see 'replay.py'
+ATLASWIDTH = 1024  # Width of the sprite sheets in pixels
+MAPDIR = "maps/"
+BUNDLEEXT = ".cmap"  # Compiled maps, see 'mapbundle.py'
+SAVESLOTS = 6  # Count of saves per page of the load and save screens, must be between 1 and 8
 DEFAULTFONT = "arial"
+FONTDIR = "fonts/"  # A font file 'face.ttf' placed here is used instead of the system font
+TEXTLAYOUTCACHE = 128  # Number of text layouts kept in memory, see 'capylib.get_text_layout'
 
 # GAME default startup parameters
 # These parameters are overwritten in case of save reload
@@ -0,0 +1,121 @@
+"""
+    This module keeps the state of a game in memory to restore it later, for the quicksave and the quickload.
+
+    Class
+    -----
+    GameSnapshot:
+        a class used to copy the state of a game and to restore it
+"""
+
+from settings import STEPTIME
+
+
+class GameSnapshot:
+    """
+        A class used to copy the state of a game and to restore it.
+
+        Only the plain values that change while playing are copied, in tuples,
+        the sprites, maps and images stay in the game: taking a snapshot costs a few microseconds.
+        A snapshot is never modified, restoring it copies its values in the game,
+        so the same snapshot can be restored several times.
+
+        Restoring a snapshot taken on the current map only places the player again,
+        the sprites are created again, from the map cache, if objects removed since the snapshot must reappear.
+
+        Attributes
+        ----------
+        player: tuple
+            (x, y, look_at) of the player
+        map_name: str
+            the current map
+        maps_version: tuple
+            (map name, version) of the maps whose version changed
+        quests: tuple
+            (state, current_obj_nbr, validated) of each quest of 'Script.all_quests'
+        current_quest, next_quest: int
+            indexes of the current and next quests in 'Script.all_quests', next_quest is None after the last quest
+        tools: tuple of bool
+            whether each tool of 'Inventory.tools' is acquired
+        quest_journal_acquired, goals_booklet_acquired: bool
+            whether the quest and goals screens are unlocked
+        removed_objects: tuple of str
+            the names of the objects removed by the player
+
+        Methods
+        -------
+        restore(self, game):
+            puts the game back in the state of the snapshot
+    """
+
+    def __init__(self, game):
+        player = game.player
+        script = game.script
+        inventory = game.inventory
+
+        self.player = (player.x, player.y, player.look_at)
+        self.map_name = game.map.name
+        self.maps_version = tuple(script.maps_version.items())
+        self.quests = tuple((quest.state, quest.current_obj_nbr, getattr(quest, "validated", False)) for quest in script.all_quests)
+        self.current_quest = script.all_quests.index(script.current_quest)
+        self.next_quest = None if script.next_quest is None else script.all_quests.index(script.next_quest)
+        self.tools = tuple(tool.acquired for tool in inventory.tools)
+        self.quest_journal_acquired = inventory.quest_journal_acquired
+        self.goals_booklet_acquired = inventory.goals_booklet_acquired
+        self.removed_objects = tuple(game.removed_objects)
+
+    def __repr__(self):
+        return "<%s: %s (%g, %g), quest %d, %d removed objects>" % (self.__class__.__name__, self.map_name, self.player[0], self.player[1],
+                                                                    self.current_quest, len(self.removed_objects))
+
+    def restore(self, game):
+        """ Puts the game back in the state of the snapshot.
+
+        :param game: the Game object the snapshot was taken from
+        :return: None
+        """
+
+        script = game.script
+        inventory = game.inventory
+
+        # Quests:
+        for quest, (state, current_obj_nbr, validated) in zip(script.all_quests, self.quests):
+            quest.state = state
+            quest.current_obj_nbr = current_obj_nbr
+            if hasattr(quest, "validated"):
+                quest.validated = validated
+        script.current_quest = script.all_quests[self.current_quest]
+        script.next_quest = None if self.next_quest is None else script.all_quests[self.next_quest]
+
+        # Inventory:
+        for tool, acquired in zip(inventory.tools, self.tools):
+            tool.acquired = acquired
+        inventory.quest_journal_acquired = self.quest_journal_acquired
+        inventory.goals_booklet_acquired = self.goals_booklet_acquired
+
+        # Maps: the versions changed since the snapshot are removed from the cache
+        map_key = (game.map.name, game.map.version)
+        maps_version = dict(self.maps_version)
+        for map_name in set(script.maps_version) | set(maps_version):
+            if script.maps_version.get(map_name, '') != maps_version.get(map_name, ''):
+                game.map_cache.invalidate(map_name, maps_version.get(map_name, ''))
+        script.maps_version.clear()
+        script.maps_version.update(maps_version)
+
+        # Objects: those removed since the snapshot must reappear if they are on the current map
+        reappearing = set(game.removed_objects).difference(self.removed_objects)
+        game.removed_objects[:] = self.removed_objects  # the list is shared with 'game_params'
+
+        if (self.map_name, maps_version.get(self.map_name, '')) != map_key or any(obj.name in reappearing for obj in game.map.objects):
+            game.load_map(self.map_name)
+        else:
+            for character in game.characters:
+                character.interacting_with = False
+
+        # Player:
+        player = game.player
+        player.x, player.y, player.look_at = self.player
+        player.walking = None
+        player.interacting = False
+        player.step_time = STEPTIME
+        player.previous_position = player.position = player.get_position()
+        game.line_number = 0
@@ -0,0 +1,246 @@
+"""
+    This module indexes the map by tile so that the game can find what is on a tile without scanning all sprites.
+
+    Class
+    -----
+    WalkabilityGrid:
+        a class used to know in one lookup if a tile is blocked by an obstacle, a npc or an object
+    SpatialIndex:
+        a class used to find the npc, object or gate on a tile and a npc by its name
+"""
+
+from math import ceil
+
+
+class WalkabilityGrid:
+    """
+        A class used to know in one lookup if a tile is blocked by an obstacle, a npc or an object.
+
+        The grid has one byte per tile of the map and two layers:
+        the static layer is built once from the Obstacle rectangles of the map,
+        the dynamic layer counts the npcs and objects on each tile and is updated when they are removed.
+
+        Sprite coordinates are floats, a sprite blocks the tiles (x, y) such as
+        sprite.x <= x < sprite.x + sprite.w and sprite.y <= y < sprite.y + sprite.h,
+        like in the scan of the obstacles group it replaces.
+
+        Attributes
+        ----------
+        width, height: int
+            the dimensions of the map in tiles
+        obstacles: sprites group
+            the group of all blocking sprites, scanned for positions outside of the grid
+        static: bytearray
+            1 for the tiles covered by an Obstacle
+        dynamic: bytearray
+            the number of npcs and objects covering each tile
+
+        Methods
+        -------
+        add(self, sprite, dynamic=False):
+            marks the tiles covered by a sprite as blocked
+        remove(self, sprite):
+            frees the tiles covered by a npc or an object
+        is_blocked(self, x, y):
+            returns True if the tile is blocked
+    """
+
+    def __init__(self, width, height, obstacles):
+        self.width = width
+        self.height = height
+        self.obstacles = obstacles
+        self.static = bytearray(width * height)
+        self.dynamic = bytearray(width * height)
+
+    def get_cells(self, sprite):
+        """ Returns the index in the layers of the tiles covered by a sprite.
+
+        Tiles outside of the map are ignored.
+
+        :param sprite: Obstacle, NPC or Object
+        :return: list of int
+        """
+
+        x_start, x_end = max(0, ceil(sprite.x)), min(self.width, ceil(sprite.x + sprite.w))
+        y_start, y_end = max(0, ceil(sprite.y)), min(self.height, ceil(sprite.y + sprite.h))
+        return [y * self.width + x for y in range(y_start, y_end) for x in range(x_start, x_end)]
+
+    def add(self, sprite, dynamic=False):
+        """ Marks the tiles covered by a sprite as blocked.
+
+        :param sprite: Obstacle, NPC or Object
+        :param dynamic: True for the sprites that can be removed from the map
+        :return: None
+        """
+
+        if dynamic:
+            for cell in self.get_cells(sprite):
+                self.dynamic[cell] += 1
+        else:
+            for cell in self.get_cells(sprite):
+                self.static[cell] = 1
+
+    def remove(self, sprite):
+        """ Frees the tiles covered by a npc or an object.
+
+        :param sprite: NPC or Object added with dynamic=True
+        :return: None
+        """
+
+        for cell in self.get_cells(sprite):
+            if self.dynamic[cell]:
+                self.dynamic[cell] -= 1
+
+    def is_blocked(self, x, y):
+        """ Returns True if the tile is blocked.
+
+        Positions outside of the map or between two tiles are checked against each blocking sprite.
+
+        :param x: x-axis position in tiles
+        :param y: y-axis position in tiles
+        :return: True if a blocking sprite covers the position
+        """
+
+        if x == int(x) and y == int(y) and 0 <= x < self.width and 0 <= y < self.height:
+            cell = int(y) * self.width + int(x)
+            return bool(self.static[cell] or self.dynamic[cell])
+
+        for o in self.obstacles:
+            if (o.x <= x < (o.x + o.w)) and (o.y <= y < (o.y + o.h)):
+                return True
+        return False
+
+
+class SpatialIndex:
+    """
+        A class used to find the npc, object or gate on a tile and a npc by its name.
+
+        Npcs and gates are found on their exact position, like 'Player.interact_with_npc' and 'Player.on_gate' did,
+        objects on every tile they cover, like the blocked tiles of 'WalkabilityGrid'.
+        Each key holds a list so that the sprite added first is returned when several share a tile or a name,
+        as the scan of the sprite groups did.
+
+        Attributes
+        ----------
+        objects: sprites group
+            the group of objects, scanned for positions between two tiles
+        npcs, gates, object_tiles: dict
+            lists of sprites keyed by tile (x, y)
+        npc_names: dict
+            lists of npcs keyed by name
+
+        Methods
+        -------
+        add(self, sprite, kind):
+            adds a npc, an object or a gate to the index
+        remove(self, sprite, kind):
+            removes a npc, an object or a gate from the index
+        get_npc_at(self, x, y):
+            returns the npc on a tile, None otherwise
+        get_object_at(self, x, y):
+            returns the object covering a tile, None otherwise
+        get_gate_at(self, x, y):
+            returns the gate on a tile, None otherwise
+        get_npc(self, npc_name):
+            returns the npc with this name, None otherwise
+    """
+
+    def __init__(self, objects):
+        self.objects = objects
+        self.npcs = {}
+        self.gates = {}
+        self.object_tiles = {}
+        self.npc_names = {}
+
+    def get_keys(self, sprite, kind):
+        """ Returns the dictionaries and keys under which a sprite is indexed.
+
+        :param sprite: NPC, Object or Gate
+        :param kind: "npc", "object" or "gate"
+        :return: list of (dict, key)
+        """
+
+        if kind == "npc":
+            return [(self.npcs, (sprite.x, sprite.y)), (self.npc_names, sprite.name)]
+        elif kind == "gate":
+            return [(self.gates, (sprite.x, sprite.y))]
+        else:
+            return [(self.object_tiles, (x, y)) for y in range(ceil(sprite.y), ceil(sprite.y + sprite.h))
+                    for x in range(ceil(sprite.x), ceil(sprite.x + sprite.w))]
+
+    def add(self, sprite, kind):
+        """ Adds a npc, an object or a gate to the index.
+
+        :param sprite: NPC, Object or Gate
+        :param kind: "npc", "object" or "gate"
+        :return: None
+        """
+
+        for index, key in self.get_keys(sprite, kind):
+            index.setdefault(key, []).append(sprite)
+
+    def remove(self, sprite, kind):
+        """ Removes a npc, an object or a gate from the index.
+
+        A sprite that moves is removed before changing its position then added again.
+
+        :param sprite: NPC, Object or Gate
+        :param kind: "npc", "object" or "gate"
+        :return: None
+        """
+
+        for index, key in self.get_keys(sprite, kind):
+            sprites = index.get(key, [])
+            if sprite in sprites:
+                sprites.remove(sprite)
+                if not sprites:
+                    del index[key]
+
+    def get_npc_at(self, x, y):
+        """ Returns the npc on a tile, None otherwise.
+
+        :param x: x-axis position in tiles
+        :param y: y-axis position in tiles
+        :return: NPC object or None
+        """
+
+        npcs = self.npcs.get((x, y))
+        return npcs[0] if npcs else None
+
+    def get_object_at(self, x, y):
+        """ Returns the object covering a tile, None otherwise.
+
+        :param x: x-axis position in tiles
+        :param y: y-axis position in tiles
+        :return: Object object or None
+        """
+
+        if x == int(x) and y == int(y):
+            objects = self.object_tiles.get((int(x), int(y)))
+            return objects[0] if objects else None
+
+        for obj in self.objects:
+            if (obj.x <= x < obj.x + obj.w) and (obj.y <= y < obj.y + obj.h):
+                return obj
+        return None
+
+    def get_gate_at(self, x, y):
+        """ Returns the gate on a tile, None otherwise.
+
+        :param x: x-axis position in tiles
+        :param y: y-axis position in tiles
+        :return: Gate object or None
+        """
+
+        gates = self.gates.get((x, y))
+        return gates[0] if gates else None
+
+    def get_npc(self, npc_name):
+        """ Returns the npc with this name, None otherwise.
+
+        :param npc_name: name attribute of NPC object
+        :return: NPC object or None
+        """
+
+        npcs = self.npc_names.get(npc_name)
+        return npcs[0] if npcs else None
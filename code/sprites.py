@@ -18,6 +18,7 @@
 
 import pygame as pg
 
+import globvars as glob
 from settings import *
 
 
@@ -36,6 +37,14 @@ class Player(pg.sprite.Sprite):
             (0,1): below, (0,-1): above, (1,0): right, (-1,0): left
         steps: int
             an integer variable allowing to display different image of a character when it moves
+        walking: (int, int)
+            the direction of the movement key held by the user, None if no movement key is held
+        from_x, from_y: int
+            the tile the player is walking from
+        step_time: int
+            milliseconds since the player left (from_x, from_y), STEPTIME or more once he stands on (x, y)
+        previous_position, position: (float, float)
+            the position in pixels at the two last updates, 'rect' is placed between them when drawing
         name: str
             the object name, used to load images
         z_images, q_images, s_images, d_images: Image
@@ -51,8 +60,14 @@ class Player(pg.sprite.Sprite):
             load all player images depending on which character the user has chosen
         get_image(self):
             returns the image to display depending on where the player looks
+        walk(self, dx, dy):
+            makes the player walk in a direction until 'stop_walking' is called
+        stop_walking(self, dx, dy):
+            stops walking in a direction once the current step is over
+        is_moving(self):
+            returns True if the player is between two tiles
         move(self, dx=0, dy=0):
-            changes player x and y attributes
+            changes player x and y attributes and starts a step towards the new tile
         out_of_bounds(self, dx=0, dy=0):
             returns True if the player would be out of bounds
         collide_with_obstacles(self, dx=0, dy=0):
@@ -67,8 +82,12 @@ class Player(pg.sprite.Sprite):
             returns the NPC object next to which the player is, None otherwise
         interact_with_object(self):
             returns the Object object next to which the player is, None otherwise
-        update(self):
-            updates the player's rectangle x and y attributes
+        update(self, dt=0):
+            advances the current step and updates the player's position
+        get_position(self):
+            returns the position in pixels of the player along the current step
+        interpolate(self, alpha):
+            places the player's rectangle between its positions at the two last updates
     """
 
     _instance = None
@@ -96,6 +115,12 @@ class Player(pg.sprite.Sprite):
         self.x = x
         self.y = y
 
+        self.walking = None
+        self.from_x = x
+        self.from_y = y
+        self.step_time = STEPTIME
+        self.previous_position = self.position = self.get_position()
+
     def __repr__(self):
         return "<%s sprite (in %d groups) - ID: %d>" % (self.__class__.__name__, len(self.groups), self.game.choice_selected)
 
@@ -111,24 +136,24 @@ class Player(pg.sprite.Sprite):
         :return: None
         """
 
-        z_img = pg.image.load(IMAGEDIR + 'player/' + self.name + '_z.png').convert_alpha()
-        z_left_img = pg.image.load(IMAGEDIR + 'player/' + self.name + '_zl.png').convert_alpha()
-        z_right_img = pg.image.load(IMAGEDIR + 'player/' + self.name + '_zr.png').convert_alpha()
+        z_img = glob.assets.get_image('player/' + self.name + '_z.png')
+        z_left_img = glob.assets.get_image('player/' + self.name + '_zl.png')
+        z_right_img = glob.assets.get_image('player/' + self.name + '_zr.png')
         self.z_images = [z_img, z_right_img, z_img, z_left_img]
 
-        q_img = pg.image.load(IMAGEDIR + 'player/' + self.name + '_q.png').convert_alpha()
-        q_left_img = pg.image.load(IMAGEDIR + 'player/' + self.name + '_ql.png').convert_alpha()
-        q_right_img = pg.image.load(IMAGEDIR + 'player/' + self.name + '_qr.png').convert_alpha()
+        q_img = glob.assets.get_image('player/' + self.name + '_q.png')
+        q_left_img = glob.assets.get_image('player/' + self.name + '_ql.png')
+        q_right_img = glob.assets.get_image('player/' + self.name + '_qr.png')
         self.q_images = [q_img, q_right_img, q_img, q_left_img]
 
-        s_img = pg.image.load(IMAGEDIR + 'player/' + self.name + '_s.png').convert_alpha()
-        s_left_img = pg.image.load(IMAGEDIR + 'player/' + self.name + '_sl.png').convert_alpha()
-        s_right_img = pg.image.load(IMAGEDIR + 'player/' + self.name + '_sr.png').convert_alpha()
+        s_img = glob.assets.get_image('player/' + self.name + '_s.png')
+        s_left_img = glob.assets.get_image('player/' + self.name + '_sl.png')
+        s_right_img = glob.assets.get_image('player/' + self.name + '_sr.png')
         self.s_images = [s_img, s_right_img, s_img, s_left_img]
 
-        d_img = pg.image.load(IMAGEDIR + 'player/' + self.name + '_d.png').convert_alpha()
-        d_left_img = pg.image.load(IMAGEDIR + 'player/' + self.name + '_dl.png').convert_alpha()
-        d_right_img = pg.image.load(IMAGEDIR + 'player/' + self.name + '_dr.png').convert_alpha()
+        d_img = glob.assets.get_image('player/' + self.name + '_d.png')
+        d_left_img = glob.assets.get_image('player/' + self.name + '_dl.png')
+        d_right_img = glob.assets.get_image('player/' + self.name + '_dr.png')
         self.d_images = [d_img, d_right_img, d_img, d_left_img]
 
     def get_image(self):
@@ -151,8 +176,44 @@ class Player(pg.sprite.Sprite):
         else:
             return self.s_images[self.steps]
 
+    def walk(self, dx, dy):
+        """ Makes the player walk in a direction until 'stop_walking' is called.
+
+        The player starts moving at once if he stands on a tile,
+        otherwise he turns in the new direction at the end of the current step.
+
+        :param dx: x-axis offset
+        :param dy: y-axis offset
+        :return: None
+        """
+
+        self.walking = (dx, dy)
+        if not self.is_moving():
+            self.move(dx, dy)
+
+    def stop_walking(self, dx, dy):
+        """ Stops walking in a direction once the current step is over.
+
+        Releasing a movement key doesn't stop the player if another one was pressed since.
+
+        :param dx: x-axis offset
+        :param dy: y-axis offset
+        :return: None
+        """
+
+        if self.walking == (dx, dy):
+            self.walking = None
+
+    def is_moving(self):
+        """ Returns True if the player is between two tiles.
+
+        :return: True if the current step isn't over
+        """
+
+        return self.step_time < STEPTIME
+
     def move(self, dx=0, dy=0):
-        """ Changes player x and y attributes.
+        """ Changes player x and y attributes and starts a step towards the new tile.
 
         dx = 1/-1: the player moves one tile to the right/left
         dy = 1/-1: the player goes down/up one tile
@@ -160,6 +221,9 @@ class Player(pg.sprite.Sprite):
         To accept the player to move, the destination tile shouldn't be out of bounds or an obstacle
         and the player can't move if he's interacting with a npc or an object.
 
+        x and y change at once so collisions and interactions use the destination tile,
+        only the drawn position goes from one tile to the other during STEPTIME milliseconds.
+
         :param dx: x-axis offset
         :param dy: y-axis offset
         :return: None
@@ -176,9 +240,12 @@ class Player(pg.sprite.Sprite):
 
         if not self.game.paused and not just_entered:
             if not self.out_of_bounds(dx, dy) and not self.collide_with_obstacles(dx, dy) and not self.interacting:
+                self.from_x = self.x
+                self.from_y = self.y
                 self.x += dx
                 self.y += dy
-                self.steps = (self.steps + 1) % 4
+                self.step_time = 0
+                self.steps = (self.steps + 1) % 4  # a leg forward during the first half of the step
 
             if not self.interacting:  # It's rude not to look at somebody in the eye when he's talking to you.
                 self.look_at = (dx, dy)  # Even if he doesn't move, he can rotate
@@ -200,15 +267,14 @@ class Player(pg.sprite.Sprite):
     def collide_with_obstacles(self, dx=0, dy=0):
         """ Returns True if the player would collide with obstacles.
 
+        The obstacles, npcs and objects are looked up in the walkability grid of the map.
+
         :param dx: x-axis offset
         :param dy: y-axis offset
         :return: True if the player would collide with obstacles
         """
 
-        for o in self.game.obstacles:
-            if (o.x <= self.x + dx < (o.x + o.w)) and (o.y <= self.y + dy < (o.y + o.h)):
-                return True
-        return False
+        return self.game.walkability.is_blocked(self.x + dx, self.y + dy)
 
     def on_gate(self):
         """ If the player is on a gate, return this Gate object.
@@ -216,10 +282,7 @@ class Player(pg.sprite.Sprite):
         :return: Gate object
         """
 
-        for gate in self.game.gates:
-            if gate.x == self.x and gate.y == self.y:
-                return gate
-        return None
+        return self.game.spatial_index.get_gate_at(self.x, self.y)
 
     def enter_gate(self, gate):
         """ Loads a new map if the player enters a gate.
@@ -240,6 +303,12 @@ class Player(pg.sprite.Sprite):
         # Reset 'steps' attribute when entering a new map:
         self.steps = 0
 
+        # The player appears on the new map without walking from the position he had on the previous one:
+        self.step_time = STEPTIME
+        self.previous_position = self.position = self.get_position()
+
+        self.game.request_autosave()
+
     def ready_to_interact(self):
         """ Returns True if the player is next to a npc or an object.
 
@@ -256,10 +325,7 @@ class Player(pg.sprite.Sprite):
         :return: the NPC object next to which the player is, None otherwise
         """
 
-        for npc in self.game.characters:
-            if (npc.x, npc.y) == (self.x + self.look_at[0], self.y + self.look_at[1]):
-                return npc
-        return None
+        return self.game.spatial_index.get_npc_at(self.x + self.look_at[0], self.y + self.look_at[1])
 
     def interact_with_object(self):
         """ Returns the Object object next to which the player is, None otherwise.
@@ -267,23 +333,64 @@ class Player(pg.sprite.Sprite):
         :return: the Object object next to which the player is, None otherwise
         """
 
-        for obj in self.game.objects:  # unlike the characters, some objects are bigger than one tile
-            if (obj.x <= self.x + self.look_at[0] < obj.x + obj.w) and (obj.y <= self.y + self.look_at[1] < obj.y + obj.h):
-                return obj
-        return None
+        # unlike the characters, some objects are bigger than one tile, they are indexed on each tile they cover
+        return self.game.spatial_index.get_object_at(self.x + self.look_at[0], self.y + self.look_at[1])
+
+    def update(self, dt=0):
+        """ Advances the current step and updates the player's position.
 
-    def update(self):
-        """ Updates the player's rectangle x and y attributes.
+        Called by 'Game.update' every UPDATESTEP milliseconds of game time.
+        When a step is over and a movement key is still held, the next step starts with the time left over
+        so the player walks at the same speed whatever the number of updates per step.
 
+        :param dt: milliseconds of game time since the last update
         :return: None
         """
 
-        self.rect.x = self.x * TILESIZE
-        self.rect.y = self.y * TILESIZE
+        self.previous_position = self.position
+
+        if self.is_moving():
+            self.step_time += dt
+            if self.steps % 2 != 0 and self.step_time >= STEPTIME / 2:
+                self.steps = (self.steps + 1) % 4  # back to the neutral position for the second half of the step
+
+            if not self.is_moving() and self.walking is not None:
+                time_left = self.step_time - STEPTIME
+                self.move(*self.walking)
+                if self.is_moving():
+                    self.step_time = time_left
+        elif self.walking is not None:  # e.g. the player was interacting or facing an obstacle
+            self.move(*self.walking)
 
         if self.steps >= 4:
             self.steps = 0
 
+        self.position = self.get_position()
+        self.interpolate(1)
+
+    def get_position(self):
+        """ Returns the position in pixels of the player along the current step.
+
+        :return: (float, float)
+        """
+
+        progress = min(1, self.step_time / STEPTIME)
+        x = self.from_x + (self.x - self.from_x) * progress
+        y = self.from_y + (self.y - self.from_y) * progress
+        return x * TILESIZE, y * TILESIZE
+
+    def interpolate(self, alpha):
+        """ Places the player's rectangle between its positions at the two last updates.
+
+        The game is drawn between two updates, 'alpha' is the fraction of UPDATESTEP elapsed since the last one.
+
+        :param alpha: 0 for the previous position, 1 for the current one
+        :return: None
+        """
+
+        self.rect.x = round(self.previous_position[0] + (self.position[0] - self.previous_position[0]) * alpha)
+        self.rect.y = round(self.previous_position[1] + (self.position[1] - self.previous_position[1]) * alpha)
+
 
 class Obstacle(pg.sprite.Sprite):
     """
@@ -313,6 +420,8 @@ class Obstacle(pg.sprite.Sprite):
         self.rect.x = x_px
         self.rect.y = y_px
 
+        game.walkability.add(self)
+
 
 class NPC(pg.sprite.Sprite):  # = Non-Player Character
     """
@@ -342,6 +451,8 @@ class NPC(pg.sprite.Sprite):  # = Non-Player Character
 
         Methods
         -------
+        kill(self):
+            removes the sprite from all groups, the walkability grid and the spatial index
         get_image(self):
             returns the image to display depending on where the player is when interacting
     """
@@ -355,10 +466,10 @@ class NPC(pg.sprite.Sprite):  # = Non-Player Character
         self.look_to = look_to
         self.interacting_with = False
 
-        self.z_img = pg.image.load(IMAGEDIR + 'npc/' + str(self.type) + '_z.png').convert_alpha()
-        self.q_img = pg.image.load(IMAGEDIR + 'npc/' + str(self.type) + '_q.png').convert_alpha()
-        self.s_img = pg.image.load(IMAGEDIR + 'npc/' + str(self.type) + '_s.png').convert_alpha()
-        self.d_img = pg.image.load(IMAGEDIR + 'npc/' + str(self.type) + '_d.png').convert_alpha()
+        self.z_img = glob.assets.get_image('npc/' + str(self.type) + '_z.png')
+        self.q_img = glob.assets.get_image('npc/' + str(self.type) + '_q.png')
+        self.s_img = glob.assets.get_image('npc/' + str(self.type) + '_s.png')
+        self.d_img = glob.assets.get_image('npc/' + str(self.type) + '_d.png')
 
         if self.look_to == 'z':
             self.default_image = self.z_img
@@ -377,9 +488,23 @@ class NPC(pg.sprite.Sprite):  # = Non-Player Character
         self.w = w_px/TILESIZE
         self.h = h_px/TILESIZE
 
+        game.walkability.add(self, dynamic=True)
+        game.spatial_index.add(self, "npc")
+
     def __repr__(self):
         return "<%s sprite (%s) (in %d groups) - %s at (%d,%d)>" % (self.__class__.__name__, self.type, len(self.groups), self.name, self.x, self.y)
 
+    def kill(self):
+        """ Removes the npc from all groups, the walkability grid and the spatial index.
+
+        :return: None
+        """
+
+        if self.alive():
+            self.game.walkability.remove(self)
+            self.game.spatial_index.remove(self, "npc")
+        pg.sprite.Sprite.kill(self)
+
     def get_image(self):
         """ Returns the image to display depending on where the player is when interacting.
 
@@ -423,6 +548,8 @@ class Object(pg.sprite.Sprite):
 
         Methods
         -------
+        kill(self):
+            removes the sprite from all groups, the walkability grid and the spatial index
         get_image(self):
             returns the image to display depending on where the player is when interacting
     """
@@ -434,7 +561,7 @@ class Object(pg.sprite.Sprite):
         self.name = name
         self.type = type
 
-        self.image = pg.image.load(IMAGEDIR + 'objects/' + str(type) + '.png').convert_alpha()
+        self.image = glob.assets.get_image('objects/' + str(type) + '.png')
         self.rect = self.image.get_rect()
         self.x = x_px/TILESIZE
         self.y = y_px/TILESIZE
@@ -443,9 +570,23 @@ class Object(pg.sprite.Sprite):
         self.rect.x = x_px
         self.rect.y = y_px
 
+        game.walkability.add(self, dynamic=True)
+        game.spatial_index.add(self, "object")
+
     def __repr__(self):
         return "<%s sprite (%s) (in %d groups) - %s at (%d,%d)>" % (self.__class__.__name__, self.type, len(self.groups), self.name, self.x, self.y)
 
+    def kill(self):
+        """ Removes the object from all groups, the walkability grid and the spatial index.
+
+        :return: None
+        """
+
+        if self.alive():
+            self.game.walkability.remove(self)
+            self.game.spatial_index.remove(self, "object")
+        pg.sprite.Sprite.kill(self)
+
     def get_image(self):
         """ Returns the image to display depending on where the player is when interacting.
 
@@ -489,3 +630,5 @@ class Gate(pg.sprite.Sprite):
         self.y = y_px/TILESIZE
         self.dx = dx
         self.dy = dy
+
+        game.spatial_index.add(self, "gate")
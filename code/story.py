@@ -9,6 +9,11 @@
         a class used to materialize a quest
     Goal:
         a class used to materialize a goal
+
+    Function
+    --------
+    get_goal_percentage(quest_states):
+        returns the completion percentage of a goal from the states of its quests
 """
 
 import pygame as pg
@@ -56,6 +61,8 @@ class Script:
             returns the interaction text of a npc or an object depending on the situation
         unlock_script(self):
             unlock the elements of the script
+        set_map_version(self, map_name, map_version):
+            changes the version of a map and forgets the old one
     """
 
     def __init__(self, game):
@@ -234,28 +241,46 @@ class Script:
             self.game.inventory.goals_booklet_acquired = True
 
         # Unlock tools:
+        tool = None
         if quest.name == "chap2q0" and quest.state == 2:
-            self.game.inventory.axe.acquired = True
+            tool = self.game.inventory.axe
         elif quest.name == "chap2q1" and quest.state == 2:
-            self.game.inventory.shovel.acquired = True
+            tool = self.game.inventory.shovel
         elif quest.name == "chap2q2" and quest.state == 2:
-            self.game.inventory.pickaxe.acquired = True
+            tool = self.game.inventory.pickaxe
         elif quest.name == "chap3q1" and quest.state == 2:
-            self.game.inventory.net.acquired = True
+            tool = self.game.inventory.net
+        if tool is not None and not tool.acquired:  # this function is called at each update
+            tool.acquired = True
+            self.game.request_autosave()
 
         # Unlock maps version:
         if quest.name == "chap2q2" and quest.state == 3:
-            self.maps_version["map2"] = "_2"
+            self.set_map_version("map2", "_2")
         elif quest.name == "chap3q2" and quest.state == 3:
-            self.maps_version["mapC"] = "_2"
+            self.set_map_version("mapC", "_2")
         elif quest.name == "chap4q0" and quest.state == 2:
-            self.maps_version["mapD"] = "_2"
-            self.maps_version["map1"] = "_2"
-            self.maps_version["map2"] = "_3"
+            self.set_map_version("mapD", "_2")
+            self.set_map_version("map1", "_2")
+            self.set_map_version("map2", "_3")
         elif quest.name == "chap4q5" and quest.state == 3:
-            self.maps_version["mapC"] = "_3"
-            self.maps_version["mapD"] = "_3"
-            self.maps_version["map4"] = "_2"
+            self.set_map_version("mapC", "_3")
+            self.set_map_version("mapD", "_3")
+            self.set_map_version("map4", "_2")
+
+    def set_map_version(self, map_name, map_version):
+        """ Changes the version of a map and forgets the old one.
+
+        The old version of the map may still be in the map cache,
+        it must be removed so that the player never walks in it again.
+
+        :param map_name: the map name, e.g. 'map2'
+        :param map_version: the new version, e.g. '_2'
+        :return: None
+        """
+
+        self.maps_version[map_name] = map_version
+        self.game.map_cache.invalidate(map_name, map_version)
 
 
 class Quest:
@@ -304,7 +329,7 @@ class Quest:
         self.statement = statement
         self.quest_giver_name = npc1
         self.quest_validator_name = npc2
-        self.quest_validator_image = pg.image.load(IMAGEDIR + 'npc/' + npc2_type + '_s.png').convert_alpha()
+        self.quest_validator_image = glob.assets.get_image('npc/' + npc2_type + '_s.png')
 
         self.quest_dialogue = dialogue
 
@@ -329,6 +354,7 @@ class Quest:
         if self.state == 1:
             self.state = 2
             self.get_npc(self.quest_giver_name).interacting_with = False
+            self.script.game.request_autosave()
 
     def complete(self):
         if self.state == 2:
@@ -340,6 +366,8 @@ class Quest:
                 if self.goal_nbr != 0 or self.last_quest:
                     self.script.game.show_medal = (True, self.goal_nbr, self.last_quest)
 
+            self.script.game.request_autosave()
+
     def get_npc(self, npc_name):
         """ Returns NPC object corresponding to npc_name.
 
@@ -350,10 +378,7 @@ class Quest:
         """
 
         assert isinstance(npc_name, str), "npc_name must be a string"
-        for npc in self.script.game.characters:
-            if npc.name == npc_name:
-                return npc
-        return None
+        return self.script.game.spatial_index.get_npc(npc_name)
 
 
 class QuestType1(Quest):
@@ -384,7 +409,7 @@ class QuestType2(Quest):
         self.obj_type = obj_type
         self.obj_nbr = obj_nbr
 
-        self.obj_image = pg.image.load(IMAGEDIR + 'objects/' + obj_type + '1.png').convert_alpha()
+        self.obj_image = glob.assets.get_image('objects/' + obj_type + '1.png')
         self.current_obj_nbr = 0
         self.object_dialogue = []
         self.validated = False  # Quest is validated when current_obj_nbr == obj_nbr
@@ -445,7 +470,7 @@ class Goal:
 
         self.state_rect = pg.Rect(0, 0, 50, 50)
 
-        self.image = pg.image.load(IMAGEDIR + 'goals/goal' + str(index) + '.PNG').convert_alpha()
+        self.image = glob.assets.get_image('goals/goal' + str(index) + '.PNG')
         self.rect = self.image.get_rect()
         self.rect.topleft = (TILESIZE, TILESIZE)
         self.width = self.rect.width
@@ -528,16 +553,30 @@ class Goal:
         :return: the percentage of the goal
         """
 
-        nbr_quests = len(self.corresponding_quests)
-        if nbr_quests == 0:
-            return -1
-        else:
-            if self.corresponding_quests[0].state < 2:
-                return -1  # don't display the percentage if the player has not yet accepted the first corresponding quest
+        return get_goal_percentage([q.state for q in self.corresponding_quests])
+
+
+def get_goal_percentage(quest_states):
+    """ Returns the completion percentage of a goal from the states of its quests.
+
+    Returns -1 if there is no quest linked to this goal or
+    if the first quest is not yet accepted.
+    Used by 'Goal.get_percentage' and by 'analytics.py', which has no Game object.
+
+    :param quest_states: the states of the corresponding quests of the goal, in order
+    :return: the percentage of the goal
+    """
+
+    nbr_quests = len(quest_states)
+    if nbr_quests == 0:
+        return -1
+    else:
+        if quest_states[0] < 2:
+            return -1  # don't display the percentage if the player has not yet accepted the first corresponding quest
 
-            nbr_completed_quests = 0
-            for q in self.corresponding_quests:
-                if q.state == 3:
-                    nbr_completed_quests += 1
+        nbr_completed_quests = 0
+        for state in quest_states:
+            if state == 3:
+                nbr_completed_quests += 1
 
-            return int((nbr_completed_quests / nbr_quests) * 100)
+        return int((nbr_completed_quests / nbr_quests) * 100)
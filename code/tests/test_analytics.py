@@ -0,0 +1,107 @@
+import copy
+import csv
+import json
+import pickle
+import tempfile
+import unittest
+from datetime import datetime
+from os import chdir, getcwd, makedirs, path
+
+import pygame as pg
+
+import data
+from analytics import get_quest_states, summarize_game, summarize_student, report_progress, QUESTS, GOALS
+from persistence import Persistence
+from story import get_goal_percentage
+from settings import SAVEPATH, SAVEDBPATH, GAME_STARTUP_PARAMS
+
+
+pg.init()  # the report must not deadlock when the calling process has initialized pygame, see 'report_progress'
+
+
+class TestAnalytics(unittest.TestCase):
+
+    def setUp(self):
+        self.addCleanup(chdir, getcwd())
+        self.root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.root.cleanup)
+        chdir(self.root.name)  # no pickle file of the former saves to import in the databases
+
+    @staticmethod
+    def get_params(quest_name, state=2, removed_objects=(), axe=False):
+        game_params = copy.deepcopy(GAME_STARTUP_PARAMS)
+        game_params["current_quest"].update(name=quest_name, state=state)
+        game_params["removed_objects"] = list(removed_objects)
+        game_params["unlocked_tools"]["axe"] = axe
+        return game_params
+
+    def add_student(self, class_name, name, saves, pickled=False):
+        folder = path.join(self.root.name, class_name, name)
+        makedirs(folder)
+        if pickled:
+            with open(path.join(folder, SAVEPATH), 'wb') as savefile:
+                pickle.dump([{"timestamp": datetime(2020, 3, 1), "game_params": game_params} for game_params in saves], savefile)
+        else:
+            persistence = Persistence(path.join(folder, SAVEDBPATH))
+            with persistence.connection:
+                for game_params in saves:
+                    persistence.write_save(persistence.connection, None, datetime(2020, 3, 1), game_params)
+            persistence.close()
+        return folder
+
+    def test_goal_percentage(self):
+        self.assertEqual(get_goal_percentage([]), -1)
+        self.assertEqual(get_goal_percentage([1, 0, 0]), -1)  # the first quest is not accepted yet
+        self.assertEqual(get_goal_percentage([3, 2, 0]), 33)
+        self.assertEqual(get_goal_percentage([3, 3]), 100)
+
+    def test_summarize_game(self):
+        self.assertEqual(get_quest_states({"name": QUESTS[2], "state": 0}), [3, 3, 1] + [0] * (len(QUESTS) - 3))
+        with self.assertRaises(ValueError):
+            get_quest_states({"name": "unknown", "state": 2})
+
+        progress = summarize_game(self.get_params(QUESTS[-1], 3, ["m1dirt1", "m1dirt2", "m1dirt1"], axe=True))
+        self.assertEqual((progress["quests_completed"], progress["goals_completed"]), (len(QUESTS), len(GOALS)))
+        self.assertEqual((progress["objects_cleared"], progress["tools"]), (2, ["axe"]))
+
+        progress = summarize_game(self.get_params("chap1q1"))  # goal 3 has 3 quests, the first one is accepted
+        self.assertEqual(progress["goals"][GOALS.index(data.quests[1]["goal_nbr"])], 0)
+        self.assertEqual(progress["goals"].count(-1), len(GOALS) - 1)
+
+    def test_summarize_student(self):
+        folder = self.add_student("6A", "alice", [self.get_params("chap2q0"), self.get_params("chap1q2", 3), self.get_params("unknown")])
+        student = summarize_student(folder, self.root.name)
+        self.assertEqual((student["class"], student["student"], student["saves"], student["errors"]), ("6A", "alice", 2, 1))
+        self.assertEqual(student["quest"], "chap2q0")  # the most advanced save, not the last one
+
+        folder = self.add_student("6A", "bob", [self.get_params("chap1q1")], pickled=True)
+        self.assertEqual(summarize_student(folder, self.root.name)["quest"], "chap1q1")
+
+    def test_report_progress(self):
+        self.add_student("6A", "alice", [self.get_params("chap2q0", axe=True)])
+        self.add_student("6A", "bob", [self.get_params("chap1q1")], pickled=True)
+        self.add_student("6B", "carol", [self.get_params("chap1q0")])
+        makedirs(path.join(self.root.name, "6B", "dave"))
+        with open(path.join(self.root.name, "6B", "dave", SAVEDBPATH), 'wb') as corrupted:
+            corrupted.write(b"not a database" * 100)
+
+        output = path.join(self.root.name, "progress.csv")
+        class_rows = report_progress(self.root.name, output, workers=2)
+        with open(output, newline='') as report:
+            students = list(csv.DictReader(report))
+        self.assertEqual([row["student"] for row in students], ["alice", "bob", "carol", "dave"])
+        self.assertEqual((students[0]["tools"], students[3]["errors"], students[3]["quest"]), ("axe", "1", ""))
+        with open(path.join(self.root.name, "progress_classes.csv"), newline='') as report:
+            self.assertEqual([row["students"] for row in csv.DictReader(report)], ["2", "1"])
+        self.assertEqual((class_rows[0]["first_quest"], class_rows[0]["last_quest"], class_rows[0]["axe"]), ("chap1q1", "chap2q0", 1))
+
+        output = path.join(self.root.name, "progress.json")
+        report_progress(self.root.name, output, workers=2)
+        with open(output) as report:
+            progress = json.load(report)
+        self.assertEqual(len(progress["students"]), 4)
+        self.assertEqual(progress["classes"], class_rows)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import pygame as pg
+import unittest
+import tempfile
+from os import chdir, getcwd, path, utime
+
+from assets import AssetManager, pack_atlases, ATLASINDEX
+
+
+pg.init()
+pg.display.set_mode((100, 100))
+
+
+class TestAssetManager(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = getcwd()
+        chdir('..')  # images are loaded from the game folder
+
+    def tearDown(self):
+        chdir(self.cwd)
+
+    def test_images_are_shared(self):
+        assets = AssetManager()
+        image = assets.get_image('npc/npc1_s.png')
+        self.assertIs(assets.get_image('npc/npc1_s.png'), image)
+        self.assertEqual((assets.hits, assets.misses), (1, 1))
+
+    def test_display_format(self):
+        assets = AssetManager()
+        background = assets.get_image('bkg-swirls.jpg')
+        self.assertEqual(background.get_bitsize(), pg.display.get_surface().get_bitsize())
+        self.assertTrue(assets.get_image('select_left.png').get_flags() & pg.SRCALPHA)
+
+    def test_reconvert(self):
+        assets = AssetManager()
+        image = assets.get_image('objects/tree1.png')
+        assets.reconvert()
+        self.assertIsNot(assets.get_image('objects/tree1.png'), image)
+        self.assertEqual(pg.image.tostring(assets.get_image('objects/tree1.png'), "RGBA"), pg.image.tostring(image, "RGBA"))
+
+    def test_resident_bytes(self):
+        assets = AssetManager()
+        assets.get_image('objects/tree1.png')
+        assets.get_image('parchment.png')
+        self.assertEqual(set(assets.get_resident_bytes()), {"objects", "ui"})
+        self.assertEqual(assets.get_resident_bytes()["ui"], 542 * 379 * 4)
+
+    def test_atlases(self):
+        with tempfile.TemporaryDirectory() as atlas_dir:
+            pack_atlases(atlas_dir=atlas_dir)
+            packed = AssetManager(atlas_dir)
+            files = AssetManager(path.join(atlas_dir, "missing"))
+            self.assertIn('npc/npc1_s.png', packed.atlas_rects)
+            self.assertNotIn('bkg-swirls.jpg', packed.atlas_rects)
+
+            for name in packed.atlas_rects:
+                self.assertIsNotNone(packed.get_image(name).get_parent())
+                self.assertEqual(pg.image.tostring(packed.get_image(name), "RGBA"), pg.image.tostring(files.get_image(name), "RGBA"), name)
+
+            utime(path.join(atlas_dir, ATLASINDEX), (0, 0))  # the images are more recent than the sheets
+            self.assertEqual(AssetManager(atlas_dir).atlas_rects, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
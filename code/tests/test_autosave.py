@@ -0,0 +1,96 @@
+import tempfile
+import time
+import unittest
+from os import chdir, getcwd, path
+
+import pygame as pg
+
+import globvars as glob
+from capylib import exit_gracefully
+from headless import HeadlessGame, close_headless, init_headless
+
+
+class TestAutoSaver(unittest.TestCase):
+
+    def setUp(self):
+        self.addCleanup(chdir, getcwd())
+        chdir('..')  # maps and images are loaded from the game folder
+        save_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(save_dir.cleanup)
+        self.save_dir = save_dir.name
+        init_headless(db_path=path.join(save_dir.name, "test.db"))
+        self.addCleanup(close_headless)
+        self.persistence = glob.persistence
+
+        self.headless = HeadlessGame(autosave=True)
+        self.addCleanup(self.headless.close)
+        self.autosaver = self.headless.game.autosaver
+
+    def get_autosaves(self):
+        self.persistence.flush()
+        return [save for save in self.persistence.list_saved_games(0, 10) if save["autosave"]]
+
+    def test_requests_are_coalesced(self):
+        for idx in range(3):
+            self.headless.game.request_autosave()
+        self.headless.step()
+        self.headless.step()
+        self.assertEqual(len(self.get_autosaves()), 1)
+        self.assertFalse(self.autosaver.pending)
+
+    def test_one_save_per_interval(self):
+        self.autosaver.interval = 200
+        self.headless.game.request_autosave()
+        self.headless.step()
+        first_job = self.autosaver.job
+
+        self.headless.game.request_autosave()
+        self.headless.step()
+        self.assertIs(self.autosaver.job, first_job)
+        self.assertTrue(self.autosaver.pending)
+
+        time.sleep(0.25)
+        self.headless.step()
+        self.assertIsNot(self.autosaver.job, first_job)
+        autosaves = self.get_autosaves()
+        self.assertEqual([save["id"] for save in autosaves], [first_job.save_id])  # the autosave slot is overwritten
+
+    def test_quest_progress_requests_an_autosave(self):
+        quest = self.headless.game.script.current_quest
+        quest.state = 1
+        quest.accept()
+        self.assertTrue(self.autosaver.pending)
+
+    def test_pending_changes_are_saved_when_leaving(self):
+        self.autosaver.interval = 60000
+        self.headless.game.request_autosave()
+        self.headless.step()
+        self.headless.game.request_autosave()
+        self.headless.close()
+        self.assertFalse(self.autosaver.pending)
+        self.assertEqual(len(self.get_autosaves()), 1)
+
+    def test_pending_changes_are_saved_when_quitting(self):
+        self.autosaver.interval = 60000
+        self.headless.game.request_autosave()
+        self.headless.step()
+        self.headless.game.player.x += 1
+        self.headless.game.request_autosave()
+        game_dir = getcwd()
+        chdir(self.save_dir)  # the user config is written in the current folder
+        with self.assertRaises(SystemExit):
+            exit_gracefully(self.headless.game)
+        chdir(game_dir)
+        self.assertFalse(self.autosaver.pending)
+        self.assertFalse(pg.get_init())
+
+        glob.persistence = None  # closed by 'exit_gracefully'
+        init_headless(db_path=self.persistence.db_path)
+        self.persistence = glob.persistence
+        autosaves = self.get_autosaves()
+        self.assertEqual(len(autosaves), 1)
+        self.assertEqual(self.persistence.load_game(autosaves[0]["id"])["player"]["x"], self.headless.game.player.x)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,32 @@
+import unittest
+
+from benchmark import compare_results, get_frame_times, time_function, WALKSTEPS
+
+
+class TestBenchmark(unittest.TestCase):
+
+    def test_time_function(self):
+        calls = []
+        times = time_function(lambda: calls.append(1), 3)
+        self.assertEqual(times["runs"], len(calls) - 1)  # the first call measures how many calls a sample needs
+        self.assertGreater(times["runs"], 3)
+        self.assertLessEqual(times["best_ms"], times["median_ms"])
+
+        setups = []
+        times = time_function(lambda: calls.append(1), 3, setup=lambda: setups.append(1))
+        self.assertEqual((times["runs"], len(setups)), (3, 3))  # one call per setup
+
+    def test_compare_results(self):
+        baseline = {"fast": {"best_ms": 0.01}, "slow": {"best_ms": 10}, "same": {"best_ms": 5}, "removed": {"best_ms": 1}}
+        results = {"fast": {"best_ms": 0.03}, "slow": {"best_ms": 13}, "same": {"best_ms": 5.5}, "added": {"best_ms": 1}}
+        comparison = {name: is_regression for name, baseline_ms, current_ms, ratio, is_regression in compare_results(baseline, results)}
+        self.assertEqual(comparison, {"fast": False, "slow": True, "same": False})  # 'fast' is slower but by less than the noise
+        self.assertFalse(dict((c[0], c[4]) for c in compare_results(baseline, results, threshold=0.5))["slow"])
+
+    def test_frame_times(self):
+        results = {"walk/autosave": {"best_ms": 2.0 * WALKSTEPS}, "draw_game/dialogue": {"best_ms": 1}}
+        self.assertEqual(get_frame_times(results), {"walk/autosave": 2.0})
+
+
+if __name__ == '__main__':
+    unittest.main()
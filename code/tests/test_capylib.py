@@ -0,0 +1,100 @@
+import pygame as pg
+import unittest
+import shutil
+import tempfile
+from os import path
+from unittest import mock
+
+import capylib
+import globvars as glob
+from capylib import FontCache, get_font, get_nbr_lines, draw_multilines_text, get_text_layout
+from data import quests, interaction_texts, goals
+from settings import TILESIZE, WHITE
+
+
+pg.init()
+
+
+class TestFontCache(unittest.TestCase):
+
+    def test_hits_and_misses(self):
+        fonts = FontCache()
+        font = fonts.get(25)
+        fonts.get(30)
+        fonts.get(25, bold=True)
+        self.assertIs(fonts.get(25), font)
+        self.assertEqual((fonts.hits, fonts.misses), (1, 3))
+
+    def test_font_file_resolved_once(self):
+        fonts = FontCache()
+        with mock.patch("pygame.font.match_font", return_value=None) as match_font:
+            fonts.get(25)
+            fonts.get(30)
+        self.assertEqual(match_font.call_count, 1)
+
+    def test_bundled_font(self):
+        with tempfile.TemporaryDirectory() as font_dir:
+            default_font = path.join(path.dirname(pg.__file__), pg.font.get_default_font())
+            shutil.copy(default_font, path.join(font_dir, "capyfont.ttf"))
+            fonts = FontCache()
+            with mock.patch.object(capylib, "FONTDIR", font_dir + "/"), mock.patch("pygame.font.match_font") as match_font:
+                self.assertEqual(fonts.get_font_file("capyfont"), path.join(font_dir, "capyfont.ttf"))
+                self.assertEqual(fonts.get_font_file("capyfont", bold=True), path.join(font_dir, "capyfont.ttf"))
+                self.assertIsNotNone(fonts.get(25, "capyfont"))
+            match_font.assert_not_called()
+
+
+def draw_words(text_surface, text, size, coordinate, color, surface):
+    """ Draws the text word by word and counts its lines like 'draw_multilines_text' and 'get_nbr_lines' did. """
+
+    font = get_font(size)
+    lines = [line.split(' ') for line in text.splitlines()]
+    space = font.size(' ')[0]
+    max_width = text_surface.get_width()
+    word_width, word_height = (0, 0 if surface is None else TILESIZE)
+    x, y = coordinate
+    nbr_lines = 0
+    for line in lines:
+        nbr_lines += 1
+        for word in line:
+            word_surface = font.render(word, True, color)
+            word_width, word_height = (word_surface.get_width(), word_surface.get_height() if surface is None else TILESIZE)
+            if x + word_width >= max_width:
+                nbr_lines += 1
+                x = coordinate[0]
+                y += word_height
+            text_surface.blit(word_surface, (x, y))
+            x += word_width + space
+        x = coordinate[0]
+        y += word_height
+    return nbr_lines
+
+
+class TestTextLayout(unittest.TestCase):
+
+    def setUp(self):
+        glob.screen = pg.display.set_mode((100, 100))
+        self.texts = [text for q in quests for text in q["dialogue"]] + list(interaction_texts.values())
+        self.texts += [g["expl"] for g in goals] + ['-' + fact for g in goals for fact in g["facts"]]
+
+    def test_same_as_word_by_word(self):
+        for text in self.texts:
+            for width, size, coordinate, surface in [(768, 25, (5, 0), pg.Surface((1, 1))), (500, 20, (5, 5), None)]:
+                expected = pg.Surface((width, 600))
+                nbr_lines = draw_words(expected, text, size, coordinate, WHITE, surface)
+
+                text_surface = pg.Surface((width, 600))
+                draw_multilines_text(text_surface, text_surface.get_rect(), text, size, coordinate, WHITE, pg.Surface((width, 600)) if surface else None)
+                self.assertEqual(get_nbr_lines(width, text, size, coordinate, surface), nbr_lines, text)
+                self.assertEqual(pg.image.tostring(text_surface, "RGB"), pg.image.tostring(expected, "RGB"), text)
+
+    def test_layout_is_cached(self):
+        text = interaction_texts["m0npc1"]
+        layout = get_text_layout(text, 768, 25, (5, 0), TILESIZE)
+        hits = get_text_layout.cache_info().hits
+        self.assertIs(get_text_layout(text, 768, 25, (5, 0), TILESIZE), layout)
+        self.assertEqual(get_text_layout.cache_info().hits, hits + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
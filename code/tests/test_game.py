@@ -0,0 +1,90 @@
+import copy
+import os
+import unittest
+from os import chdir, getcwd
+
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")  # Game loads the music
+import pygame as pg
+
+import globvars as glob
+from assets import AssetManager
+from game import Game
+from settings import GAME_STARTUP_PARAMS, TILESIZE, STEPTIME, UPDATESTEP, WIDTH, HEIGHT
+
+
+pg.init()
+
+
+class TestPlayerWalk(unittest.TestCase):
+
+    def setUp(self):
+        self.addCleanup(chdir, getcwd())
+        chdir('..')  # maps and images are loaded from the game folder
+        glob.screen = pg.display.set_mode((WIDTH, HEIGHT))
+        glob.assets = AssetManager()
+        self.game = Game(copy.deepcopy(GAME_STARTUP_PARAMS), autosave=False)
+        self.player = self.game.player
+        self.reset()
+
+    def tearDown(self):
+        self.game.prefetcher.shutdown()
+
+    def reset(self):
+        """ Places the player on a walkable row of map1. """
+
+        self.game.load_map("map1")
+        self.player.x = self.player.from_x = 3
+        self.player.y = self.player.from_y = 10
+        self.player.steps = 0
+        self.player.walking = None
+        self.player.step_time = STEPTIME
+        self.game.update()
+
+    def test_step_is_tweened(self):
+        self.player.walk(1, 0)
+        self.player.stop_walking(1, 0)
+        self.assertEqual(self.player.x, 4)  # collisions and interactions use the destination tile at once
+
+        positions = []
+        for _ in range(STEPTIME // UPDATESTEP):
+            self.game.update(UPDATESTEP)
+            positions.append(self.player.rect.x)
+        self.assertEqual(positions, sorted(set(positions)))
+        self.assertEqual(positions[-1], 4 * TILESIZE)
+        self.assertFalse(self.game.is_animating())
+        self.assertEqual(self.player.steps % 2, 0)  # back to the neutral position
+
+    def test_walk_until_key_released(self):
+        self.player.walk(1, 0)
+        for _ in range(3 * STEPTIME // UPDATESTEP):
+            self.game.update(UPDATESTEP)
+        self.assertEqual(self.player.x, 7)  # a new step starts when the previous one is over
+        self.player.stop_walking(0, 1)  # another key is released
+        self.assertTrue(self.game.is_animating())
+        self.player.stop_walking(1, 0)
+        for _ in range(STEPTIME // UPDATESTEP):
+            self.game.update(UPDATESTEP)
+        self.assertEqual((self.player.x, self.player.rect.x), (7, 7 * TILESIZE))
+        self.assertFalse(self.game.is_animating())
+
+    def test_same_speed_whatever_the_timestep(self):
+        self.player.walk(1, 0)
+        for _ in range(25):
+            self.game.update(12)  # 300 ms of game time
+        rect_x = self.player.rect.x
+
+        self.reset()
+        self.player.walk(1, 0)
+        for _ in range(4):
+            self.game.update(75)
+        self.assertEqual(self.player.rect.x, rect_x)
+
+    def test_interpolate(self):
+        self.player.walk(1, 0)
+        self.game.update(STEPTIME // 2)
+        self.game.display(0.5)
+        self.assertEqual(self.player.rect.x, round(3.25 * TILESIZE))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+import tempfile
+import unittest
+from os import chdir, getcwd, path
+from unittest import mock
+
+import pygame as pg
+
+import game_display
+import globvars as glob
+from headless import HeadlessGame, close_headless, init_headless
+from settings import TILESIZE
+
+
+class TestDirtyRects(unittest.TestCase):
+
+    def setUp(self):
+        self.addCleanup(chdir, getcwd())
+        chdir('..')  # maps and images are loaded from the game folder
+        save_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(save_dir.cleanup)
+        init_headless(db_path=path.join(save_dir.name, "test.db"))
+        self.addCleanup(close_headless)
+        self.headless = HeadlessGame()
+        self.addCleanup(self.headless.close)
+        self.game = self.headless.game
+        self.game_display = self.game.game_display
+
+        self.game.load_map("map1")
+        self.game.player.x, self.game.player.y = 13.0, 11.0
+        self.headless.step()
+        self.game.update(0)  # the camera follows the player
+        self.displayed = glob.screen.copy()  # what the display shows, updated like 'update_display' does
+        self.draw_frame()
+
+    def draw_frame(self, overlay=False):
+        self.game_display.draw_game()
+        dirty_rects = list(self.game_display.dirty_rects)
+        if self.game_display.full_update or overlay:
+            self.displayed.blit(glob.screen, (0, 0))
+        else:
+            for rect in dirty_rects:
+                self.displayed.blit(glob.screen, rect, rect)
+        self.game_display.update_display(overlay)
+        return dirty_rects
+
+    def assert_covered(self, rect, dirty_rects):
+        self.assertTrue(any(dirty_rect.contains(rect) for dirty_rect in dirty_rects), "{} is not updated".format(rect))
+
+    def assert_displayed(self):
+        self.assertEqual(pg.image.tostring(self.displayed, "RGB"), pg.image.tostring(glob.screen, "RGB"))
+
+    def get_visible_objects(self):
+        screen_rect = glob.screen.get_rect()
+        return [obj for obj in self.game.objects if screen_rect.contains(self.game.camera.apply(obj))]
+
+    def test_nothing_changed(self):
+        self.assertEqual(self.draw_frame(), [])
+        self.assertFalse(self.game_display.full_update)
+
+    def test_moved_and_removed_sprites(self):
+        moved, removed = self.get_visible_objects()[:2]
+        old_rect = self.game_display.drawn_items[moved][0]
+        moved.rect.x += TILESIZE
+        dirty_rects = self.draw_frame()
+        self.assertFalse(self.game_display.full_update)
+        self.assert_covered(old_rect, dirty_rects)
+        self.assert_covered(self.game_display.drawn_items[moved][0], dirty_rects)
+        self.assert_displayed()
+
+        removed_rect = self.game_display.drawn_items[removed][0]
+        self.game.removed_objects.append(removed.name)
+        dirty_rects = self.draw_frame()
+        self.assert_covered(removed_rect, dirty_rects)
+        self.assertNotIn(removed, self.game_display.drawn_items)
+        self.assert_displayed()
+
+    def test_tool_and_overlay(self):
+        self.game.inventory.axe.acquired = True
+        self.game.inventory.axe.in_hand = True
+        self.draw_frame()
+        self.assert_displayed()
+        self.game.inventory.axe.in_hand = False
+        self.draw_frame()
+        self.assert_displayed()
+
+        glob.screen.blit(self.game_display.pause_screen, (0, 0))  # a screen drawn over the game, e.g. the pause menu
+        self.game_display.update_display(overlay=True)
+        self.displayed.blit(glob.screen, (0, 0))
+        self.assertTrue(self.game_display.full_update)
+        self.draw_frame()  # the whole screen is sent to erase the overlay
+        self.assert_displayed()
+
+    def test_camera_moves(self):
+        self.game.player.x += 3
+        self.game.update(0)
+        self.draw_frame()
+        self.assert_displayed()
+
+
+class TestDialoguePage(unittest.TestCase):
+
+    def setUp(self):
+        self.addCleanup(chdir, getcwd())
+        chdir('..')  # maps and images are loaded from the game folder
+        save_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(save_dir.cleanup)
+        init_headless(db_path=path.join(save_dir.name, "test.db"))
+        self.addCleanup(close_headless)
+        self.headless = HeadlessGame()
+        self.addCleanup(self.headless.close)
+        self.game = self.headless.game
+        self.game_display = self.game.game_display
+
+        npc = next(iter(self.game.characters))
+        player = self.game.player
+        player.x, player.y, player.look_at = npc.x - 1, npc.y, (1, 0)
+        player.interacting = True
+        draw_multilines_text = mock.patch.object(game_display, "draw_multilines_text", wraps=game_display.draw_multilines_text)
+        self.draw_page = draw_multilines_text.start()
+        self.addCleanup(draw_multilines_text.stop)
+
+    def test_page_drawn_once(self):
+        self.game_display.draw_game()
+        page = self.game_display.dialogue_page
+        self.assertIsNotNone(page)
+        self.assertEqual(self.draw_page.call_count, 1)
+
+        self.game.line_number = 1  # scrolling only shows another part of the page
+        self.game_display.draw_game()
+        self.game_display.draw_game()
+        self.assertIs(self.game_display.dialogue_page, page)
+        self.assertEqual(self.draw_page.call_count, 1)
+
+        self.game.script.current_quest.state += 1  # the dialogue of an NPC depends on the quest state
+        self.game_display.draw_game()
+        self.assertIsNot(self.game_display.dialogue_page, page)
+        self.assertEqual(self.draw_page.call_count, 2)
+        self.assertEqual(self.game_display.dialogue_key[1:], (self.game.script.current_quest.name, self.game.script.current_quest.state))
+
+    def test_page_dropped_after_interaction(self):
+        self.game_display.draw_game()
+        self.game.player.interacting = False
+        self.game_display.draw_game()
+        self.assertIsNone(self.game_display.dialogue_page)
+
+        self.game.player.interacting = True
+        self.game_display.draw_game()
+        self.assertEqual(self.draw_page.call_count, 2)  # a new interaction draws its page again
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import pygame as pg
+import tempfile
+import unittest
+from os import chdir, getcwd, path
+
+import globvars as glob
+from capylib import font_cache, get_font, get_text_layout
+from headless import HeadlessGame, close_headless, init_headless
+from settings import GAME_STARTUP_PARAMS, STEPTIME
+
+
+class TestHeadlessGame(unittest.TestCase):
+
+    def setUp(self):
+        self.addCleanup(chdir, getcwd())
+        chdir('..')  # maps and images are loaded from the game folder
+        save_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(save_dir.cleanup)
+        init_headless(db_path=path.join(save_dir.name, "test.db"))
+        self.addCleanup(close_headless)
+        self.headless = HeadlessGame()
+        self.addCleanup(self.headless.close)
+
+    def test_dummy_drivers(self):
+        self.assertEqual(pg.display.get_driver(), "dummy")
+        self.assertEqual(self.headless.game.map.name, GAME_STARTUP_PARAMS["map"]["name"])
+
+    def test_walk(self):
+        player = self.headless.game.player
+        x = player.x
+        self.headless.press(pg.K_RIGHT)
+        self.headless.run(3 * STEPTIME)
+        self.headless.release(pg.K_RIGHT)
+        self.headless.run(STEPTIME)
+        self.assertEqual(player.x, x + 3)
+        self.assertEqual(player.look_at, (1, 0))
+        self.assertFalse(self.headless.game.is_animating())
+        self.assertEqual(self.headless.game.time, 4 * STEPTIME)
+
+    def test_pause_screen(self):
+        self.headless.step()
+        before = pg.image.tostring(self.headless.screenshot(), "RGB")
+        self.headless.tap(pg.K_ESCAPE)
+        self.headless.step()
+        self.assertTrue(self.headless.game.paused)
+        self.assertNotEqual(pg.image.tostring(self.headless.screenshot(), "RGB"), before)
+        self.assertEqual(self.headless.frames, 2)
+
+    def test_init_after_quit(self):
+        font = get_font(25)
+        get_text_layout("Bonjour", 100)
+        pg.quit()
+        init_headless()  # e.g. a second headless session in the same process
+        self.assertEqual((font_cache.fonts, get_text_layout.cache_info().currsize), ({}, 0))
+        self.assertIsNot(get_font(25), font)
+        self.assertIsNotNone(get_font(25).render("Bonjour", True, (255, 255, 255)))
+
+    def test_back_to_main_menu(self):
+        self.headless.tap(pg.K_ESCAPE)
+        glob.user_selection = 4  # "Retour vers menu"
+        self.headless.tap(pg.K_RETURN)
+        self.assertEqual(self.headless.run(1000), 1)
+        self.assertEqual(glob.active_screen, "mainmenu")
+
+
+if __name__ == '__main__':
+    unittest.main()
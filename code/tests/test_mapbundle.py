@@ -0,0 +1,64 @@
+import pygame as pg
+import unittest
+import tempfile
+import time
+import pytmx
+from os import path, utime
+
+from mapbundle import compile_map, get_object_kind, MapBundle
+
+
+pg.init()
+pg.display.set_mode((100, 100))
+
+maps_name = ["houseB1", "map0", "map1", "map1_2", "map2", "map2_2", "map2_3", "map3", "map4", "map4_2", "mapA", "mapB", "mapC", "mapC_2", "mapC_3", "mapD", "mapD_2", "mapD_3"]
+
+
+class TestMapBundle(unittest.TestCase):
+
+    def test_bundle_matches_tmx(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for map_name in maps_name:
+                map_data = pytmx.load_pygame('../maps/' + map_name + '.tmx', pixelalpha=True)
+                bundle = MapBundle(compile_map('../maps/' + map_name + '.tmx', path.join(tmp_dir, map_name + '.cmap')))
+
+                self.assertEqual((bundle.width, bundle.height), (map_data.width, map_data.height))
+
+                tmx_layers = [layer for layer in map_data.visible_layers if isinstance(layer, pytmx.TiledTileLayer)]
+                bundle_layers = list(bundle.visible_layers)
+                self.assertEqual(len(bundle_layers), len(tmx_layers))
+                for tmx_layer, bundle_layer in zip(tmx_layers, bundle_layers):
+                    self.assertEqual([list(row) for row in bundle_layer.data], [list(row) for row in tmx_layer.data])
+                    for x, y, gid in tmx_layer:
+                        tmx_tile = map_data.get_tile_image_by_gid(gid)
+                        bundle_tile = bundle.get_tile_image_by_gid(gid)
+                        if tmx_tile:
+                            self.assertEqual(pg.image.tostring(bundle_tile, "RGBA"), pg.image.tostring(tmx_tile, "RGBA"))
+                        else:
+                            self.assertFalse(bundle_tile)
+
+                tmx_objects = list(map_data.objects)
+                self.assertEqual(len(bundle.objects), len(tmx_objects))
+                for tmx_obj, bundle_obj in zip(tmx_objects, bundle.objects):
+                    for attribute in ["name", "type", "x", "y", "width", "height", "dx", "dy", "look_to"]:
+                        self.assertEqual(getattr(bundle_obj, attribute, None), getattr(tmx_obj, attribute, None))
+                    self.assertEqual(bundle_obj.kind, get_object_kind(tmx_obj.type or ""))
+
+                bundle.close()
+
+    def test_stale_tileset(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            bundle = MapBundle(compile_map('../maps/map0.tmx', path.join(tmp_dir, 'map0.cmap')))
+            self.addCleanup(bundle.close)
+            self.assertEqual(sorted(path.basename(dependency) for dependency in bundle.dependencies if dependency.endswith(".tsx")),
+                             ["spring_tileset.tsx", "town_tileset.tsx"])
+            self.assertTrue(all(path.exists(dependency) for dependency in bundle.dependencies))
+            self.assertTrue(bundle.is_up_to_date())
+
+            tileset_time = max(path.getmtime(dependency) for dependency in bundle.dependencies)
+            utime(bundle.path, (time.time(), tileset_time - 1))  # a tileset was edited after the compilation
+            self.assertFalse(bundle.is_up_to_date())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,172 @@
+import copy
+import pickle
+import sqlite3
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from os import chdir, getcwd, path
+
+import pygame as pg
+
+import globvars as glob
+from headless import HeadlessGame, close_headless, init_headless
+from persistence import Persistence, SAVEDONE
+from savecodec import get_format_version, SAVEFORMATVERSION
+from settings import CONFIGPATH, SAVEPATH, SAVESLOTS, THUMBNAILSIZE, GAME_STARTUP_PARAMS
+
+
+class TestPersistence(unittest.TestCase):
+
+    def setUp(self):
+        self.addCleanup(chdir, getcwd())
+        self.save_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.save_dir.cleanup)
+        chdir(self.save_dir.name)  # the pickle file of the former saves is searched in the current folder
+        self.db_path = path.join(self.save_dir.name, "test.db")
+
+    def open(self):
+        persistence = Persistence(self.db_path)
+        self.addCleanup(persistence.close)
+        return persistence
+
+    @staticmethod
+    def get_params(map_name, x=1.0):
+        game_params = copy.deepcopy(GAME_STARTUP_PARAMS)
+        game_params["map"]["name"] = map_name
+        game_params["player"]["x"] = x
+        return game_params
+
+    def add_saves(self, persistence, count):
+        start = datetime(2020, 1, 1)
+        with persistence.connection:
+            return [persistence.write_save(persistence.connection, None, start + timedelta(minutes=idx), self.get_params("map1", idx)) for idx in range(count)]
+
+    def test_import_pickle_saves(self):
+        saved_games = [{"timestamp": datetime(2020, 3, 11), "game_params": self.get_params("map1")},
+                       {"timestamp": datetime(2020, 3, 27), "game_params": self.get_params("mapC")},
+                       {"timestamp": datetime.min}]
+        with open(SAVEPATH, 'wb') as savefile:
+            pickle.dump(saved_games, savefile)
+
+        persistence = self.open()
+        self.assertEqual(persistence.count_saved_games(), 2)
+        self.assertEqual([save["map"] for save in persistence.list_saved_games()], ["mapC", "map1"])
+        persistence.close()
+
+        self.assertEqual(self.open().count_saved_games(), 2)  # imported only when the database is created
+
+    def test_save_and_load(self):
+        persistence = self.open()
+        first, second = self.add_saves(persistence, 2)
+        self.assertEqual([save["id"] for save in persistence.list_saved_games()], [second, first])
+        self.assertEqual(set(persistence.list_saved_games()[0]), {"id", "timestamp", "map", "quest", "avatar", "autosave"})
+
+        with persistence.connection:
+            self.assertEqual(persistence.write_save(persistence.connection, first, datetime(2021, 1, 1), self.get_params("mapD", 5.0)), first)
+        self.assertEqual(persistence.count_saved_games(), 2)
+        self.assertEqual(persistence.list_saved_games(0, 1)[0]["map"], "mapD")
+        self.assertEqual(persistence.load_game(first)["player"]["x"], 5.0)
+        with self.assertRaises(KeyError):
+            persistence.load_game(first + second)
+
+    def test_pickled_state_is_upgraded_on_load(self):
+        persistence = self.open()
+        save_id, = self.add_saves(persistence, 1)
+        with persistence.connection:
+            persistence.connection.execute("UPDATE states SET game_params = ? WHERE save_id = ?", (pickle.dumps(self.get_params("mapC")), save_id))
+
+        self.assertEqual(persistence.load_game(save_id)["map"]["name"], "mapC")
+        data = persistence.connection.execute("SELECT game_params FROM states WHERE save_id = ?", (save_id,)).fetchone()[0]
+        self.assertEqual(get_format_version(data), SAVEFORMATVERSION)
+        self.assertEqual(persistence.load_game(save_id)["map"]["name"], "mapC")
+
+    def test_upgrade_database(self):
+        connection = sqlite3.connect(self.db_path)
+        connection.executescript("""
+            CREATE TABLE saves (id INTEGER PRIMARY KEY, timestamp TEXT NOT NULL, map TEXT NOT NULL, quest TEXT NOT NULL, avatar TEXT NOT NULL);
+            CREATE TABLE states (save_id INTEGER PRIMARY KEY, game_params BLOB NOT NULL);
+            INSERT INTO saves VALUES (1, '2020-03-27T16:14:28', 'mapC', 'chap1q0', 'player0');
+            PRAGMA user_version = 1;
+        """)
+        connection.close()
+
+        persistence = self.open()
+        self.assertFalse(persistence.list_saved_games()[0]["autosave"])
+        with persistence.connection:
+            save_id = persistence.write_save(persistence.connection, 1, datetime.now(), self.get_params("map1"), autosave=True)
+        self.assertNotEqual(save_id, 1)  # the autosave slot is never a save of the player
+        self.assertEqual([save["autosave"] for save in persistence.list_saved_games()], [True, False])
+
+    def test_pages(self):
+        persistence = self.open()
+        self.assertEqual((persistence.get_page_count(), persistence.get_page_count(free_row=True)), (1, 1))
+        self.add_saves(persistence, 2 * SAVESLOTS)
+        self.assertEqual((persistence.get_page_count(), persistence.get_page_count(free_row=True)), (2, 3))
+
+        persistence.get_saved_games()
+        self.assertEqual(len(glob.saved_games), SAVESLOTS)
+        self.assertTrue(persistence.turn_page(1))
+        self.assertFalse(persistence.turn_page(1))
+        self.assertEqual(persistence.page, 1)
+        self.assertTrue(persistence.turn_page(1, free_row=True))
+        self.assertEqual(glob.saved_games, [{"timestamp": datetime.min}] * SAVESLOTS)
+
+    def test_save_this_game(self):
+        persistence = self.open()
+        chdir(path.join(path.dirname(path.abspath(__file__)), '..'))  # maps and images are loaded from the game folder
+        init_headless(db_path=path.join(self.save_dir.name, "headless.db"))
+        self.addCleanup(close_headless)
+        headless = HeadlessGame()
+        self.addCleanup(headless.close)
+        pg.event.clear()
+
+        headless.game.player.x = 12.0
+        job = persistence.save_this_game(headless.game)
+        headless.game.player.x = 13.0  # the parameters were copied when the save was requested
+        self.assertTrue(job.done.wait(5))
+        self.assertIsNone(job.error)
+        self.assertEqual(persistence.load_game(job.save_id)["player"]["x"], 12.0)
+        self.assertEqual([event.save_id for event in pg.event.get(SAVEDONE)], [job.save_id])
+
+        self.assertEqual(persistence.collect(), [job])
+        self.assertEqual(glob.saved_games[0]["id"], job.save_id)
+
+        persistence.save_this_game(headless.game, job.save_id)
+        persistence.flush()
+        self.assertEqual(persistence.count_saved_games(), 1)
+        self.assertEqual(persistence.load_game(job.save_id)["player"]["x"], 13.0)
+
+    def test_thumbnails(self):
+        persistence = self.open()
+        chdir(path.join(path.dirname(path.abspath(__file__)), '..'))  # maps and images are loaded from the game folder
+        init_headless(db_path=path.join(self.save_dir.name, "headless.db"))
+        self.addCleanup(close_headless)
+        headless = HeadlessGame()
+        self.addCleanup(headless.close)
+        headless.step()
+
+        job = persistence.save_this_game(headless.game)
+        persistence.flush()
+        save_id = job.save_id  # set by the worker for a new save
+        self.assertEqual(persistence.thumbnails, {})  # the metadata doesn't read the thumbnails
+        thumbnail = persistence.get_thumbnail(save_id)
+        self.assertEqual(thumbnail.get_size(), THUMBNAILSIZE)
+        self.assertIs(persistence.get_thumbnail(save_id), thumbnail)
+
+        persistence.save_this_game(headless.game, save_id)
+        persistence.flush()
+        self.assertIsNot(persistence.get_thumbnail(save_id), thumbnail)
+
+        with persistence.connection:
+            other_id = persistence.write_save(persistence.connection, None, datetime.now(), self.get_params("map1"))
+        self.assertIsNone(persistence.get_thumbnail(other_id))
+
+    def test_save_user_config(self):
+        persistence = self.open()
+        persistence.save_user_config()
+        with open(CONFIGPATH, 'rb') as configfile:
+            self.assertEqual(pickle.load(configfile), glob.user_config)
+        self.assertFalse(path.exists(CONFIGPATH + ".tmp"))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import threading
+import unittest
+from os import chdir, getcwd
+from types import SimpleNamespace
+
+import pygame as pg
+
+from prefetch import MapPrefetcher
+from tilemap import MapCache
+
+
+pg.init()
+pg.display.set_mode((100, 100))
+
+
+class TestMapPrefetcher(unittest.TestCase):
+
+    def setUp(self):
+        self.addCleanup(chdir, getcwd())
+        chdir('..')  # maps are loaded from the game folder
+
+        # Only the attributes of Game used by the prefetcher:
+        self.game = SimpleNamespace(gates=[SimpleNamespace(name="map1"), SimpleNamespace(name="map2"), SimpleNamespace(name="map1")],
+                                    script=SimpleNamespace(maps_version={}), map=SimpleNamespace(name="map0", version=""),
+                                    map_cache=MapCache(64 * 1024 * 1024))
+
+    def get_prefetcher(self):
+        prefetcher = MapPrefetcher(self.game, workers=0)  # the tests run 'work' themselves
+        self.addCleanup(prefetcher.shutdown)
+        return prefetcher
+
+    @staticmethod
+    def run_jobs(prefetcher):
+        prefetcher.jobs.put(None)
+        prefetcher.work()
+
+    def test_prefetch_and_collect(self):
+        prefetcher = self.get_prefetcher()
+        prefetcher.prefetch()
+        self.assertEqual(list(prefetcher.pending), [("map1", ""), ("map2", "")])
+
+        self.run_jobs(prefetcher)
+        self.assertEqual(prefetcher.ready.qsize(), 2)
+        self.assertEqual(list(self.game.map_cache.maps), [])  # the cache is only changed by the main thread
+        prefetcher.collect()
+        self.assertEqual(set(self.game.map_cache.maps), {("map1", ""), ("map2", "")})
+        self.assertEqual(prefetcher.pending, {})
+
+        prefetcher.prefetch()
+        self.assertEqual(prefetcher.pending, {})  # the maps already in the cache are not loaded again
+
+    def test_cancel_before_start(self):
+        prefetcher = self.get_prefetcher()
+        prefetcher.prefetch()
+        map2_job = prefetcher.pending[("map2", "")]
+        prefetcher.cancel(keep=[("map1", "")])
+        self.assertTrue(map2_job.cancelled.is_set())
+
+        self.run_jobs(prefetcher)
+        self.assertFalse(map2_job.started.is_set())
+        self.assertEqual(prefetcher.ready.qsize(), 1)
+        prefetcher.collect()
+        self.assertEqual(list(self.game.map_cache.maps), [("map1", "")])
+
+    def test_stale_version(self):
+        prefetcher = self.get_prefetcher()
+        prefetcher.prefetch()
+        self.run_jobs(prefetcher)
+        self.game.script.maps_version["map2"] = "_2"  # e.g. a quest changed the map while it was loaded
+        prefetcher.collect()
+        self.assertEqual(list(self.game.map_cache.maps), [("map1", "")])
+        self.assertEqual(prefetcher.pending, {})
+
+    def test_wait_for(self):
+        prefetcher = self.get_prefetcher()
+        prefetcher.prefetch()
+        prefetcher.wait_for("map1", "")  # not started: cancelled, the caller loads the map
+        self.assertEqual(list(prefetcher.pending), [("map2", "")])
+
+        worker = threading.Thread(target=self.run_jobs, args=(prefetcher,))
+        worker.start()
+        self.addCleanup(worker.join)
+        self.assertTrue(prefetcher.pending[("map2", "")].started.wait(5))
+        prefetcher.wait_for("map2", "")  # started: waits for the worker and collects the map
+        self.assertEqual(list(self.game.map_cache.maps), [("map2", "")])
+        self.assertEqual(prefetcher.pending, {})
+
+    def test_cancel_and_wait(self):
+        prefetcher = self.get_prefetcher()
+        prefetcher.prefetch()
+        jobs = list(prefetcher.pending.values())
+        worker = threading.Thread(target=self.run_jobs, args=(prefetcher,))
+        worker.start()
+        self.addCleanup(worker.join)
+        self.assertTrue(jobs[0].started.wait(5))
+
+        prefetcher.cancel(wait=True)
+        for job in jobs:
+            self.assertTrue(job.done.is_set() or not job.started.is_set())  # no job is running anymore
+        prefetcher.collect()
+        self.assertEqual(list(self.game.map_cache.maps), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
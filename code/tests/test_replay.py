@@ -0,0 +1,82 @@
+import gzip
+import pygame as pg
+import tempfile
+import unittest
+from os import chdir, getcwd, path
+
+from headless import HeadlessGame, close_headless, init_headless
+from replay import InputRecorder, load_recording, replay
+from settings import GAME_STARTUP_PARAMS
+
+
+class TestReplay(unittest.TestCase):
+
+    def setUp(self):
+        self.addCleanup(chdir, getcwd())
+        chdir('..')  # maps and images are loaded from the game folder
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        init_headless(db_path=path.join(temp_dir.name, "test.db"))
+        self.addCleanup(close_headless)
+        self.filename = path.join(temp_dir.name, "test.rec")
+
+    def play(self):
+        """ Plays a short session with a recorder attached to the game. """
+
+        headless = HeadlessGame()
+        self.addCleanup(headless.close)
+        headless.game.recorder = InputRecorder(GAME_STARTUP_PARAMS, self.filename)
+
+        headless.press(pg.K_RIGHT)
+        headless.run(250)
+        headless.press(pg.K_DOWN)
+        headless.release(pg.K_RIGHT)
+        headless.run(200)
+        headless.release(pg.K_DOWN)
+        headless.run(300)
+        headless.tap(pg.K_ESCAPE)
+        headless.step()
+        headless.tap(pg.K_ESCAPE)
+        headless.press(pg.K_LEFT)
+        headless.run(130)
+        headless.release(pg.K_LEFT)
+        headless.run(200)
+
+        headless.game.recorder.close()
+        headless.game.recorder = None
+        return headless.game
+
+    @staticmethod
+    def get_state(game):
+        return game.map.name, game.player.x, game.player.y, game.player.look_at, game.paused, game.time
+
+    def test_load_recording(self):
+        self.play()
+        game_params, batches = load_recording(self.filename)
+        self.assertEqual(game_params, GAME_STARTUP_PARAMS)
+        self.assertEqual([event.type for event in batches[0][2]], [pg.KEYDOWN])
+        self.assertEqual(batches[0][2][0].key, pg.K_RIGHT)
+        self.assertEqual([game_time for game_time, wall_time, events in batches], sorted(game_time for game_time, wall_time, events in batches))
+
+    def test_same_game(self):
+        game = self.play()
+        state = self.get_state(game)
+        self.assertNotEqual(state[1:3], (GAME_STARTUP_PARAMS["player"]["x"], GAME_STARTUP_PARAMS["player"]["y"]))
+
+        stats = replay(self.filename)
+        self.assertEqual(self.get_state(game)[:-1], state[:-1])  # 'game' is the replayed game, Game is a singleton
+        self.assertGreater(stats["frames"], 0)
+
+    def test_interrupted_recording(self):
+        self.play()
+        with gzip.open(self.filename, 'rb') as file:
+            data = file.read()
+        with open(self.filename, 'wb') as file:  # the game was killed before the gzip stream was closed
+            file.write(gzip.compress(data)[:-12])
+
+        game_params, batches = load_recording(self.filename)
+        self.assertEqual(game_params, GAME_STARTUP_PARAMS)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import copy
+import os
+import pickle
+import unittest
+from datetime import datetime
+
+from savecodec import safe_loads, get_format_version, encode_game_params, decode_game_params, SAVEFORMATVERSION
+from settings import GAME_STARTUP_PARAMS
+
+
+class TestSaveCodec(unittest.TestCase):
+
+    def setUp(self):
+        self.game_params = copy.deepcopy(GAME_STARTUP_PARAMS)
+        self.game_params.update({
+            "player": {"name": "player3", "x": 13.0, "y": 11.5, "look_at": (-1, 0)},
+            "map": {"name": "map1"},
+            "maps_version": {"map2": "_3", "mapC": "_2"},
+            "unlocked_tools": {"axe": True, "shovel": False, "pickaxe": True, "net": False},
+            "current_quest": {"name": "chap4q2", "state": 2, "current_obj_nbr": 3},
+            "quest_journal_acquired": True,
+            "goals_booklet_acquired": False,
+            "removed_objects": ["m1dirt3", "m1dirt12", "m2tree1", "m1dirt4", "gate"]
+        })
+
+    def test_round_trip(self):
+        for game_params in (GAME_STARTUP_PARAMS, self.game_params):
+            data = encode_game_params(game_params)
+            self.assertEqual(get_format_version(data), SAVEFORMATVERSION)
+            decoded = decode_game_params(data)
+            self.assertEqual(sorted(decoded.pop("removed_objects")), sorted(game_params["removed_objects"]))
+            self.assertEqual(decoded, {key: value for key, value in game_params.items() if key != "removed_objects"})
+
+    def test_smaller_than_pickle(self):
+        self.game_params["removed_objects"] = ["m1dirt" + str(number) for number in range(1, 14)]
+        self.assertLess(len(encode_game_params(self.game_params)), len(pickle.dumps(self.game_params, pickle.HIGHEST_PROTOCOL)) / 2)
+
+    def test_pickled_saves_are_migrated(self):
+        old_params = copy.deepcopy(self.game_params)
+        del old_params["goals_booklet_acquired"]
+        old_params["player"]["look_at"] = [-1, 0]
+        data = pickle.dumps(old_params, pickle.HIGHEST_PROTOCOL)
+
+        self.assertEqual(get_format_version(data), 0)
+        self.assertEqual(decode_game_params(data), self.game_params)
+
+    def test_pickled_code_is_not_run(self):
+        self.assertEqual(safe_loads(pickle.dumps([{"timestamp": datetime(2020, 3, 27)}])), [{"timestamp": datetime(2020, 3, 27)}])
+        with self.assertRaises(pickle.UnpicklingError):
+            safe_loads(pickle.dumps(os.getcwd))
+        with self.assertRaises(ValueError):
+            decode_game_params(pickle.dumps({"player": os.getcwd}))
+
+    def test_corrupted_save(self):
+        with self.assertRaises(ValueError):
+            decode_game_params(encode_game_params(self.game_params)[:-3])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import pygame as pg
+import unittest
+
+from scheduler import EventScheduler
+
+
+pg.init()
+pg.display.set_mode((100, 100))
+
+
+class TestEventScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.scheduler = EventScheduler()
+        pg.event.clear()
+
+    def tearDown(self):
+        self.scheduler.stop_all()
+
+    def test_timeout(self):
+        self.assertEqual(self.scheduler.wait(10), [])
+
+    def test_wait_returns_all_events(self):
+        pg.event.post(pg.event.Event(pg.KEYUP, key=pg.K_UP))
+        pg.event.post(pg.event.Event(pg.KEYUP, key=pg.K_DOWN))
+        self.assertEqual([event.key for event in self.scheduler.wait(10)], [pg.K_UP, pg.K_DOWN])
+
+    def test_one_shot_timer(self):
+        event_type = self.scheduler.new_event_type()
+        self.scheduler.start_timer(event_type, 20)
+        self.assertEqual([event.type for event in self.scheduler.wait(1000)], [event_type])
+        self.assertNotIn(event_type, self.scheduler.timers)
+        self.assertEqual(self.scheduler.wait(60), [])
+
+    def test_repeated_timer(self):
+        event_type = self.scheduler.new_event_type()
+        self.scheduler.start_timer(event_type, 10, repeat=True)
+        for _ in range(3):
+            self.assertEqual([event.type for event in self.scheduler.wait(1000)], [event_type])
+        self.scheduler.stop_timer(event_type)
+        pg.event.clear()
+        self.assertEqual(self.scheduler.wait(40), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import tempfile
+import unittest
+from os import chdir, getcwd, path
+
+import pygame as pg
+
+from headless import HeadlessGame, close_headless, init_headless
+from persistence import Persistence
+
+
+class TestGameSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.addCleanup(chdir, getcwd())
+        chdir('..')  # maps and images are loaded from the game folder
+        save_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(save_dir.cleanup)
+        init_headless(db_path=path.join(save_dir.name, "test.db"))
+        self.addCleanup(close_headless)
+        self.headless = HeadlessGame()
+        self.addCleanup(self.headless.close)
+        self.game = self.headless.game
+
+    def get_state(self):
+        return Persistence.get_game_params(self.game)
+
+    def test_quick_save_and_load(self):
+        self.game.load_map("map1")
+        self.game.player.x, self.game.player.y = 13.0, 11.0
+        self.headless.tap(pg.K_F5)
+        self.headless.step()
+        state = self.get_state()
+        sprites = set(self.game.all_sprites)
+
+        self.game.player.x, self.game.player.y, self.game.player.look_at = 14.0, 11.0, (1, 0)
+        self.game.script.current_quest.state = 3
+        self.game.script.update()
+        self.game.inventory.axe.acquired = True
+        self.game.script.set_map_version("map2", "_2")
+        self.assertNotEqual(self.get_state(), state)
+
+        self.headless.tap(pg.K_F9)
+        self.headless.step()
+        self.assertEqual(self.get_state(), state)
+        self.assertEqual(set(self.game.all_sprites), sprites)  # nothing changed on the map, the sprites are kept
+
+    def test_removed_objects_reappear(self):
+        self.game.load_map("map1")
+        self.game.quick_save()
+        obj = next(iter(self.game.objects))
+        obj.kill()
+        self.game.removed_objects.append(obj.name)
+
+        self.game.quick_load()
+        self.assertEqual(self.game.removed_objects, [])
+        self.assertIs(self.game.removed_objects, self.game.game_params["removed_objects"])
+        self.assertIn(obj.name, [sprite.name for sprite in self.game.objects])
+
+    def test_quick_load_on_another_map(self):
+        self.game.quick_save()
+        self.game.load_map("map1")
+        self.game.player.x = 3.0
+
+        self.game.quick_load()
+        self.assertEqual((self.game.map.name, self.game.player.x, self.game.player.y), ("map0", 12.0, 10.0))
+
+    def test_without_quicksave(self):
+        state = self.get_state()
+        self.game.quick_load()
+        self.assertEqual(self.get_state(), state)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+import pygame as pg
+import unittest
+import pytmx
+from os import chdir, getcwd
+from types import SimpleNamespace
+
+import globvars as glob
+from assets import AssetManager
+from spatial import WalkabilityGrid, SpatialIndex
+from sprites import Obstacle, NPC, Object, Gate
+from settings import TILESIZE
+
+
+pg.init()
+pg.display.set_mode((100, 100))
+glob.assets = AssetManager()
+
+maps_name = ["houseB1", "map0", "map1", "map1_2", "map2", "map2_2", "map2_3", "map3", "map4", "map4_2", "mapA", "mapB", "mapC", "mapC_2", "mapC_3", "mapD", "mapD_2", "mapD_3"]
+
+
+def collide_with_obstacles(obstacles, x, y):
+    """ The scan of the obstacles group used before the walkability grid. """
+
+    for o in obstacles:
+        if (o.x <= x < (o.x + o.w)) and (o.y <= y < (o.y + o.h)):
+            return True
+    return False
+
+
+class TestWalkabilityGrid(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = getcwd()
+        chdir('..')  # images are loaded from the game folder
+
+    def tearDown(self):
+        chdir(self.cwd)
+
+    def load_sprites(self, map_name):
+        """ Creates the obstacles, npcs and objects of a map like 'Game.load_map'. """
+
+        map_data = pytmx.load_pygame('maps/' + map_name + '.tmx', pixelalpha=True)
+        game = SimpleNamespace(all_sprites=pg.sprite.Group(), obstacles=pg.sprite.Group(),
+                               characters=pg.sprite.Group(), objects=pg.sprite.Group(), gates=pg.sprite.Group())
+        game.walkability = WalkabilityGrid(map_data.width, map_data.height, game.obstacles)
+        game.spatial_index = SpatialIndex(game.objects)
+
+        for obj in map_data.objects:
+            if obj.type == "gate":
+                Gate(game, obj.x, obj.y, obj.width, obj.height, obj.name, getattr(obj, "dx", 0), getattr(obj, "dy", 0))
+            elif obj.type[0:3] == "npc":
+                NPC(game, obj.x, obj.y, obj.width, obj.height, obj.name, obj.type, obj.look_to)
+            elif obj.type[0:-1] in ["tree", "dirt", "rock", "trash"]:
+                Object(game, obj.x, obj.y, obj.width, obj.height, obj.name, obj.type)
+            elif obj.type == "obstacle":
+                Obstacle(game, obj.x, obj.y, obj.width, obj.height)
+        return game
+
+    def assertSameAsScan(self, game, map_name):
+        grid = game.walkability
+        for y in range(-1, grid.height + 1):
+            for x in range(-1, grid.width + 1):
+                self.assertEqual(grid.is_blocked(x, y), collide_with_obstacles(game.obstacles, x, y), (map_name, x, y))
+
+    def test_grid_matches_scan(self):
+        for map_name in maps_name:
+            game = self.load_sprites(map_name)
+            self.assertSameAsScan(game, map_name)
+
+            for obj in list(game.objects):
+                obj.kill()
+            self.assertSameAsScan(game, map_name)
+
+    def test_kill_frees_tiles(self):
+        game = self.load_sprites("map2")
+        obj = next(iter(game.objects))
+        x, y = int(obj.x), int(obj.y)
+        self.assertTrue(game.walkability.is_blocked(x, y))
+
+        obj.kill()
+        obj.kill()  # already removed, nothing happens
+        self.assertEqual(game.walkability.is_blocked(x, y), collide_with_obstacles(game.obstacles, x, y))
+
+    def test_position_between_tiles(self):
+        game = SimpleNamespace(obstacles=pg.sprite.Group())
+        game.walkability = WalkabilityGrid(4, 4, game.obstacles)
+        Obstacle(game, TILESIZE / 2, 0, TILESIZE, TILESIZE)
+
+        self.assertFalse(game.walkability.is_blocked(0, 0))
+        self.assertTrue(game.walkability.is_blocked(1, 0))
+        self.assertTrue(game.walkability.is_blocked(0.5, 0))
+
+
+class TestSpatialIndex(TestWalkabilityGrid):
+
+    def assertSameAsScan(self, game, map_name):
+        index = game.spatial_index
+        for y in range(-1, game.walkability.height + 1):
+            for x in range(-1, game.walkability.width + 1):
+                npc = next((npc for npc in game.characters if (npc.x, npc.y) == (x, y)), None)
+                obj = next((obj for obj in game.objects if (obj.x <= x < obj.x + obj.w) and (obj.y <= y < obj.y + obj.h)), None)
+                gate = next((gate for gate in game.gates if gate.x == x and gate.y == y), None)
+                self.assertIs(index.get_npc_at(x, y), npc, (map_name, x, y))
+                self.assertIs(index.get_object_at(x, y), obj, (map_name, x, y))
+                self.assertIs(index.get_gate_at(x, y), gate, (map_name, x, y))
+
+        for npc in game.characters:
+            self.assertIs(index.get_npc(npc.name), npc)
+        self.assertIsNone(index.get_npc("nobody"))
+
+    def test_kill_frees_tiles(self):
+        game = self.load_sprites("map2")
+        obj = next(iter(game.objects))
+        self.assertIs(game.spatial_index.get_object_at(int(obj.x), int(obj.y)), obj)
+
+        obj.kill()
+        obj.kill()  # already removed, nothing happens
+        self.assertIsNone(game.spatial_index.get_object_at(int(obj.x), int(obj.y)))
+
+    def test_position_between_tiles(self):
+        game = SimpleNamespace(all_sprites=pg.sprite.Group(), obstacles=pg.sprite.Group(), objects=pg.sprite.Group())
+        game.walkability = WalkabilityGrid(4, 4, game.obstacles)
+        game.spatial_index = SpatialIndex(game.objects)
+        obj = Object(game, TILESIZE / 2, 0, TILESIZE, TILESIZE, "m0tree1", "tree1")
+
+        self.assertIsNone(game.spatial_index.get_object_at(0, 0))
+        self.assertIs(game.spatial_index.get_object_at(1, 0), obj)
+        self.assertIs(game.spatial_index.get_object_at(0.5, 0), obj)
+
+
+if __name__ == '__main__':
+    unittest.main()
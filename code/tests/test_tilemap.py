@@ -0,0 +1,60 @@
+import pygame as pg
+import unittest
+from os import chdir, getcwd
+
+from tilemap import MapCache, TiledMap
+
+
+pg.init()
+pg.display.set_mode((100, 100))
+
+
+class TestMapCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = getcwd()
+        chdir('..')  # maps are loaded from the game folder
+
+    def tearDown(self):
+        chdir(self.cwd)
+
+    def test_hits_and_misses(self):
+        cache = MapCache(64 * 1024 * 1024)
+        map0 = cache.get("map0")
+        cache.get("map1")
+        self.assertIs(cache.get("map0"), map0)
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+    def test_versions_and_invalidate(self):
+        cache = MapCache(64 * 1024 * 1024)
+        map2 = cache.get("map2")
+        self.assertIsNot(cache.get("map2", "_2"), map2)
+        cache.invalidate("map2", "_2")
+        self.assertEqual(list(cache.maps), [("map2", "_2")])
+
+    def test_budget(self):
+        cache = MapCache(0)
+        cache.get("map0").get_chunk(0, 0)
+        map1 = cache.get("map1")
+        self.assertEqual(list(cache.maps), [("map1", "")])  # the requested map is always kept
+        self.assertIs(cache.get("map1"), map1)
+
+
+class TestTiledMap(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = getcwd()
+        chdir('..')  # maps are loaded from the game folder
+
+    def tearDown(self):
+        chdir(self.cwd)
+
+    def test_tiles_without_image(self):
+        tiled_map = TiledMap("map0")
+        tiled_map.tmxdata.get_tile_image_by_gid = lambda gid: None  # like a gid out of the tilesets
+        chunk = tiled_map.make_chunk(0, 0)
+        self.assertEqual(chunk.get_at((0, 0)), pg.Color(0, 0, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
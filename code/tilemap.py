@@ -7,15 +7,20 @@
     -----
     TiledMap:
         a class used to create the tiled map
+    MapCache:
+        a class used to keep the last loaded maps in memory
     Camera:
         a class used to select the section of the map to display on the screen
         and to move each object with the same offset
 """
 
+from collections import OrderedDict
+
 import pygame as pg
 import pytmx
 
-from settings import WIDTH, HEIGHT, TILESIZE
+from mapbundle import load_map_data, get_object_kind, BundleLayer, BundleObject
+from settings import WIDTH, HEIGHT, TILESIZE, CHUNKSIZE, MAPDIR
 
 
 class TiledMap:
@@ -25,56 +30,283 @@ class TiledMap:
 
         Attributes
         ----------
-        tmxdata: pytmx data
-            all data from the '.tmx' file
+        tmxdata: pytmx data or MapBundle
+            all data from the '.tmx' file or from its compiled bundle
         width: int (pixels)
             the map width
         height: int (pixels)
             the map heigth
         name: str
             the map name
-        image: Image
-            the image to display, created from the map
+        version: str
+            the map version, '' for the first version of the map, e.g. '_2' for 'map2_2.tmx'
+        objects: list
+            all objects created in Tiled editor, used in 'Game.load_map' to create the sprites,
+            each one has the 'kind' of 'mapbundle.get_object_kind'
         rect: Rect
-            the rectangle created from the image
+            the rectangle with the dimensions of the map
+        chunks: dict
+            baked chunks of the map, keyed by their (column, row) index in the chunk grid
+
+        The map is cut into chunks of CHUNKSIZE x CHUNKSIZE tiles,
+        each chunk is only baked when it first overlaps the screen
+        and is forgotten once it is far enough from it.
 
         Methods
         -------
-        make_map(self):
-            creates the map image
+        make_chunk(self, cx, cy):
+            creates the image of one chunk
+        get_chunk(self, cx, cy):
+            returns the image of one chunk, baking it if needed
+        draw(self, surface, camera):
+            draws the chunks that overlap the camera viewport
+        prebake(self, area, is_cancelled=None):
+            bakes the chunks that overlap an area of the map
+        get_resident_bytes(self):
+            returns the memory used by the images of the map
     """
 
-    def __init__(self, game, map_name):
-        map_version = game.script.maps_version[map_name] if map_name in game.script.maps_version else ''
-        self.tmxdata = pytmx.load_pygame('maps/' + map_name + map_version + '.tmx', pixelalpha=True)
+    def __init__(self, map_name, map_version=''):
+        self.tmxdata = load_map_data(MAPDIR + map_name + map_version)
         self.width = self.tmxdata.width * self.tmxdata.tilewidth
         self.height = self.tmxdata.height * self.tmxdata.tileheight
         self.name = map_name
+        self.version = map_version
+        self.objects = list(self.tmxdata.objects)
+        for obj in self.objects:
+            if not isinstance(obj, BundleObject):  # the kind of the bundle objects is computed by the compiler
+                obj.kind = get_object_kind(obj.type or "")
 
-        self.image = self.make_map()
-        self.rect = self.image.get_rect()
+        self.rect = pg.Rect(0, 0, self.width, self.height)
+        self.chunks = {}
 
-    def make_map(self):
-        """ Creates the map image.
+    def make_chunk(self, cx, cy):
+        """ Creates the image of one chunk.
 
-        The image is a Surface object with the dimensions of the map
-        and with all tiles and objects on it.
+        The image is a Surface object with the dimensions of the chunk
+        (smaller on the right and bottom edges of the map)
+        and with all the tiles of the visible layers on it.
 
-        :return: the map image, which is a Surface object
+        :param cx: column index of the chunk
+        :param cy: row index of the chunk
+        :return: the chunk image, which is a Surface object
         """
 
-        temp_surface = pg.Surface((self.width, self.height))
+        x_start = cx * CHUNKSIZE
+        y_start = cy * CHUNKSIZE
+        x_end = min(x_start + CHUNKSIZE, self.tmxdata.width)
+        y_end = min(y_start + CHUNKSIZE, self.tmxdata.height)
+
+        temp_surface = pg.Surface(((x_end - x_start) * TILESIZE, (y_end - y_start) * TILESIZE))
 
         ti = self.tmxdata.get_tile_image_by_gid
         for layer in self.tmxdata.visible_layers:
-            if isinstance(layer, pytmx.TiledTileLayer):
-                for x, y, gid, in layer:
-                    tile = ti(gid)
-                    if tile:
-                        temp_surface.blit(tile, (x * TILESIZE, y * TILESIZE))
+            if isinstance(layer, (pytmx.TiledTileLayer, BundleLayer)):
+                # the tiles of a layer are blitted in one call, the next layer is drawn over them
+                tiles = []
+                for y in range(y_start, y_end):
+                    row = layer.data[y]
+                    for x in range(x_start, x_end):
+                        if row[x]:
+                            tile = ti(row[x])
+                            if tile:  # a gid may have no image, e.g. out of the tilesets
+                                tiles.append((tile, ((x - x_start) * TILESIZE, (y - y_start) * TILESIZE)))
+                temp_surface.blits(tiles, doreturn=False)
 
         return temp_surface
 
+    def get_chunk(self, cx, cy):
+        """ Returns the image of one chunk, baking it if needed.
+
+        :param cx: column index of the chunk
+        :param cy: row index of the chunk
+        :return: the chunk image, which is a Surface object
+        """
+
+        if (cx, cy) not in self.chunks:
+            self.chunks[(cx, cy)] = self.make_chunk(cx, cy)
+        return self.chunks[(cx, cy)]
+
+    def draw(self, surface, camera):
+        """ Draws the chunks that overlap the camera viewport.
+
+        Only the chunks inside the screen are blitted, the chunks that
+        are more than one chunk away from the screen are forgotten
+        so that memory depends on the screen size and not on the map size.
+
+        :param surface: the surface to draw the map on, typically the map screen
+        :param camera: the Camera object giving the map offset
+        :return: None
+        """
+
+        offset = camera.apply(self.rect)
+        chunk_px = CHUNKSIZE * TILESIZE
+
+        # Part of the map that is visible on the surface, in map pixels:
+        visible = surface.get_rect().move(-offset.x, -offset.y).clip(self.rect)
+        if visible.width == 0 or visible.height == 0:
+            self.chunks.clear()
+            return
+
+        cx_first, cx_last = visible.left // chunk_px, (visible.right - 1) // chunk_px
+        cy_first, cy_last = visible.top // chunk_px, (visible.bottom - 1) // chunk_px
+
+        for cy in range(cy_first, cy_last + 1):
+            for cx in range(cx_first, cx_last + 1):
+                surface.blit(self.get_chunk(cx, cy), (offset.x + cx * chunk_px, offset.y + cy * chunk_px))
+
+        # Keep a margin of one chunk to avoid baking the same chunks again when the player goes back and forth:
+        for cx, cy in list(self.chunks):
+            if not (cx_first - 1 <= cx <= cx_last + 1 and cy_first - 1 <= cy <= cy_last + 1):
+                del self.chunks[(cx, cy)]
+
+    def prebake(self, area, is_cancelled=None):
+        """ Bakes the chunks that overlap an area of the map.
+
+        Used to prepare a map before it is displayed, see 'MapPrefetcher'.
+
+        :param area: Rect object in map pixels
+        :param is_cancelled: function returning True when the baking must stop
+        :return: None
+        """
+
+        area = area.clip(self.rect)
+        chunk_px = CHUNKSIZE * TILESIZE
+        for cy in range(area.top // chunk_px, (area.bottom - 1) // chunk_px + 1):
+            for cx in range(area.left // chunk_px, (area.right - 1) // chunk_px + 1):
+                if is_cancelled is not None and is_cancelled():
+                    return
+                self.get_chunk(cx, cy)
+
+    def get_resident_bytes(self):
+        """ Returns the memory used by the images of the map.
+
+        Counts the baked chunks and the tile images loaded for this map,
+        tileset images shared by several bundles are not counted.
+
+        :return: number of bytes
+        """
+
+        images = list(self.chunks.values())
+        if isinstance(self.tmxdata, pytmx.TiledMap):
+            images += self.tmxdata.images
+        else:
+            images += self.tmxdata.loaded_tile_images()
+
+        return sum(image.get_bytesize() * image.get_width() * image.get_height() for image in images if image)
+
+
+class MapCache:
+    """
+        A class used to keep the last loaded maps in memory,
+        so that going back and forth through a gate doesn't parse and bake the same map again.
+
+        Maps are kept with their baked chunks and their objects until the memory they use
+        exceeds the budget, then the least recently used maps are forgotten first.
+        A map is identified by its name and its version, when a new version of a map is unlocked
+        the old one must be removed with 'invalidate'.
+
+        Attributes
+        ----------
+        budget: int (bytes)
+            the maximum memory used by the images of the cached maps
+        maps: OrderedDict
+            cached TiledMap objects keyed by (map name, map version), from the least to the most recently used
+        hits, misses: int
+            number of maps found in the cache or loaded from the disk
+
+        Methods
+        -------
+        get(self, map_name, map_version=''):
+            returns the map, from the cache if possible
+        add(self, tiled_map, keep=None):
+            adds a map loaded elsewhere, e.g. by the 'MapPrefetcher'
+        invalidate(self, map_name, map_version=None):
+            removes the versions of a map that are not the current one
+        get_resident_bytes(self):
+            returns the memory used by the cached maps
+        evict(self, keep=None):
+            forgets the least recently used maps until the budget is respected
+    """
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.maps = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self):
+        return "<%s: %d maps, %d hits, %d misses, %d bytes>" % (self.__class__.__name__, len(self.maps), self.hits, self.misses, self.get_resident_bytes())
+
+    def get(self, map_name, map_version=''):
+        """ Returns the map, from the cache if possible.
+
+        :param map_name: the map name, e.g. 'map2'
+        :param map_version: the map version, e.g. '_2'
+        :return: a TiledMap object
+        """
+
+        key = (map_name, map_version)
+        if key in self.maps:
+            self.hits += 1
+            self.maps.move_to_end(key)
+        else:
+            self.misses += 1
+            self.maps[key] = TiledMap(map_name, map_version)
+
+        tiled_map = self.maps[key]
+        self.evict(keep=key)
+        return tiled_map
+
+    def add(self, tiled_map, keep=None):
+        """ Adds a map loaded elsewhere, e.g. by the 'MapPrefetcher'.
+
+        :param tiled_map: a TiledMap object
+        :param keep: key of a map that must stay in the cache, typically the displayed map
+        :return: None
+        """
+
+        self.maps[(tiled_map.name, tiled_map.version)] = tiled_map
+        self.evict(keep=keep)
+
+    def invalidate(self, map_name, map_version=None):
+        """ Removes the versions of a map that are not the current one.
+
+        :param map_name: the map name
+        :param map_version: the current version of the map, all versions are removed if None
+        :return: None
+        """
+
+        for key in list(self.maps):
+            if key[0] == map_name and key[1] != map_version:
+                del self.maps[key]
+
+    def get_resident_bytes(self):
+        """ Returns the memory used by the cached maps.
+
+        :return: number of bytes
+        """
+
+        return sum(tiled_map.get_resident_bytes() for tiled_map in self.maps.values())
+
+    def evict(self, keep=None):
+        """ Forgets the least recently used maps until the budget is respected.
+
+        Baked chunks are added while a map is displayed so the memory is measured again each time.
+
+        :param keep: key of a map that must stay in the cache, typically the map that is being loaded
+        :return: None
+        """
+
+        sizes = OrderedDict((key, tiled_map.get_resident_bytes()) for key, tiled_map in self.maps.items())
+        total = sum(sizes.values())
+        for key, size in sizes.items():
+            if total <= self.budget:
+                break
+            if key != keep:
+                del self.maps[key]
+                total -= size
+
 
 class Camera:
     """